@@ -1,21 +1,107 @@
+import argparse
 import logging
-from winter_supplement_engine.mqtt_client import WinterSupplementMQTTClient
-from winter_supplement_engine.config import LOGGING_CONFIG
-
-# Configure logging
-logging.basicConfig(
-    level=LOGGING_CONFIG['level'],
-    format=LOGGING_CONFIG['format']
-)
+import sys
+from winter_supplement_engine.logging_utils import configure_logging
+
+# The MQTT clients, the supervisor and the bulk and results commands are imported for the
+# mode being run, so the blocking client never imports asyncio or the bulk pipeline
 logger = logging.getLogger(__name__)
 
 
-def main():
+def parse_args(argv=None):
+    """
+    Parse command line arguments.
+
+    Args:
+        argv (list): Arguments to parse, defaults to sys.argv
+
+    Returns:
+        argparse.Namespace: Parsed arguments
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(description="Winter Supplement Rules Engine")
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Run the asyncio service mode instead of the blocking MQTT loop"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Run a supervisor with this many worker processes sharing the input topics"
+    )
+    commands = parser.add_subparsers(dest="command")
+    bulk_parser = commands.add_parser(
+        "bulk",
+        help="Calculate supplements for an NDJSON or CSV file instead of serving MQTT",
+        description="Calculate supplements for an NDJSON or CSV file instead of serving MQTT"
+    )
+    results_parser = commands.add_parser(
+        "results",
+        help="Look up or scan the results stored in the result store",
+        description="Look up or scan the results stored in the result store, written to stdout as NDJSON"
+    )
+    # A command's options are only needed, and its module only imported, when it is named
+    if "bulk" in argv:
+        from winter_supplement_engine import bulk
+
+        bulk.add_arguments(bulk_parser)
+    if "results" in argv:
+        from winter_supplement_engine import result_store
+
+        result_store.add_arguments(results_parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """
     Entry point for Winter Supplement Rules Engine.
     Initializes and starts MQTT client.
     """
+    args = parse_args(argv)
+    # Configure logging
+    configure_logging()
+    if args.command == "bulk":
+        from winter_supplement_engine import bulk
+
+        bulk.run_from_args(args)
+        return
+    if args.command == "results":
+        from winter_supplement_engine import result_store
+
+        try:
+            result_store.run_from_args(args)
+        except ValueError as e:
+            sys.exit(f"results: error: {e}")
+        return
+
     logger.info("Starting Winter Supplement Rules Engine...")
+    if args.workers:
+        from winter_supplement_engine.supervisor import Supervisor
+
+        supervisor = Supervisor(workers=args.workers, use_async=args.use_async)
+        try:
+            supervisor.run()
+        except KeyboardInterrupt:
+            logger.info("Shutting down Winter Supplement Rules Engine")
+        return
+
+    if args.use_async:
+        import asyncio
+
+        from winter_supplement_engine.async_client import AsyncWinterSupplementMQTTClient
+
+        mqtt_client = AsyncWinterSupplementMQTTClient()
+        try:
+            asyncio.run(mqtt_client.run())
+        except KeyboardInterrupt:
+            logger.info("Shutting down Winter Supplement Rules Engine")
+        return
+
+    from winter_supplement_engine.mqtt_client import WinterSupplementMQTTClient
+
     mqtt_client = WinterSupplementMQTTClient()
     mqtt_client.connect()
 
@@ -0,0 +1,206 @@
+import json
+import threading
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from winter_supplement_engine.admission import TokenBucketLimiter
+from winter_supplement_engine.async_client import AsyncWinterSupplementMQTTClient
+from winter_supplement_engine.config import MQTT_INPUT_TOPIC_BASE, MQTT_OUTPUT_TOPIC_BASE
+from winter_supplement_engine.mqtt_client import WinterSupplementMQTTClient
+
+
+VALID_INPUT = {
+    "id": "admission_1",
+    "numberOfChildren": 1,
+    "familyComposition": "single",
+    "familyUnitInPayForDecember": True
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_message(topic_id):
+    msg = MagicMock()
+    msg.topic = f"{MQTT_INPUT_TOPIC_BASE}{topic_id}"
+    msg.payload = json.dumps(VALID_INPUT).encode()
+    return msg
+
+
+def published(mock_client):
+    return [(call[0][0], json.loads(call[0][1])) for call in mock_client.publish.call_args_list]
+
+
+class TestTokenBucketLimiter:
+    def test_burst_then_rate(self):
+        """
+        A client may send a burst at once, then one request per 1/rate seconds
+        """
+        clock = FakeClock()
+        limiter = TokenBucketLimiter(rate=2, burst=3, clock=clock)
+
+        assert [limiter.acquire("a") for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert limiter.acquire("a") == pytest.approx(0.5)
+        clock.now += 0.25
+        assert limiter.acquire("a") == pytest.approx(0.25)
+        clock.now += 0.25
+        assert limiter.acquire("a") == 0.0
+        assert limiter.acquire("a") > 0
+
+    def test_clients_are_independent(self):
+        limiter = TokenBucketLimiter(rate=1, clock=FakeClock())
+
+        assert limiter.acquire("a") == 0.0
+        assert limiter.acquire("a") > 0
+        assert limiter.acquire("b") == 0.0
+
+    def test_idle_buckets_are_evicted(self):
+        """
+        Buckets are only kept while they are not yet full again, so memory follows the active clients
+        """
+        clock = FakeClock()
+        limiter = TokenBucketLimiter(rate=10, burst=5, clock=clock)
+        for index in range(1000):
+            limiter.acquire(f"client-{index}")
+            clock.now += 0.001
+
+        assert limiter.stats()["clients"] == 500
+        clock.now += 0.5
+        limiter.acquire("new")
+        assert limiter.stats() == {"rate": 10.0, "burst": 5.0, "clients": 1, "evictions": 1000}
+
+    def test_eviction_keeps_limits(self):
+        """
+        A client that keeps sending keeps its bucket, however long it runs
+        """
+        clock = FakeClock()
+        limiter = TokenBucketLimiter(rate=1, burst=1, clock=clock)
+        allowed = 0
+        for _ in range(100):
+            allowed += limiter.acquire("a") == 0.0
+            limiter.acquire("other")
+            clock.now += 0.5
+
+        assert allowed == 50
+
+    def test_thread_safety(self):
+        limiter = TokenBucketLimiter(rate=0.001, burst=1000, clock=FakeClock())
+        allowed = []
+
+        def take():
+            allowed.append(sum(limiter.acquire("a") == 0.0 for _ in range(500)))
+
+        threads = [threading.Thread(target=take) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sum(allowed) == 1000
+
+    @pytest.mark.parametrize("kwargs", [{"rate": 0}, {"rate": -1}, {"rate": 5, "burst": 0.5}])
+    def test_invalid_arguments(self, kwargs):
+        with pytest.raises(ValueError):
+            TokenBucketLimiter(**kwargs)
+
+
+class TestAdmissionControl:
+    def test_rate_limited_requests_get_busy_results(self):
+        """
+        Requests beyond a topic id's rate get a BUSY result; other topic ids are unaffected
+        """
+        with patch('winter_supplement_engine.mqtt_client.RATE_LIMIT_PER_CLIENT', 1), \
+                patch('winter_supplement_engine.mqtt_client.RATE_LIMIT_BURST', 2):
+            mqtt_client = WinterSupplementMQTTClient()
+        mock_client = MagicMock()
+
+        for topic_id in ("noisy", "noisy", "noisy", "quiet"):
+            mqtt_client._on_message(mock_client, None, make_message(topic_id))
+
+        results = published(mock_client)
+        assert [topic for topic, _ in results] == [f"{MQTT_OUTPUT_TOPIC_BASE}{topic_id}" for topic_id in
+                                                   ("noisy", "noisy", "noisy", "quiet")]
+        assert results[2][1]["error"]["code"] == "BUSY"
+        assert 0 < results[2][1]["error"]["retryAfter"] <= 1
+        assert "error" not in results[3][1]
+        stats = mqtt_client.stats()
+        assert stats["admission"]["rateLimited"] == 1
+        assert stats["admission"]["busyResults"] == 1
+        assert stats["admission"]["rateLimiter"]["clients"] == 2
+        assert stats["messages"]["failed"] == 1
+        assert stats["metrics"]["errors"]["shed"] == 1
+        assert stats["inFlight"] == 0
+
+    def test_concurrency_cap(self):
+        """
+        Requests beyond the number in progress are shed while the workers are busy
+        """
+        release = threading.Event()
+        with patch('winter_supplement_engine.mqtt_client.MAX_CONCURRENT_REQUESTS', 2), \
+                patch('winter_supplement_engine.mqtt_client.PROCESSING_WORKERS', 2):
+            mqtt_client = WinterSupplementMQTTClient()
+        mock_client = MagicMock()
+        process = mqtt_client._process_message
+
+        def blocked(client, msg):
+            release.wait(5)
+            process(client, msg)
+
+        mqtt_client.processing_pool.handler = blocked
+        mqtt_client.processing_pool.start()
+        try:
+            for index in range(5):
+                mqtt_client._on_message(mock_client, None, make_message(f"client-{index}"))
+            assert mqtt_client.stats()["admission"]["overloaded"] == 3
+            release.set()
+        finally:
+            mqtt_client.processing_pool.stop()
+
+        results = published(mock_client)
+        assert sum(result.get("error", {}).get("code") == "BUSY" for _, result in results) == 3
+        assert sum("supplementAmount" in result for _, result in results) == 2
+        assert mqtt_client.stats()["inFlight"] == 0
+
+    def test_drop_policy(self):
+        with patch('winter_supplement_engine.mqtt_client.RATE_LIMIT_PER_CLIENT', 1), \
+                patch('winter_supplement_engine.mqtt_client.SHED_POLICY', 'drop'):
+            mqtt_client = WinterSupplementMQTTClient()
+            mock_client = MagicMock()
+            for _ in range(3):
+                mqtt_client._on_message(mock_client, None, make_message("noisy"))
+
+        assert len(published(mock_client)) == 1
+        assert mqtt_client.stats()["admission"]["rateLimited"] == 2
+        assert mqtt_client.stats()["admission"]["busyResults"] == 0
+
+    def test_async_client(self):
+        """
+        The asyncio client sheds requests through the same admission control
+        """
+        with patch('winter_supplement_engine.mqtt_client.RATE_LIMIT_PER_CLIENT', 1):
+            mqtt_client = AsyncWinterSupplementMQTTClient()
+        mock_client = MagicMock()
+
+        for _ in range(3):
+            mqtt_client._on_message(mock_client, None, make_message("noisy"))
+
+        results = published(mock_client)
+        assert [result.get("error", {}).get("code") for _, result in results] == [None, "BUSY", "BUSY"]
+        assert mqtt_client.stats()["admission"]["rateLimited"] == 2
+
+    def test_disabled_by_default(self):
+        mqtt_client = WinterSupplementMQTTClient()
+
+        assert mqtt_client.rate_limiter is None
+        assert "admission" not in mqtt_client.stats()
+
+    def test_unknown_policy(self):
+        with patch('winter_supplement_engine.mqtt_client.SHED_POLICY', 'queue'):
+            with pytest.raises(ValueError):
+                WinterSupplementMQTTClient()
@@ -0,0 +1,291 @@
+import csv
+import json
+import os
+import tracemalloc
+
+import pytest
+
+from main import parse_args
+from winter_supplement_engine.bulk import chunk_bounds, detect_format, iter_lines, read_chunks, run_bulk, warm_up
+from winter_supplement_engine.calculator import WinterSupplementCalculator
+
+
+def make_input(index):
+    return {
+        "id": f"bulk_{index}",
+        "numberOfChildren": index % 4,
+        "familyComposition": ("single", "couple")[index % 2],
+        "familyUnitInPayForDecember": index % 3 != 0
+    }
+
+
+def write_ndjson(path, count, extra_lines=()):
+    with open(path, "w") as ndjson_file:
+        for index in range(count):
+            ndjson_file.write(json.dumps(make_input(index)) + "\n")
+        for line in extra_lines:
+            ndjson_file.write(line + "\n")
+
+
+def write_csv(path, count, extra_rows=()):
+    with open(path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["id", "numberOfChildren", "familyComposition", "familyUnitInPayForDecember"])
+        for index in range(count):
+            data = make_input(index)
+            writer.writerow([data["id"], data["numberOfChildren"], data["familyComposition"],
+                             "true" if data["familyUnitInPayForDecember"] else "false"])
+        writer.writerows(extra_rows)
+
+
+def read_ndjson(path):
+    with open(path) as ndjson_file:
+        return [json.loads(line) for line in ndjson_file]
+
+
+class TestBulkMode:
+    def test_ndjson_round_trip(self, tmp_path):
+        """
+        Every valid record is calculated in input order; invalid records go to the errors file
+        """
+        write_ndjson(tmp_path / "in.ndjson", 50, extra_lines=[
+            "not json",
+            "",
+            json.dumps({**make_input(99), "numberOfChildren": -1})
+        ])
+
+        report = run_bulk(str(tmp_path / "in.ndjson"), str(tmp_path / "out.ndjson"),
+                          errors_path=str(tmp_path / "errors.ndjson"), chunk_size=7)
+
+        assert read_ndjson(tmp_path / "out.ndjson") == [
+            WinterSupplementCalculator.calculate_supplement(make_input(index)) for index in range(50)
+        ]
+        errors = read_ndjson(tmp_path / "errors.ndjson")
+        assert [(error["line"], error["error"]["code"]) for error in errors] == [
+            (51, "INVALID_JSON"), (53, "INVALID_INPUT")
+        ]
+        assert report["records"] == 52
+        assert report["results"] == 50
+        assert report["errors"] == 2
+        assert report["chunks"] == 8
+
+    def test_csv_round_trip(self, tmp_path):
+        """
+        CSV columns are converted to the input types and results are written as CSV
+        """
+        write_csv(tmp_path / "in.csv", 20, extra_rows=[["bad", "two", "single", "true"]])
+
+        report = run_bulk(str(tmp_path / "in.csv"), str(tmp_path / "out.csv"))
+
+        with open(tmp_path / "out.csv", newline="") as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        expected = WinterSupplementCalculator.calculate_supplement(make_input(1))
+        assert len(rows) == 20
+        assert rows[1] == {
+            "id": "bulk_1",
+            "isEligible": "true",
+            "baseAmount": str(expected["baseAmount"]),
+            "childrenAmount": str(expected["childrenAmount"]),
+            "supplementAmount": str(expected["supplementAmount"])
+        }
+        assert report["errors"] == 1
+
+    def test_format_conversion(self, tmp_path):
+        write_csv(tmp_path / "in.csv", 10)
+
+        run_bulk(str(tmp_path / "in.csv"), str(tmp_path / "out.jsonl"))
+
+        assert read_ndjson(tmp_path / "out.jsonl") == [
+            WinterSupplementCalculator.calculate_supplement(make_input(index)) for index in range(10)
+        ]
+
+    def test_processes_keep_input_order(self, tmp_path):
+        """
+        Chunks processed in worker processes are written in input order
+        """
+        write_ndjson(tmp_path / "in.ndjson", 2000)
+
+        run_bulk(str(tmp_path / "in.ndjson"), str(tmp_path / "inline.ndjson"), chunk_size=100)
+        report = run_bulk(str(tmp_path / "in.ndjson"), str(tmp_path / "parallel.ndjson"), processes=2, chunk_size=100)
+
+        assert (tmp_path / "parallel.ndjson").read_bytes() == (tmp_path / "inline.ndjson").read_bytes()
+        assert report["results"] == 2000
+
+    @pytest.mark.parametrize("processes", [0, 2])
+    def test_mapped_input_matches_stream(self, tmp_path, processes):
+        """
+        Memory-mapped input gives the same results and errors as reading line by line
+        """
+        write_ndjson(tmp_path / "in.ndjson", 300, extra_lines=["not json", "\r", json.dumps(make_input(7))])
+        with open(tmp_path / "in.ndjson", "ab") as ndjson_file:
+            ndjson_file.write(b'{"id": "crlf", "numberOfChildren": 1, "familyComposition": "single", '
+                              b'"familyUnitInPayForDecember": true}\r\n\x0c\n["no newline"]')
+
+        reports = {}
+        for use_mmap in (False, True):
+            reports[use_mmap] = run_bulk(str(tmp_path / "in.ndjson"), str(tmp_path / f"out-{use_mmap}.ndjson"),
+                                         errors_path=str(tmp_path / f"errors-{use_mmap}.ndjson"),
+                                         processes=processes, chunk_size=40, use_mmap=use_mmap)
+
+        assert (tmp_path / "out-True.ndjson").read_bytes() == (tmp_path / "out-False.ndjson").read_bytes()
+        assert (tmp_path / "errors-True.ndjson").read_bytes() == (tmp_path / "errors-False.ndjson").read_bytes()
+        assert [error["line"] for error in read_ndjson(tmp_path / "errors-True.ndjson")] == [301, 306]
+        assert reports[True]["results"] == reports[False]["results"] == 302
+        assert reports[True]["errors"] == reports[False]["errors"] == 2
+
+    @pytest.mark.parametrize("use_mmap", [False, True])
+    def test_unordered_output(self, tmp_path, use_mmap):
+        """
+        Unordered output holds the same results and errors, chunk by chunk
+        """
+        write_ndjson(tmp_path / "in.ndjson", 1000, extra_lines=["not json"])
+
+        report = run_bulk(str(tmp_path / "in.ndjson"), str(tmp_path / "out.ndjson"), errors_path=str(tmp_path / "errors.ndjson"),
+                          processes=2, chunk_size=50, use_mmap=use_mmap, ordered=False)
+
+        assert sorted(read_ndjson(tmp_path / "out.ndjson"), key=lambda result: int(result["id"].split("_")[1])) == [
+            WinterSupplementCalculator.calculate_supplement(make_input(index)) for index in range(1000)
+        ]
+        assert [error["line"] for error in read_ndjson(tmp_path / "errors.ndjson")] == [1001]
+        assert (report["results"], report["errors"], report["ordered"]) == (1000, 1, False)
+
+    @pytest.mark.parametrize("processes", [0, 2])
+    def test_chunk_reports(self, tmp_path, processes):
+        """
+        Each chunk gets a report of its counts, errors by code, timing and worker
+        """
+        write_ndjson(tmp_path / "in.ndjson", 25, extra_lines=["not json", json.dumps({"id": "x"}), "[]"])
+
+        report = run_bulk(str(tmp_path / "in.ndjson"), str(tmp_path / "out.ndjson"), processes=processes,
+                          chunk_size=10, use_mmap=False, chunk_report_path=str(tmp_path / "chunks.ndjson"))
+
+        chunks = read_ndjson(tmp_path / "chunks.ndjson")
+        assert [(chunk["chunk"], chunk["firstLine"], chunk["records"], chunk["results"]) for chunk in chunks] == [
+            (0, 1, 10, 10), (1, 11, 10, 10), (2, 21, 8, 5)
+        ]
+        assert chunks[2]["errorCodes"] == {"INVALID_JSON": 1, "INVALID_INPUT": 2}
+        assert all(chunk["seconds"] >= 0 for chunk in chunks)
+        workers = {chunk["worker"] for chunk in chunks}
+        if processes == 0:
+            assert workers == {os.getpid()}
+        else:
+            assert os.getpid() not in workers
+        assert report["chunks"] == len(chunks)
+
+    def test_warm_up(self):
+        """
+        Warming up a process leaves the calculation unchanged
+        """
+        warm_up()
+
+        assert WinterSupplementCalculator.calculate_supplement(make_input(1))["supplementAmount"] == 140.0
+
+    def test_iter_lines(self):
+        """
+        Lines are memoryview slices of the buffer, numbered from the start of the range
+        """
+        buffer = b'{"a": 1}\n\n  \n{"b": 2}\r\n{"c": 3}'
+
+        lines = list(iter_lines(buffer, start=9, first_line=2))
+
+        assert all(isinstance(line, memoryview) and line.obj is buffer for _, line in lines)
+        assert [(number, line.tobytes()) for number, line in lines] == [(4, b'{"b": 2}\r'), (5, b'{"c": 3}')]
+
+    def test_chunk_bounds(self):
+        """
+        Ranges cover the buffer in whole lines with the line number of each range's first line
+        """
+        buffer = b"".join(b"x" * (index % 7) + b"\n" for index in range(1000)) + b"last"
+
+        bounds = list(chunk_bounds(buffer, 50))
+
+        assert bounds[0][:2] == (1, 0)
+        assert bounds[-1][2] == len(buffer)
+        for (line, start, end), (next_line, next_start, _) in zip(bounds, bounds[1:]):
+            assert end == next_start
+            assert buffer[end - 1:end] == b"\n"
+            assert next_line == line + buffer[start:end].count(b"\n")
+        assert 15 <= len(bounds) <= 25
+
+    def test_chunk_bounds_do_not_copy_ranges(self):
+        """
+        Lines are counted on the buffer itself; only the fixed-size sample is ever copied
+        """
+        copied = []
+
+        class Buffer(bytes):
+            def __getitem__(self, key):
+                if isinstance(key, slice):
+                    copied.append(len(range(*key.indices(len(self)))))
+                return super().__getitem__(key)
+
+        data = b"".join(b"x" * (index % 50) + b"\n" for index in range(20000))
+
+        bounds = list(chunk_bounds(Buffer(data), 1000))
+
+        assert len(bounds) > 10
+        assert [line for line, _, _ in bounds] == [1 + data[:start].count(b"\n") for _, start, _ in bounds]
+        assert copied == [65536]
+
+    def test_empty_mapped_input(self, tmp_path):
+        (tmp_path / "in.ndjson").write_bytes(b"")
+
+        report = run_bulk(str(tmp_path / "in.ndjson"), str(tmp_path / "out.ndjson"), use_mmap=True)
+
+        assert (report["records"], report["chunks"]) == (0, 0)
+        assert (tmp_path / "out.ndjson").read_bytes() == b""
+
+    def test_constant_memory(self, tmp_path):
+        """
+        Memory use depends on the chunk size, not on the size of the input
+        """
+        write_ndjson(tmp_path / "in.ndjson", 20000)
+
+        tracemalloc.start()
+        try:
+            run_bulk(str(tmp_path / "in.ndjson"), str(tmp_path / "out.ndjson"), chunk_size=500)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        input_size = (tmp_path / "in.ndjson").stat().st_size
+        assert peak < input_size / 4
+
+    def test_read_chunks(self, tmp_path):
+        write_csv(tmp_path / "in.csv", 5)
+
+        with open(tmp_path / "in.csv", "rb") as stream:
+            chunks = list(read_chunks(stream, "csv", 2))
+
+        assert [len(chunk) for _, chunk in chunks] == [2, 2, 1]
+        assert chunks[0][0] == ["id", "numberOfChildren", "familyComposition", "familyUnitInPayForDecember"]
+        assert chunks[0][1][0] == (2, ["bulk_0", "0", "single", "false"])
+
+    @pytest.mark.parametrize("path, default, expected", [
+        ("in.csv", "ndjson", "csv"),
+        ("IN.CSV", "ndjson", "csv"),
+        ("in.jsonl", "csv", "ndjson"),
+        ("in.ndjson", "csv", "ndjson"),
+        ("-", "csv", "csv"),
+        ("data.txt", "ndjson", "ndjson")
+    ])
+    def test_detect_format(self, path, default, expected):
+        assert detect_format(path, default) == expected
+
+    @pytest.mark.parametrize("kwargs", [
+        {"processes": -1}, {"chunk_size": 0}, {"input_format": "xml"}, {"input_format": "csv", "use_mmap": True}
+    ])
+    def test_invalid_arguments(self, tmp_path, kwargs):
+        with pytest.raises(ValueError):
+            run_bulk(str(tmp_path / "in.ndjson"), str(tmp_path / "out.ndjson"), **kwargs)
+
+    def test_main_subcommand(self):
+        args = parse_args(["bulk", "in.csv", "-o", "out.ndjson", "--processes", "4"])
+
+        assert args.command == "bulk"
+        assert (args.input, args.output, args.processes, args.chunk_size) == ("in.csv", "out.ndjson", 4, 10000)
+        assert (args.mmap, args.ordered, args.chunk_report) == (None, True, None)
+        args = parse_args(["bulk", "in.ndjson", "--unordered", "--chunk-report", "chunks.ndjson"])
+        assert (args.ordered, args.chunk_report) == (False, "chunks.ndjson")
+        assert parse_args(["bulk", "in.ndjson", "--no-mmap"]).mmap is False
+        assert parse_args(["--workers", "2"]).command is None
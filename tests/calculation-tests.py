@@ -1,5 +1,43 @@
+import copy
+import importlib.util
+import random
+import sys
+
 import pytest
 from winter_supplement_engine.calculator import WinterSupplementCalculator
+from winter_supplement_engine.rules import CompiledRules
+
+
+BATCH_BACKENDS = [
+    "python",
+    pytest.param("numpy", marks=pytest.mark.skipif(
+        importlib.util.find_spec("numpy") is None, reason="numpy is not installed"
+    ))
+]
+
+
+def rules_with(**changes):
+    """
+    Compile a copy of the installed rules definition with some top-level keys replaced.
+    """
+    definition = copy.deepcopy(WinterSupplementCalculator.rules.definition)
+    definition.update(changes)
+    return CompiledRules(definition)
+
+
+OTHER_RULES = [
+    rules_with(eligibility=[{"field": "numberOfChildren", "min": 1}]),
+    rules_with(eligibility=[{"field": "familyComposition", "in": ["couple"]},
+                            {"field": "numberOfChildren", "max": 2}]),
+    rules_with(eligibility=[{"field": "familyComposition", "equals": "single"},
+                            {"field": "familyUnitInPayForDecember", "equals": False}]),
+    rules_with(eligibility=[{"field": "numberOfChildren", "in": [0, 5, "five"]}]),
+    rules_with(eligibility=[], amounts={
+        "baseAmount": {"rate": "single"},
+        "childrenAmount": {"field": "familyUnitInPayForDecember", "times": "child_rate"}
+    }),
+    rules_with(amounts={"baseAmount": {"lookup": "numberOfChildren", "default": 7.5}}, total="supplementAmount")
+]
 
 
 class TestSupplementCalculations:
@@ -145,3 +183,130 @@ class TestSupplementCalculations:
         
         # Ensure input data remains unchanged
         assert input_data == original_input, "Input data should not be modified"
+
+
+class TestBatchCalculations:
+    def generate_inputs(self, num_scenarios):
+        """
+        Generate random, schema-valid calculation inputs.
+        """
+        return [
+            {
+                "id": f"batch_{i}",
+                "numberOfChildren": random.choice([0, 1, 2, 5, 500, sys.maxsize]),
+                "familyComposition": random.choice(["single", "couple"]),
+                "familyUnitInPayForDecember": random.choice([True, False])
+            } for i in range(num_scenarios)
+        ]
+
+    @pytest.mark.parametrize("backend", BATCH_BACKENDS)
+    def test_batch_matches_scalar(self, backend):
+        """
+        Batch results must be identical, value and type, to the scalar path
+        """
+        inputs = self.generate_inputs(500)
+        expected = [WinterSupplementCalculator.calculate_supplement(item) for item in inputs]
+
+        results = WinterSupplementCalculator.calculate_batch(inputs, backend=backend)
+
+        assert results == expected
+        for result in results:
+            assert type(result['isEligible']) is bool
+            assert all(type(result[key]) is float for key in ("baseAmount", "childrenAmount", "supplementAmount"))
+
+    @pytest.mark.parametrize("backend", BATCH_BACKENDS)
+    def test_columnar_batch_with_composition_codes(self, backend):
+        """
+        Columnar input accepts integer composition codes and returns result columns
+        """
+        columns = {
+            "id": ["a", "b", "c"],
+            "numberOfChildren": [0, 2, 3],
+            "familyComposition": [0, 1, 1],
+            "familyUnitInPayForDecember": [True, True, False]
+        }
+
+        results = WinterSupplementCalculator.calculate_batch(columns, backend=backend)
+
+        assert results == {
+            "id": ["a", "b", "c"],
+            "isEligible": [True, True, False],
+            "baseAmount": [60.0, 120.0, 0.0],
+            "childrenAmount": [0.0, 40.0, 0.0],
+            "supplementAmount": [60.0, 160.0, 0.0]
+        }
+
+    def test_columnar_batch_with_numpy_arrays(self):
+        """
+        numpy array columns produce plain Python result values
+        """
+        np = pytest.importorskip("numpy")
+        columns = {
+            "id": ["a", "b", "c"],
+            "numberOfChildren": np.array([0, 2, 3]),
+            "familyComposition": np.array([0, 1, 7]),  # 7 is not a known composition
+            "familyUnitInPayForDecember": np.array([True, False, True])
+        }
+
+        results = WinterSupplementCalculator.calculate_batch(columns)
+
+        assert results["supplementAmount"] == [60.0, 0.0, 60.0]
+        assert type(results["isEligible"][0]) is bool
+        assert type(results["baseAmount"][0]) is float
+
+    @pytest.mark.parametrize("backend", BATCH_BACKENDS)
+    def test_empty_batch(self, backend):
+        """
+        Empty batches produce empty results
+        """
+        assert WinterSupplementCalculator.calculate_batch([], backend=backend) == []
+
+    def test_unknown_backend(self):
+        """
+        Unknown backends are rejected
+        """
+        with pytest.raises(ValueError):
+            WinterSupplementCalculator.calculate_batch([], backend="gpu")
+
+    @pytest.mark.parametrize("backend", BATCH_BACKENDS)
+    @pytest.mark.parametrize("rules", OTHER_RULES, ids=lambda rules: rules.fingerprint)
+    def test_batch_follows_rules(self, backend, rules):
+        """
+        Record and columnar batches agree with the single path under any rules definition
+        """
+        inputs = self.generate_inputs(200)
+        expected = [WinterSupplementCalculator.calculate_supplement(item, rules=rules) for item in inputs]
+        columns = {field: [item[field] for item in inputs] for field in inputs[0]}
+
+        results = WinterSupplementCalculator.calculate_batch(inputs, backend=backend, rules=rules)
+        column_results = WinterSupplementCalculator.calculate_batch(columns, backend=backend, rules=rules)
+
+        assert results == expected
+        assert column_results == {field: [result[field] for result in expected] for field in rules.result_fields}
+        assert all(type(result["isEligible"]) is bool for result in results)
+
+    @pytest.mark.parametrize("backend", BATCH_BACKENDS)
+    def test_batch_uses_installed_rules(self, backend):
+        rules = WinterSupplementCalculator.rules
+        WinterSupplementCalculator.install_rules(OTHER_RULES[0])
+        try:
+            results = WinterSupplementCalculator.calculate_batch({
+                "id": ["x"], "numberOfChildren": [2], "familyComposition": [1], "familyUnitInPayForDecember": [False]
+            }, backend=backend)
+        finally:
+            WinterSupplementCalculator.install_rules(rules)
+
+        assert results["isEligible"] == [True]
+        assert results["supplementAmount"] == [160.0]
+
+    def test_numpy_falls_back_to_rows(self):
+        """
+        Columns numpy cannot hold as numbers, such as very large children counts, are calculated row by row
+        """
+        pytest.importorskip("numpy")
+        inputs = [{"id": "huge", "numberOfChildren": 2 ** 70, "familyComposition": "single",
+                   "familyUnitInPayForDecember": True}]
+
+        results = WinterSupplementCalculator.calculate_batch(inputs, backend="numpy")
+
+        assert results == [WinterSupplementCalculator.calculate_supplement(inputs[0])]
@@ -0,0 +1,212 @@
+import copy
+import json
+
+import pytest
+from unittest.mock import Mock, MagicMock, patch
+
+from winter_supplement_engine.calculator import WinterSupplementCalculator
+from winter_supplement_engine.config import MQTT_INPUT_TOPIC_BASE, MQTT_OUTPUT_TOPIC_BASE
+from winter_supplement_engine.dedup import DedupStore
+from winter_supplement_engine.models import SupplementResult
+from winter_supplement_engine.mqtt_client import WinterSupplementMQTTClient
+from winter_supplement_engine.rules import CompiledRules
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestDedupStore:
+    def test_replays_recorded_output(self):
+        """
+        A recorded request is found again; a different payload on the same topic is not
+        """
+        store = DedupStore()
+        store.record("in/1", b'{"id": "a"}', "out/1", '{"result": 1}')
+
+        assert store.lookup("in/1", b'{"id": "a"}') == ("out/1", b'{"result": 1}')
+        assert store.lookup("in/1", b'{"id": "b"}') is None
+        assert store.lookup("in/2", b'{"id": "a"}') is None
+        assert store.stats()["hits"] == 1
+        assert store.stats()["misses"] == 2
+
+    def test_entries_expire(self):
+        """
+        Requests are forgotten once their ttl has passed
+        """
+        clock = FakeClock()
+        store = DedupStore(ttl=10, clock=clock)
+        store.record("in/1", b"a", "out/1", b"r")
+
+        clock.now += 9
+        assert store.lookup("in/1", b"a") is not None
+        clock.now += 2
+        assert store.lookup("in/1", b"a") is None
+        assert store.stats()["expired"] == 1
+        assert store.stats()["size"] == 0
+
+    def test_size_bound_evicts_oldest(self):
+        """
+        The oldest request is evicted once the store is full
+        """
+        store = DedupStore(maxsize=2)
+        for i in range(3):
+            store.record(f"in/{i}", b"p", f"out/{i}", b"r")
+
+        assert store.lookup("in/0", b"p") is None
+        assert store.lookup("in/2", b"p") == ("out/2", b"r")
+        assert store.stats()["evicted"] == 1
+
+    def test_on_disk_backing_survives_restart(self, tmp_path):
+        """
+        With a path, unexpired entries are reloaded by a new store
+        """
+        clock = FakeClock()
+        path = str(tmp_path / "dedup.sqlite")
+        store = DedupStore(ttl=10, path=path, clock=clock)
+        store.record("in/1", b"a", "out/1", b"r1")
+        store.record("in/2", b"b", "out/2", b"r2")
+        clock.now += 5
+        store.record("in/3", b"c", "out/3", b"r3")
+        store.close()
+
+        clock.now += 6  # the first two entries have now expired
+        restarted = DedupStore(ttl=10, path=path, clock=clock)
+        assert restarted.lookup("in/1", b"a") is None
+        assert restarted.lookup("in/3", b"c") == ("out/3", b"r3")
+        assert restarted.stats()["persistent"] is True
+        restarted.close()
+
+    @pytest.mark.parametrize("kwargs", [{"maxsize": 0}, {"ttl": 0}])
+    def test_invalid_configuration(self, kwargs):
+        """
+        Size and ttl must be positive
+        """
+        with pytest.raises(ValueError):
+            DedupStore(**kwargs)
+
+    def test_context_is_part_of_the_key(self):
+        """
+        An output recorded under one context, such as a rules fingerprint, is not replayed under another
+        """
+        store = DedupStore()
+        store.record("in/1", b"p", "out/1", b"r", context=b"rules-1")
+
+        assert store.lookup("in/1", b"p", b"rules-1") == ("out/1", b"r")
+        assert store.lookup("in/1", b"p", b"rules-2") is None
+        assert store.lookup("in/1", b"p") is None
+
+
+class TestClientDedup:
+    def test_duplicate_message_is_replayed(self):
+        """
+        A redelivered request republishes the original result without recomputing it
+        """
+        with patch('winter_supplement_engine.mqtt_client.DEDUP_CACHE_SIZE', 100), \
+                patch('winter_supplement_engine.mqtt_client.RESULT_CACHE_SIZE', 0):
+            mqtt_client = WinterSupplementMQTTClient()
+        mock_client = Mock()
+        input_data = {
+            "id": "redelivered",
+            "numberOfChildren": 1,
+            "familyComposition": "single",
+            "familyUnitInPayForDecember": True
+        }
+        msg = MagicMock()
+        msg.topic = f"{MQTT_INPUT_TOPIC_BASE}dedup_topic"
+        msg.payload = json.dumps(input_data).encode()
+
+        mqtt_client._on_message(mock_client, None, msg)
+        with patch.object(WinterSupplementCalculator, 'calculate_supplement') as calculate:
+            mqtt_client._on_message(mock_client, None, msg)
+        calculate.assert_not_called()
+
+        assert mock_client.publish.call_count == 2
+        first, second = mock_client.publish.call_args_list
+        assert second.args[0] == f"{MQTT_OUTPUT_TOPIC_BASE}dedup_topic"
+        assert json.loads(second.args[1]) == json.loads(first.args[1])
+        assert mqtt_client.stats()["messages"]["replayed"] == 1
+        assert mqtt_client.stats()["dedup"]["hits"] == 1
+
+    def test_failed_requests_are_not_remembered(self):
+        """
+        Only published results are recorded, so invalid requests are not replayed
+        """
+        with patch('winter_supplement_engine.mqtt_client.DEDUP_CACHE_SIZE', 100):
+            mqtt_client = WinterSupplementMQTTClient()
+        msg = MagicMock()
+        msg.topic = f"{MQTT_INPUT_TOPIC_BASE}dedup_topic"
+        msg.payload = json.dumps({"id": "invalid"}).encode()
+
+        mqtt_client._on_message(Mock(), None, msg)
+
+        assert mqtt_client.stats()["dedup"]["size"] == 0
+
+    def test_not_replayed_after_rules_reload(self):
+        """
+        A duplicate arriving after new rules are installed is calculated under the new rules
+        """
+        with patch('winter_supplement_engine.mqtt_client.DEDUP_CACHE_SIZE', 100):
+            mqtt_client = WinterSupplementMQTTClient()
+        mock_client = Mock()
+        msg = MagicMock()
+        msg.topic = f"{MQTT_INPUT_TOPIC_BASE}dedup_topic"
+        msg.payload = json.dumps({"id": "reloaded", "numberOfChildren": 1, "familyComposition": "single",
+                                  "familyUnitInPayForDecember": True}).encode()
+        definition = copy.deepcopy(WinterSupplementCalculator.rules.definition)
+        definition["version"] = "2025.1"
+        definition["rates"]["child_rate"] = 25.0
+        rules = WinterSupplementCalculator.rules
+
+        mqtt_client._on_message(mock_client, None, msg)
+        try:
+            WinterSupplementCalculator.install_rules(CompiledRules(definition, SupplementResult))
+            mqtt_client._on_message(mock_client, None, msg)
+        finally:
+            WinterSupplementCalculator.install_rules(rules)
+
+        first, second = [json.loads(call.args[1]) for call in mock_client.publish.call_args_list]
+        assert (first["childrenAmount"], second["childrenAmount"]) == (20.0, 25.0)
+        assert mqtt_client.stats()["messages"]["replayed"] == 0
+
+    def test_dedup_errors_end_the_message(self):
+        """
+        A failing dedup lookup counts the message as failed, so it does not stay in flight and trip admission
+        """
+        with patch('winter_supplement_engine.mqtt_client.DEDUP_CACHE_SIZE', 100), \
+                patch('winter_supplement_engine.mqtt_client.MAX_CONCURRENT_REQUESTS', 1):
+            mqtt_client = WinterSupplementMQTTClient()
+        mock_client = Mock()
+        msg = MagicMock()
+        msg.topic = f"{MQTT_INPUT_TOPIC_BASE}dedup_topic"
+        msg.payload = json.dumps({"id": "lookup-error", "numberOfChildren": 1, "familyComposition": "single",
+                                  "familyUnitInPayForDecember": True}).encode()
+
+        with patch.object(mqtt_client.dedup_store, 'lookup', side_effect=RuntimeError("dedup store broken")):
+            for _ in range(3):
+                mqtt_client._on_message(mock_client, None, msg)
+        mqtt_client._on_message(mock_client, None, msg)
+
+        stats = mqtt_client.stats()
+        assert stats["messages"] == {"received": 4, "published": 1, "replayed": 0, "failed": 3}
+        assert stats["inFlight"] == 0
+        assert stats["admission"]["overloaded"] == 0
+        mock_client.publish.assert_called_once()
+
+    def test_dedup_record_errors_keep_the_published_count(self):
+        with patch('winter_supplement_engine.mqtt_client.DEDUP_CACHE_SIZE', 100):
+            mqtt_client = WinterSupplementMQTTClient()
+        msg = MagicMock()
+        msg.topic = f"{MQTT_INPUT_TOPIC_BASE}dedup_topic"
+        msg.payload = json.dumps({"id": "record-error", "numberOfChildren": 1, "familyComposition": "single",
+                                  "familyUnitInPayForDecember": True}).encode()
+
+        with patch.object(mqtt_client.dedup_store, 'record', side_effect=RuntimeError("dedup store broken")):
+            mqtt_client._on_message(Mock(), None, msg)
+
+        stats = mqtt_client.stats()
+        assert (stats["messages"]["published"], stats["messages"]["failed"], stats["inFlight"]) == (1, 0, 0)
@@ -0,0 +1,114 @@
+import json
+import threading
+import time
+
+import pytest
+from unittest.mock import patch
+
+from winter_supplement_engine.loadgen import LoadGenerator, compare_reports, main, percentile
+from winter_supplement_engine.local_broker import LocalBroker
+from winter_supplement_engine.mqtt_client import WinterSupplementMQTTClient
+
+
+@pytest.fixture
+def broker():
+    with LocalBroker() as local_broker:
+        yield local_broker
+
+
+@pytest.fixture
+def engine(broker):
+    """
+    Engine client connected to the local broker on a background thread.
+    """
+    with patch('winter_supplement_engine.mqtt_client.MQTT_BROKER', "127.0.0.1"), \
+            patch('winter_supplement_engine.mqtt_client.MQTT_PORT', broker.port):
+        mqtt_client = WinterSupplementMQTTClient()
+        thread = threading.Thread(target=mqtt_client.connect, daemon=True)
+        thread.start()
+        deadline = time.monotonic() + 10
+        while broker.stats["connections"] < 1 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.2)  # let the engine subscribe
+        yield mqtt_client
+        mqtt_client.client.disconnect()
+        thread.join(10)
+
+
+class TestReportHelpers:
+    @pytest.mark.parametrize("q, expected", [(50, 5), (95, 10), (99, 10), (10, 1), (100, 10)])
+    def test_percentile(self, q, expected):
+        """
+        Percentiles use the nearest-rank method
+        """
+        assert percentile(list(range(1, 11)), q) == expected
+
+    def test_percentile_empty(self):
+        assert percentile([], 50) is None
+
+    def test_compare_reports(self):
+        """
+        Comparisons give the relative change of throughput, drops and latency
+        """
+        baseline = {"throughput": 1000.0, "dropRate": 0.0, "latencyMs": {"p50": 2.0, "p99": 10.0}}
+        current = {"throughput": 1500.0, "dropRate": 0.01, "latencyMs": {"p50": 1.0, "p99": 10.0}}
+
+        comparison = compare_reports(baseline, current)
+
+        assert comparison["throughput"]["change"] == 0.5
+        assert comparison["latencyP50Ms"]["change"] == -0.5
+        assert comparison["latencyP99Ms"]["change"] == 0.0
+        assert comparison["dropRate"]["change"] is None  # no baseline drops to compare against
+
+    def test_invalid_load(self):
+        with pytest.raises(ValueError):
+            LoadGenerator(rate=0)
+
+
+class TestLoadGenerator:
+    @pytest.mark.integration
+    def test_round_trips_through_engine(self, broker, engine):
+        """
+        Every request published across many topics is answered and timed
+        """
+        report = LoadGenerator("127.0.0.1", broker.port, rate=200, duration=0.5, topic_ids=10, qos=1).run()
+
+        assert report["sent"] == 100
+        assert report["received"] == 100
+        assert report["dropped"] == 0
+        assert report["dropRate"] == 0.0
+        assert report["throughput"] > 0
+        latency = report["latencyMs"]
+        assert 0 < latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["max"]
+        assert engine.stats()["messages"]["published"] == 100
+
+    @pytest.mark.integration
+    def test_unanswered_requests_are_dropped(self, broker):
+        """
+        Without an engine every request counts as dropped
+        """
+        report = LoadGenerator("127.0.0.1", broker.port, rate=100, duration=0.2, drain_timeout=0.2).run()
+
+        assert report["dropped"] == report["sent"] == 20
+        assert report["dropRate"] == 1.0
+        assert report["throughput"] is None
+        assert report["latencyMs"]["p99"] is None
+
+
+class TestBenchmarkCommand:
+    @pytest.mark.integration
+    def test_end_to_end_report(self, tmp_path):
+        """
+        The command starts a broker and the engine, runs the load and saves the JSON report
+        """
+        output = tmp_path / "report.json"
+        baseline = tmp_path / "baseline.json"
+        baseline.write_text(json.dumps({"throughput": 100.0, "dropRate": 0.0, "latencyMs": {"p50": 1.0}}))
+
+        main(["--rate", "200", "--duration", "0.5", "--topics", "5",
+              "--output", str(output), "--baseline", str(baseline)])
+
+        report = json.loads(output.read_text())
+        assert report["sent"] == report["received"] == 100
+        assert report["config"]["broker"] == "local"
+        assert report["comparison"]["throughput"]["baseline"] == 100.0
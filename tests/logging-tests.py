@@ -0,0 +1,155 @@
+import io
+import json
+import logging
+import threading
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from winter_supplement_engine.config import MQTT_INPUT_TOPIC_BASE
+from winter_supplement_engine.logging_utils import LogSampler, configure_logging
+from winter_supplement_engine.mqtt_client import WinterSupplementMQTTClient
+
+
+@pytest.fixture
+def named_logger(request):
+    """
+    Logger registered with the logging module, so level changes take effect immediately
+    """
+    logger = logging.getLogger(f"logging-tests.{request.node.name}")
+    yield logger
+    logger.setLevel(logging.NOTSET)
+
+
+@pytest.fixture
+def isolated_logger(request):
+    """
+    Logger with no handlers and no parent, so records never reach the root logger
+    """
+    # Not registered through getLogger, so pytest does not attach its capture handlers
+    logger = logging.Logger(f"logging-tests.{request.node.name}")
+    yield logger
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+
+class TestLogSampler:
+    @pytest.mark.parametrize("rate, expected", [(1, 10), (3, 4), (10, 1)])
+    def test_rate(self, named_logger, rate, expected):
+        """
+        One line in every rate is let through, starting with the first
+        """
+        named_logger.setLevel(logging.INFO)
+        sampler = LogSampler(named_logger, rate)
+        assert sum(sampler() for _ in range(10)) == expected
+
+    def test_disabled_level(self, named_logger):
+        """
+        Nothing is let through, or counted, while the level is disabled
+        """
+        named_logger.setLevel(logging.WARNING)
+        sampler = LogSampler(named_logger, 2)
+        assert not any(sampler() for _ in range(10))
+
+        named_logger.setLevel(logging.INFO)
+        assert sampler()
+
+    def test_invalid_rate(self, named_logger):
+        with pytest.raises(ValueError):
+            LogSampler(named_logger, 0)
+
+
+class TestConfigureLogging:
+    def config(self, **overrides):
+        return {"level": "INFO", "format": "%(levelname)s %(message)s", **overrides}
+
+    def test_sync(self, isolated_logger):
+        """
+        Records are written straight to the stream
+        """
+        stream = io.StringIO()
+        assert configure_logging(self.config(), isolated_logger, stream) is None
+
+        isolated_logger.info("hello %s", "world")
+        isolated_logger.debug("hidden")
+
+        assert stream.getvalue() == "INFO hello world\n"
+
+    def test_async_formats_on_listener_thread(self, isolated_logger):
+        """
+        Records are formatted and written by the listener, not the logging thread
+        """
+        stream = io.StringIO()
+        listener = configure_logging(self.config(**{"async": True}), isolated_logger, stream)
+        formatted_on = []
+
+        class Argument:
+            def __str__(self):
+                formatted_on.append(threading.current_thread())
+                return "lazy"
+
+        try:
+            isolated_logger.info("value %s", Argument())
+        finally:
+            listener.stop()
+
+        assert stream.getvalue() == "INFO value lazy\n"
+        assert formatted_on and threading.current_thread() not in formatted_on
+
+    def test_existing_handlers_left_alone(self, isolated_logger):
+        """
+        Like basicConfig, an already configured logger is not changed
+        """
+        handler = logging.NullHandler()
+        isolated_logger.addHandler(handler)
+
+        assert configure_logging(self.config(**{"async": True}), isolated_logger) is None
+        assert isolated_logger.handlers == [handler]
+
+
+class TestClientLogging:
+    def test_published_lines_are_sampled(self, caplog):
+        """
+        Only one in every sample_rate published results is logged
+        """
+        with patch.dict('winter_supplement_engine.mqtt_client.LOGGING_CONFIG', {"sample_rate": 5}):
+            mqtt_client = WinterSupplementMQTTClient()
+        client = MagicMock()
+
+        with caplog.at_level(logging.INFO, logger="winter_supplement_engine.mqtt_client"):
+            for i in range(10):
+                msg = MagicMock()
+                msg.topic = f"{MQTT_INPUT_TOPIC_BASE}sampled"
+                msg.payload = json.dumps({
+                    "id": f"sampled_{i}",
+                    "numberOfChildren": 1,
+                    "familyComposition": "single",
+                    "familyUnitInPayForDecember": True
+                }).encode()
+                mqtt_client._on_message(client, None, msg)
+
+        assert client.publish.call_count == 10
+        assert [record.message for record in caplog.records if record.message.startswith("Published")] == [
+            "Published result for ID: sampled_0",
+            "Published result for ID: sampled_5"
+        ]
+
+    def test_debug_lines_when_enabled(self, caplog):
+        """
+        Per-message debug lines are still written at DEBUG level
+        """
+        mqtt_client = WinterSupplementMQTTClient()
+        msg = MagicMock()
+        msg.topic = f"{MQTT_INPUT_TOPIC_BASE}debug"
+        msg.payload = json.dumps({
+            "id": "debug_1",
+            "numberOfChildren": 0,
+            "familyComposition": "couple",
+            "familyUnitInPayForDecember": False
+        }).encode()
+
+        with caplog.at_level(logging.DEBUG, logger="winter_supplement_engine.mqtt_client"):
+            mqtt_client._on_message(MagicMock(), None, msg)
+
+        assert "Extracted topic ID: debug" in caplog.text
+        assert "Publishing result to output topic" in caplog.text
@@ -0,0 +1,220 @@
+import json
+import logging
+import urllib.error
+import urllib.request
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from winter_supplement_engine.config import MQTT_INPUT_TOPIC_BASE
+from winter_supplement_engine.metrics import (
+    NULL_STAGE_TIMER,
+    Histogram,
+    MetricsReporter,
+    MetricsServer,
+    PipelineMetrics
+)
+from winter_supplement_engine.mqtt_client import WinterSupplementMQTTClient
+
+
+VALID_INPUT = {
+    "id": "metrics_1",
+    "numberOfChildren": 2,
+    "familyComposition": "couple",
+    "familyUnitInPayForDecember": True
+}
+
+
+def make_message(payload):
+    msg = MagicMock()
+    msg.topic = f"{MQTT_INPUT_TOPIC_BASE}metrics"
+    msg.payload = payload
+    return msg
+
+
+class TestHistogram:
+    def test_buckets(self):
+        """
+        Values are counted in the first bucket whose bound they do not exceed
+        """
+        histogram = Histogram((0.001, 0.01))
+        for value in (0.0005, 0.001, 0.005, 1.0):
+            histogram.observe(value)
+
+        assert histogram.counts == [2, 1, 1]
+        assert histogram.count == 4
+        assert histogram.sum == pytest.approx(1.0065)
+
+    def test_quantile(self):
+        """
+        Quantiles are interpolated within the bucket holding them
+        """
+        histogram = Histogram((0.001, 0.002))
+        assert histogram.quantile(0.5) is None
+
+        for _ in range(10):
+            histogram.observe(0.0015)
+
+        assert histogram.quantile(0.5) == pytest.approx(0.0015)
+        assert histogram.quantile(1.0) == pytest.approx(0.002)
+
+
+class TestPipelineMetrics:
+    def test_sampling(self):
+        """
+        Only one in every sample_rate messages is timed
+        """
+        metrics = PipelineMetrics(sample_rate=4)
+        timers = [metrics.timer() for _ in range(10)]
+        for timer in timers:
+            if timer is not NULL_STAGE_TIMER:
+                metrics.message_finished(timer)
+
+        assert [timer is not NULL_STAGE_TIMER for timer in timers] == [True, False, False, False] * 2 + [True, False]
+        assert metrics.snapshot()["latency"]["total"]["count"] == 3
+
+    def test_render(self):
+        """
+        Rendered metrics follow the Prometheus text format with cumulative buckets
+        """
+        metrics = PipelineMetrics(buckets=(0.001, 0.01))
+        timer = metrics.timer()
+        timer.stages += [("decode", 0.0005), ("publish", 0.005)]
+        metrics.message_finished(timer)
+        metrics.error("json")
+
+        text = metrics.render({"received": 3, "failed": 1}, in_flight=2)
+
+        assert text.endswith("\n")
+        assert 'winter_supplement_messages_total{status="received"} 3' in text
+        assert 'winter_supplement_errors_total{type="json"} 1' in text
+        assert "# TYPE winter_supplement_stage_latency_seconds histogram" in text
+        assert 'winter_supplement_stage_latency_seconds_bucket{stage="publish",le="0.001"} 0' in text
+        assert 'winter_supplement_stage_latency_seconds_bucket{stage="publish",le="0.01"} 1' in text
+        assert 'winter_supplement_stage_latency_seconds_bucket{stage="publish",le="+Inf"} 1' in text
+        assert 'winter_supplement_stage_latency_seconds_count{stage="decode"} 1' in text
+        assert "winter_supplement_in_flight_messages 2" in text
+
+
+class TestClientMetrics:
+    @pytest.fixture
+    def mqtt_client(self):
+        with patch('winter_supplement_engine.mqtt_client.METRICS_SAMPLE_RATE', 1):
+            return WinterSupplementMQTTClient()
+
+    def test_stage_latencies(self, mqtt_client):
+        """
+        A calculated message records every stage; a cache hit skips validation and encoding
+        """
+        mqtt_client._on_message(MagicMock(), None, make_message(json.dumps(VALID_INPUT).encode()))
+        mqtt_client._on_message(MagicMock(), None, make_message(json.dumps(VALID_INPUT).encode()))
+
+        latency = mqtt_client.stats()["metrics"]["latency"]
+        assert latency["total"]["count"] == 2
+        assert latency["decode"]["count"] == 2
+        assert latency["calculate"]["count"] == 2
+        assert latency["publish"]["count"] == 2
+        assert latency["validate_output"]["count"] == 1
+        assert latency["encode"]["count"] == 1
+        assert mqtt_client.stats()["inFlight"] == 0
+
+    @pytest.mark.parametrize("payload, error_type", [
+        (b"{invalid json}", "json"),
+        (json.dumps({**VALID_INPUT, "numberOfChildren": -1}).encode(), "input_validation")
+    ])
+    def test_errors_by_type(self, mqtt_client, payload, error_type):
+        """
+        Failed messages are counted by error type
+        """
+        mqtt_client._on_message(MagicMock(), None, make_message(payload))
+
+        metrics = mqtt_client.stats()["metrics"]
+        assert metrics["errors"][error_type] == 1
+        assert sum(metrics["errors"].values()) == 1
+        assert metrics["latency"]["publish"]["count"] == 0
+
+    def test_output_validation_error(self, mqtt_client):
+        """
+        Output validation failures are counted separately
+        """
+        with patch('winter_supplement_engine.calculator.WinterSupplementCalculator.calculate_supplement',
+                   return_value={"id": "bad"}):
+            mqtt_client._on_message(MagicMock(), None, make_message(json.dumps(VALID_INPUT).encode()))
+
+        assert mqtt_client.stats()["metrics"]["errors"]["output_validation"] == 1
+
+    def test_disabled(self):
+        """
+        With metrics disabled no metrics are recorded
+        """
+        with patch('winter_supplement_engine.mqtt_client.METRICS_ENABLED', False):
+            mqtt_client = WinterSupplementMQTTClient()
+        mqtt_client._on_message(MagicMock(), None, make_message(json.dumps(VALID_INPUT).encode()))
+
+        assert mqtt_client.metrics is None
+        assert "metrics" not in mqtt_client.stats()
+
+
+class TestMetricsEndpoint:
+    def test_metrics_endpoint(self):
+        """
+        The client's metrics are served over HTTP on /metrics
+        """
+        with patch('winter_supplement_engine.mqtt_client.METRICS_SAMPLE_RATE', 1):
+            mqtt_client = WinterSupplementMQTTClient()
+        mqtt_client._on_message(MagicMock(), None, make_message(json.dumps(VALID_INPUT).encode()))
+        server = MetricsServer(mqtt_client.metrics_text, port=0).start()
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+                assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+                body = response.read().decode()
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(f"http://127.0.0.1:{server.port}/other")
+            assert error.value.code == 404
+        finally:
+            server.stop()
+
+        assert 'winter_supplement_messages_total{status="published"} 1' in body
+        assert 'winter_supplement_message_latency_seconds_count 1' in body
+
+    def test_client_starts_and_stops_endpoint(self):
+        """
+        A configured metrics port is served only between start_metrics and stop_metrics
+        """
+        probe = MetricsServer(lambda: "", port=0).start()
+        port = probe.port
+        probe.stop()
+
+        mqtt_client = WinterSupplementMQTTClient(metrics_port=port)
+        mqtt_client.start_metrics()
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+                assert response.status == 200
+        finally:
+            mqtt_client.stop_metrics()
+
+        assert mqtt_client.metrics_server is None
+
+
+class TestMetricsReporter:
+    def test_report(self, caplog):
+        """
+        Reports log the stats with the message rate since the previous report
+        """
+        now = [100.0]
+        received = [0]
+        reporter = MetricsReporter(
+            lambda: {"messages": {"received": received[0]}},
+            interval=10,
+            logger=logging.getLogger("metrics-tests"),
+            clock=lambda: now[0]
+        )
+        reporter._last = (now[0], received[0])
+        now[0] += 2.0
+        received[0] = 50
+
+        with caplog.at_level(logging.INFO, logger="metrics-tests"):
+            reporter.report()
+
+        report = json.loads(caplog.records[-1].message.split("Metrics: ", 1)[1])
+        assert report["messagesPerSecond"] == 25.0
@@ -0,0 +1,131 @@
+import json
+import sys
+
+import pytest
+from jsonschema import ValidationError
+
+from winter_supplement_engine.calculator import WinterSupplementCalculator
+from winter_supplement_engine.models import RequestDecoder, SupplementRequest, SupplementResult, as_dict
+from winter_supplement_engine.result_cache import ResultCache
+from winter_supplement_engine.schemas import validate_input, validate_output
+from winter_supplement_engine.serialization import get_serializer
+
+
+VALID = {"id": "a", "numberOfChildren": 2, "familyComposition": "couple", "familyUnitInPayForDecember": True}
+
+PAYLOADS = [
+    VALID,
+    {**VALID, "numberOfChildren": 0, "familyComposition": "single", "familyUnitInPayForDecember": False},
+    {**VALID, "numberOfChildren": sys.maxsize * 10},  # beyond int64
+    {**VALID, "numberOfChildren": 2.0},  # integral floats are integers in JSON Schema
+    {**VALID, "extra": "ignored"},
+    {**VALID, "numberOfChildren": -1},
+    {**VALID, "numberOfChildren": 2.5},
+    {**VALID, "numberOfChildren": True},
+    {**VALID, "numberOfChildren": "2"},
+    {**VALID, "familyComposition": "triple"},
+    {**VALID, "familyUnitInPayForDecember": 1},
+    {**VALID, "id": 1},
+    {key: value for key, value in VALID.items() if key != "id"},
+    [],
+    "text",
+    None
+]
+
+
+@pytest.fixture(params=["typed", "schema"])
+def decoder(request):
+    """
+    Request decoder using the single-pass typed path, or only the schema path
+    """
+    # stdlib json keeps integers beyond 64 bits exact, so decoded values compare equal
+    decoder = RequestDecoder(get_serializer("json"))
+    if request.param == "schema":
+        decoder._decoder = None
+    elif decoder._decoder is None:
+        pytest.skip("msgspec is not installed")
+    return decoder
+
+
+class TestRequestDecoder:
+    @pytest.mark.parametrize("data", PAYLOADS)
+    def test_matches_schema_validation(self, decoder, data):
+        """
+        Decoding accepts exactly the payloads validate_input accepts, with the same values
+        """
+        payload = json.dumps(data).encode()
+        try:
+            validate_input(data)
+        except ValidationError as expected:
+            with pytest.raises(ValidationError) as raised:
+                decoder.decode(payload)
+            assert raised.value.message == expected.message
+        else:
+            request = decoder.decode(payload)
+            assert isinstance(request, SupplementRequest)
+            assert request.to_dict() == {key: data[key] for key in request.to_dict()}
+
+    @pytest.mark.parametrize("payload", [b"{invalid json}", b"", b'{"id": "a"'])
+    def test_invalid_json(self, decoder, payload):
+        """
+        Malformed payloads raise JSONDecodeError
+        """
+        with pytest.raises(json.JSONDecodeError):
+            decoder.decode(payload)
+
+    def test_decode_lines(self, decoder):
+        """
+        Newline-delimited requests decode in one pass; any rejected line leaves it to line-by-line decoding
+        """
+        lines = b"\n".join(json.dumps(data).encode() for data in PAYLOADS[:2])
+        buffer = memoryview(lines + b"\n\n  \r\n" + lines)
+
+        if decoder._decoder is None:
+            assert decoder.decode_lines(buffer) is None
+        else:
+            assert decoder.decode_lines(buffer) == [SupplementRequest.from_dict(data) for data in PAYLOADS[:2] * 2]
+        assert decoder.decode_lines(lines + b"\n{invalid json}") is None
+        assert decoder.decode_lines(lines + b"\n" + json.dumps(PAYLOADS[5]).encode()) is None
+
+
+class TestModels:
+    def test_request_round_trip(self):
+        """
+        Requests convert to and from input dicts unchanged
+        """
+        request = SupplementRequest.from_dict(VALID)
+        assert request.to_dict() == VALID
+        assert request == SupplementRequest(**VALID)
+        assert not hasattr(request, "__dict__")
+
+    @pytest.mark.parametrize("data", PAYLOADS[:3])
+    def test_typed_calculation_matches_dict(self, data):
+        """
+        Typed calculation gives the same result as the dict API
+        """
+        result = WinterSupplementCalculator.calculate_supplement(SupplementRequest.from_dict(data))
+
+        assert isinstance(result, SupplementResult)
+        assert not hasattr(result, "__dict__")
+        assert result.to_dict() == WinterSupplementCalculator.calculate_supplement(data)
+        validate_output(result.to_dict())
+
+    def test_as_dict(self):
+        """
+        as_dict converts records and passes dicts through
+        """
+        assert as_dict(VALID) is VALID
+        assert as_dict(SupplementRequest.from_dict(VALID)) == VALID
+
+    def test_result_cache_accepts_requests(self):
+        """
+        Requests and their dicts share result cache entries
+        """
+        cache = ResultCache(8)
+        cache.put(VALID, WinterSupplementCalculator.calculate_supplement(VALID))
+
+        request = SupplementRequest.from_dict({**VALID, "id": "b"})
+        result, payload = cache.get(request)
+
+        assert result == {**WinterSupplementCalculator.calculate_supplement(VALID), "id": "b"}
+        assert json.loads(payload) == result
@@ -1,5 +1,8 @@
+import asyncio
 import json
 import os
+import threading
+import time
 
 import pytest
 from unittest.mock import Mock, patch, MagicMock
@@ -7,12 +10,15 @@ import paho.mqtt.client as mqtt
 import logging
 
 from winter_supplement_engine.mqtt_client import WinterSupplementMQTTClient
+from winter_supplement_engine.async_client import AsyncWinterSupplementMQTTClient
 from winter_supplement_engine.calculator import WinterSupplementCalculator
 from winter_supplement_engine.config import (
     MQTT_BROKER,
     MQTT_PORT,
     MQTT_INPUT_TOPIC_BASE,
-    MQTT_OUTPUT_TOPIC_BASE
+    MQTT_OUTPUT_TOPIC_BASE,
+    MQTT_BATCH_INPUT_TOPIC_BASE,
+    MQTT_BATCH_OUTPUT_TOPIC_BASE
 )
 from winter_supplement_engine.schemas import validate_input, validate_output
 
@@ -244,3 +250,202 @@ class TestMQTTIntegration:
 
         # Ensure no publishing occurred
         mock_client.publish.assert_not_called()
+
+    def test_on_message_with_worker_pool(self):
+        """
+        With workers configured, messages are queued and published from the pool
+        """
+        with patch('winter_supplement_engine.mqtt_client.PROCESSING_WORKERS', 2):
+            mqtt_client = WinterSupplementMQTTClient()
+        mock_client = Mock()
+        mqtt_client.client = mock_client
+
+        input_data = {
+            "id": "pooled_message",
+            "numberOfChildren": 2,
+            "familyComposition": "couple",
+            "familyUnitInPayForDecember": True
+        }
+        msg = MagicMock()
+        msg.topic = f"{MQTT_INPUT_TOPIC_BASE}pooled_topic"
+        msg.payload = json.dumps(input_data).encode()
+
+        mqtt_client.processing_pool.start()
+        mqtt_client._on_message(mock_client, None, msg)
+        mqtt_client.processing_pool.stop()
+
+        mock_client.publish.assert_called_once()
+        assert mock_client.publish.call_args[0][0] == f"{MQTT_OUTPUT_TOPIC_BASE}pooled_topic"
+        assert json.loads(mock_client.publish.call_args[0][1])['supplementAmount'] == 160.0
+        assert mqtt_client.stats()['processing']['completed'] == 1
+
+    def test_shared_subscription_group(self):
+        """
+        With a shared group the wildcard subscription goes through $share
+        """
+        mqtt_client = WinterSupplementMQTTClient(shared_group="engines")
+        mock_client = Mock()
+
+        mqtt_client._on_connect(mock_client, None, None, 0)
+
+        mock_client.subscribe.assert_called_once_with(f"$share/engines/{MQTT_INPUT_TOPIC_BASE}+")
+
+    def test_mqtt_v5_protocol(self):
+        """
+        MQTT v5 clients are created when configured and accept v5 CONNACK properties
+        """
+        with patch('winter_supplement_engine.mqtt_client.MQTT_PROTOCOL', '5'):
+            mqtt_client = WinterSupplementMQTTClient()
+        assert mqtt_client.client._protocol == mqtt.MQTTv5
+
+        mock_client = Mock()
+        mqtt_client._on_connect(mock_client, None, {}, 0, properties=None)
+        mock_client.subscribe.assert_called_once_with(f"{MQTT_INPUT_TOPIC_BASE}+")
+
+
+class TestBatchMessages:
+    @pytest.fixture
+    def batch_client(self):
+        """
+        Fixture creating a client with batch topics enabled
+        """
+        with patch('winter_supplement_engine.mqtt_client.MQTT_BATCH_ENABLED', True):
+            yield WinterSupplementMQTTClient()
+
+    def test_subscribes_to_batch_topic(self, batch_client):
+        """
+        With batches enabled the batch input topic is subscribed as well
+        """
+        mock_client = Mock()
+        batch_client._on_connect(mock_client, None, None, 0)
+
+        subscribed = [call.args[0] for call in mock_client.subscribe.call_args_list]
+        assert subscribed == [f"{MQTT_INPUT_TOPIC_BASE}+", f"{MQTT_BATCH_INPUT_TOPIC_BASE}+"]
+
+    def test_batch_with_per_item_errors(self, batch_client):
+        """
+        A batch produces one output message with results and per-item errors in input order
+        """
+        items = [
+            {"id": "a", "numberOfChildren": 1, "familyComposition": "single", "familyUnitInPayForDecember": True},
+            {"id": "b", "numberOfChildren": -1, "familyComposition": "single", "familyUnitInPayForDecember": True},
+            {"id": "c", "numberOfChildren": 0, "familyComposition": "couple", "familyUnitInPayForDecember": False},
+            "not an object"
+        ]
+        msg = MagicMock()
+        msg.topic = f"{MQTT_BATCH_INPUT_TOPIC_BASE}batch_topic"
+        msg.payload = json.dumps({"batchId": "batch-1", "items": items}).encode()
+        mock_client = Mock()
+
+        batch_client._on_message(mock_client, None, msg)
+
+        mock_client.publish.assert_called_once()
+        assert mock_client.publish.call_args[0][0] == f"{MQTT_BATCH_OUTPUT_TOPIC_BASE}batch_topic"
+        payload = json.loads(mock_client.publish.call_args[0][1])
+        assert payload["batchId"] == "batch-1"
+        assert [entry["index"] for entry in payload["results"]] == [0, 1, 2, 3]
+        assert payload["results"][0]["result"] == WinterSupplementCalculator.calculate_supplement(items[0])
+        assert payload["results"][1]["error"]["code"] == "INVALID_INPUT"
+        assert "minimum" in payload["results"][1]["error"]["message"]
+        assert payload["results"][2]["result"]["isEligible"] is False
+        assert payload["results"][3]["error"]["code"] == "INVALID_INPUT"
+
+    def test_invalid_batch_envelope(self, caplog, batch_client):
+        """
+        Envelopes without items are rejected without publishing
+        """
+        msg = MagicMock()
+        msg.topic = f"{MQTT_BATCH_INPUT_TOPIC_BASE}batch_topic"
+        msg.payload = json.dumps({"batchId": "batch-2"}).encode()
+        mock_client = Mock()
+
+        batch_client._on_message(mock_client, None, msg)
+
+        assert "Batch validation failed" in caplog.text
+        mock_client.publish.assert_not_called()
+
+
+class TestAsyncMQTTClient:
+    def test_run_gives_up_after_max_retries(self, caplog):
+        """
+        The asyncio client follows the same retry policy as the blocking client
+        """
+        async_client = AsyncWinterSupplementMQTTClient()
+
+        with patch.object(mqtt.Client, 'connect', side_effect=Exception("Mocked connection failure")), \
+                patch('winter_supplement_engine.async_client.RETRY_DELAY', 0):
+            asyncio.run(async_client.run())
+
+        assert "Maximum connection attempts reached. Exiting." in caplog.text
+
+    def test_connect_runs_off_the_event_loop(self):
+        """
+        Slow connects (DNS, TCP handshake) run on a worker thread while other coroutines keep running
+        """
+        async_client = AsyncWinterSupplementMQTTClient()
+        connect_threads = []
+
+        def slow_connect(*args, **kwargs):
+            connect_threads.append(threading.get_ident())
+            time.sleep(0.3)
+            raise OSError("Mocked connection failure")
+
+        async def run_with_ticker():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            ticker_task = asyncio.get_running_loop().create_task(ticker())
+            await async_client.run()
+            ticker_task.cancel()
+            return threading.get_ident(), ticks
+
+        with patch.object(mqtt.Client, 'connect', side_effect=slow_connect), \
+                patch('winter_supplement_engine.async_client.MAX_RETRIES', 1):
+            loop_thread, ticks = asyncio.run(run_with_ticker())
+
+        assert connect_threads and loop_thread not in connect_threads
+        assert ticks >= 10
+
+    def test_failed_read_disconnects_once(self):
+        """
+        paho reports a failed read through on_disconnect itself; the read hook does not repeat it
+        """
+        async_client = AsyncWinterSupplementMQTTClient()
+
+        with patch.object(async_client.client, 'loop_read', return_value=mqtt.MQTT_ERR_CONN_LOST), \
+                patch.object(async_client, '_on_disconnect') as on_disconnect:
+            async_client._on_readable()
+
+        on_disconnect.assert_not_called()
+
+    def test_on_message_processes_inline(self):
+        """
+        Messages are processed on the event loop as they arrive and published with the same results
+        """
+        async_client = AsyncWinterSupplementMQTTClient()
+        mock_client = Mock()
+        input_data = {
+            "id": "async_message",
+            "numberOfChildren": 1,
+            "familyComposition": "couple",
+            "familyUnitInPayForDecember": True
+        }
+        msg = MagicMock()
+        msg.topic = f"{MQTT_INPUT_TOPIC_BASE}async_topic"
+        msg.payload = json.dumps(input_data).encode()
+
+        async def receive():
+            async_client._loop = asyncio.get_running_loop()
+            async_client._on_message(mock_client, None, msg)
+            assert async_client.stats()["inFlight"] == 0
+
+        asyncio.run(receive())
+
+        mock_client.publish.assert_called_once()
+        assert mock_client.publish.call_args[0][0] == f"{MQTT_OUTPUT_TOPIC_BASE}async_topic"
+        assert json.loads(mock_client.publish.call_args[0][1]) == WinterSupplementCalculator.calculate_supplement(input_data)
@@ -2,8 +2,31 @@ import random
 import concurrent.futures
 import time
 import tracemalloc
+import importlib.util
+import io
+import json
+import logging
+import os
+import threading
+
+import jsonschema
+import paho.mqtt.client as mqtt
 import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
 from winter_supplement_engine.calculator import WinterSupplementCalculator
+from winter_supplement_engine.schemas import INPUT_SCHEMA, INPUT_VALIDATOR, validate_input
+from winter_supplement_engine.mqtt_client import WinterSupplementMQTTClient
+from winter_supplement_engine.serialization import SERIALIZERS, available_serializers, get_serializer
+from winter_supplement_engine.models import RequestDecoder
+from winter_supplement_engine.logging_utils import configure_logging
+from winter_supplement_engine.local_broker import LocalBroker
+from winter_supplement_engine.publishing import OutputPublisher
+from winter_supplement_engine.result_cache import ResultCache, ResultTable
+from winter_supplement_engine.bulk import run_bulk
+from winter_supplement_engine.prescreen import PreScreen
+from winter_supplement_engine.admission import TokenBucketLimiter
+from winter_supplement_engine.result_store import ResultStore
 
 
 class TestPerformanceAndStress:
@@ -135,3 +158,387 @@ class TestPerformanceAndStress:
 
         # Use pytest-benchmark to measure performance
         benchmark(calculate_multiple_supplements)
+
+    @pytest.mark.parametrize("implementation", ["jsonschema.validate", "compiled"])
+    def test_validation_benchmark(self, benchmark, implementation):
+        """
+        Per-message input validation cost: jsonschema.validate versus the precompiled validator
+        """
+        benchmark.group = "input-validation"
+        test_data = self.generate_test_data(100)
+
+        if implementation == "compiled":
+            def validate_messages():
+                for data in test_data:
+                    validate_input(data)
+        else:
+            def validate_messages():
+                for data in test_data:
+                    jsonschema.validate(instance=data, schema=INPUT_SCHEMA)
+
+        benchmark(validate_messages)
+
+    @pytest.mark.parametrize("implementation", [
+        "scalar",
+        "batch-records",
+        "batch-columns-python",
+        pytest.param("batch-columns-numpy", marks=pytest.mark.skipif(
+            importlib.util.find_spec("numpy") is None, reason="numpy is not installed"
+        ))
+    ])
+    def test_batch_calculation_benchmark(self, benchmark, implementation):
+        """
+        Year-end style reprocessing: scalar loop versus the batch API
+        """
+        benchmark.group = "batch-calculation"
+        test_data = self.generate_test_data(10000)
+
+        if implementation == "scalar":
+            benchmark(lambda: [WinterSupplementCalculator.calculate_supplement(data) for data in test_data])
+        elif implementation == "batch-records":
+            benchmark(WinterSupplementCalculator.calculate_batch, test_data)
+        elif implementation == "batch-columns-python":
+            columns = {key: [data[key] for data in test_data] for key in test_data[0]}
+            benchmark(WinterSupplementCalculator.calculate_batch, columns, backend="python")
+        else:
+            import numpy as np
+            codes = WinterSupplementCalculator.FAMILY_COMPOSITION_CODES
+            columns = {
+                "id": [data["id"] for data in test_data],
+                "numberOfChildren": np.array([data["numberOfChildren"] for data in test_data]),
+                "familyComposition": np.array([codes.index(data["familyComposition"]) for data in test_data]),
+                "familyUnitInPayForDecember": np.array([data["familyUnitInPayForDecember"] for data in test_data])
+            }
+            benchmark(WinterSupplementCalculator.calculate_batch, columns, backend="numpy")
+
+    @pytest.mark.parametrize("cache_size", [0, 1024])
+    def test_message_processing_benchmark(self, benchmark, cache_size):
+        """
+        End-to-end _on_message cost (decode, validate, calculate, validate, encode) with and without the result cache
+        """
+        benchmark.group = "message-processing"
+        with patch('winter_supplement_engine.mqtt_client.RESULT_CACHE_SIZE', cache_size):
+            mqtt_client = WinterSupplementMQTTClient()
+        mqtt_client.logger.disabled = True
+        # Plain objects rather than mocks so mock bookkeeping does not dominate the timings
+        broker_client = SimpleNamespace(publish=lambda topic, payload, *args, **kwargs: None)
+        messages = [
+            SimpleNamespace(topic=f"BRE/calculateWinterSupplementInput/{data['id']}", payload=json.dumps(data).encode())
+            for data in self.generate_test_data(100)
+        ]
+
+        def process_messages():
+            for msg in messages:
+                mqtt_client._on_message(broker_client, None, msg)
+
+        try:
+            benchmark(process_messages)
+        finally:
+            mqtt_client.logger.disabled = False
+
+    @pytest.mark.parametrize("name", [
+        pytest.param(name, marks=pytest.mark.skipif(name not in available_serializers(), reason=f"{name} is not installed"))
+        for name in SERIALIZERS
+    ])
+    def test_serializer_benchmark(self, benchmark, name):
+        """
+        Decode request payloads and encode results with each available serializer
+        """
+        benchmark.group = "serializer"
+        serializer = get_serializer(name)
+        payloads = [json.dumps(data).encode() for data in self.generate_test_data(100)]
+        results = [WinterSupplementCalculator.calculate_supplement(data) for data in self.generate_test_data(100)]
+
+        def round_trip():
+            for payload in payloads:
+                serializer.loads(payload)
+            for result in results:
+                serializer.dumps(result)
+
+        benchmark(round_trip)
+
+    @pytest.mark.parametrize("implementation", [
+        "loads+validate",
+        pytest.param("typed", marks=pytest.mark.skipif(
+            importlib.util.find_spec("msgspec") is None, reason="msgspec is not installed"
+        ))
+    ])
+    def test_request_decode_benchmark(self, benchmark, implementation):
+        """
+        Decode and validate request payloads separately, or in one typed pass
+        """
+        benchmark.group = "request-decode"
+        serializer = get_serializer()
+        decoder = RequestDecoder(serializer)
+        payloads = [json.dumps(data).encode() for data in self.generate_test_data(100)]
+
+        def decode_payloads():
+            if implementation == "typed":
+                for payload in payloads:
+                    decoder.decode(payload)
+            else:
+                for payload in payloads:
+                    INPUT_VALIDATOR.validate(serializer.loads(payload))
+
+        benchmark(decode_payloads)
+
+    @pytest.mark.parametrize("mode, sample_rate", [("sync", 1), ("sync", 100), ("async", 1), ("async", 100)])
+    def test_logging_benchmark(self, benchmark, mode, sample_rate):
+        """
+        Process messages with INFO logging written inline or by a listener thread, with and without sampling
+        """
+        benchmark.group = "logging"
+        with patch.dict('winter_supplement_engine.mqtt_client.LOGGING_CONFIG', {"sample_rate": sample_rate}):
+            mqtt_client = WinterSupplementMQTTClient()
+        logger = mqtt_client.logger
+        # Route the client's records to an in-memory stream only, instead of the test log capture
+        logger.propagate = False
+        listener = configure_logging(
+            {"level": "INFO", "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s", "async": mode == "async"},
+            logger,
+            io.StringIO()
+        )
+        broker_client = SimpleNamespace(publish=lambda topic, payload, *args, **kwargs: None)
+        messages = [
+            SimpleNamespace(topic=f"BRE/calculateWinterSupplementInput/{data['id']}", payload=json.dumps(data).encode())
+            for data in self.generate_test_data(100)
+        ]
+
+        def process_messages():
+            for msg in messages:
+                mqtt_client._on_message(broker_client, None, msg)
+
+        try:
+            benchmark(process_messages)
+        finally:
+            if listener:
+                listener.stop()
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+            logger.setLevel(logging.NOTSET)
+            logger.propagate = True
+
+    @pytest.mark.parametrize("metrics_enabled, sample_rate", [(False, 1), (True, 1), (True, 10)])
+    def test_metrics_overhead_benchmark(self, benchmark, metrics_enabled, sample_rate):
+        """
+        Process messages without metrics, and with every or one in ten messages timed
+        """
+        benchmark.group = "metrics"
+        with patch('winter_supplement_engine.mqtt_client.METRICS_ENABLED', metrics_enabled), \
+                patch('winter_supplement_engine.mqtt_client.METRICS_SAMPLE_RATE', sample_rate), \
+                patch('winter_supplement_engine.mqtt_client.RESULT_CACHE_SIZE', 0):
+            mqtt_client = WinterSupplementMQTTClient()
+        mqtt_client.logger.disabled = True
+        broker_client = SimpleNamespace(publish=lambda topic, payload, *args, **kwargs: None)
+        messages = [
+            SimpleNamespace(topic=f"BRE/calculateWinterSupplementInput/{data['id']}", payload=json.dumps(data).encode())
+            for data in self.generate_test_data(100)
+        ]
+
+        def process_messages():
+            for msg in messages:
+                mqtt_client._on_message(broker_client, None, msg)
+
+        try:
+            benchmark(process_messages)
+        finally:
+            mqtt_client.logger.disabled = False
+
+    @pytest.mark.parametrize("implementation", ["hand-written", "compiled"])
+    def test_rules_benchmark(self, benchmark, implementation):
+        """
+        The compiled rules definition against the calculation as it was hand-written
+        """
+        benchmark.group = "rules"
+        test_data = self.generate_test_data(1000)
+        rates = {"single": 60.0, "couple": 120.0, "child_rate": 20.0}
+
+        def hand_written(input_data):
+            if not input_data['familyUnitInPayForDecember']:
+                return {"id": input_data['id'], "isEligible": False, "baseAmount": 0.0,
+                        "childrenAmount": 0.0, "supplementAmount": 0.0}
+            base_amount = rates.get(input_data['familyComposition'], 0.0)
+            children_amount = input_data['numberOfChildren'] * rates['child_rate']
+            return {"id": input_data['id'], "isEligible": True, "baseAmount": base_amount,
+                    "childrenAmount": children_amount, "supplementAmount": base_amount + children_amount}
+
+        calculate = hand_written if implementation == "hand-written" else WinterSupplementCalculator.rules.calculate
+        results = benchmark(lambda: [calculate(data) for data in test_data])
+
+        assert results == [hand_written(data) for data in test_data]
+
+    @pytest.mark.parametrize("implementation", ["calculate", "result-cache", "result-table"])
+    def test_result_table_benchmark(self, benchmark, implementation):
+        """
+        Result and payload per request: building the dict and serializing it, the LRU
+        result cache, and the precomputed table
+        """
+        benchmark.group = "result-table"
+        serializer = get_serializer("auto")
+        test_data = self.generate_test_data(1000)
+
+        if implementation == "calculate":
+            def lookup(data):
+                result = WinterSupplementCalculator.calculate_supplement(data)
+                return result, serializer.dumps(result)
+        elif implementation == "result-cache":
+            cache = ResultCache(dumps=serializer.dumps)
+            for data in test_data:
+                if cache.get(data) is None:
+                    cache.put(data, WinterSupplementCalculator.calculate_supplement(data))
+            lookup = cache.get
+        else:
+            lookup = ResultTable(max_children=10, dumps=serializer.dumps).get
+
+        results = benchmark(lambda: [lookup(data) for data in test_data])
+
+        assert [result for result, _ in results] == [
+            WinterSupplementCalculator.calculate_supplement(data) for data in test_data
+        ]
+
+    @pytest.mark.parametrize("batch_size", [1, 64])
+    def test_publishing_benchmark(self, benchmark, batch_size):
+        """
+        Publish results to a local broker one at a time, and coalesced 64 per corked flush
+        """
+        benchmark.group = "publishing"
+        client = mqtt.Client()
+        with LocalBroker() as broker:
+            client.connect("127.0.0.1", broker.port)
+            thread = threading.Thread(target=client.loop_forever, daemon=True)
+            thread.start()
+            publisher = OutputPublisher(client, batch_size=batch_size, flush_interval=0.001 if batch_size > 1 else 0)
+            publisher.start()
+            payload = json.dumps({"id": "bench", "isEligible": True, "baseAmount": 120.0,
+                                  "childrenAmount": 40.0, "supplementAmount": 160.0}).encode()
+
+            def publish_results():
+                for index in range(1000):
+                    publisher.publish(client, f"BRE/calculateWinterSupplementOutput/{index % 10}", payload)
+                while publisher.stats()["queueDepth"] or client._out_packet:
+                    time.sleep(0.0001)
+
+            try:
+                benchmark(publish_results)
+            finally:
+                publisher.stop()
+                client.disconnect()
+                thread.join(5)
+
+    @pytest.mark.parametrize("input_format", ["ndjson", "csv"])
+    def test_bulk_benchmark(self, benchmark, tmp_path, input_format):
+        """
+        Bulk file processing of 10000 records in the calling process
+        """
+        benchmark.group = "bulk"
+        test_data = self.generate_test_data(10000)
+        input_path = tmp_path / f"in.{input_format}"
+        with open(input_path, "w") as input_file:
+            if input_format == "csv":
+                input_file.write("id,numberOfChildren,familyComposition,familyUnitInPayForDecember\n")
+                input_file.writelines(
+                    f"{data['id']},{data['numberOfChildren']},{data['familyComposition']},"
+                    f"{str(data['familyUnitInPayForDecember']).lower()}\n" for data in test_data
+                )
+            else:
+                input_file.writelines(json.dumps(data) + "\n" for data in test_data)
+
+        report = benchmark(run_bulk, str(input_path), str(tmp_path / "out.ndjson"), chunk_size=1000)
+
+        assert report["results"] == 10000
+
+    @pytest.mark.parametrize("reader", ["file", "mmap"])
+    def test_bulk_reader_benchmark(self, benchmark, tmp_path, reader):
+        """
+        Bulk NDJSON processing reading the file line by line, and decoding memory-mapped chunks in place.
+        Peak traced memory of one run is saved with the benchmark.
+        """
+        benchmark.group = "bulk-reader"
+        input_path = tmp_path / "in.ndjson"
+        with open(input_path, "w") as input_file:
+            input_file.writelines(json.dumps(data) + "\n" for data in self.generate_test_data(20000))
+
+        def run():
+            return run_bulk(str(input_path), str(tmp_path / "out.ndjson"), chunk_size=2000, use_mmap=reader == "mmap")
+
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info["peakMemoryBytes"] = peak
+        print(f"\n{reader} reader peak memory: {peak / 10 ** 6:.2f} MB")
+
+        report = benchmark(run)
+
+        assert report["results"] == 20000
+        assert peak < 10 * 10 ** 6
+
+    @pytest.mark.parametrize("processes", [0, 2, 4])
+    def test_bulk_processes_benchmark(self, benchmark, tmp_path, processes):
+        """
+        Bulk processing of 50000 memory-mapped NDJSON records in this process and in worker pools.
+        Throughput should grow with the pool size up to the number of CPUs.
+        """
+        benchmark.group = "bulk-processes"
+        benchmark.extra_info["cpus"] = os.cpu_count()
+        input_path = tmp_path / "in.ndjson"
+        with open(input_path, "w") as input_file:
+            input_file.writelines(json.dumps(data) + "\n" for data in self.generate_test_data(50000))
+
+        report = benchmark(run_bulk, str(input_path), str(tmp_path / "out.ndjson"), processes=processes, chunk_size=5000)
+
+        assert report["results"] == 50000
+
+    @pytest.mark.parametrize("implementation", ["full-validation", "prescreen"])
+    def test_prescreen_benchmark(self, benchmark, implementation):
+        """
+        Rejecting requests with a missing key: decoding with schema validation, and the pre-screen
+        """
+        benchmark.group = "prescreen"
+        decoder = RequestDecoder(get_serializer("auto"))
+        prescreen = PreScreen(loads=decoder.serializer.loads)
+        payloads = [json.dumps({"id": f"missing_{index}", "numberOfChildren": index % 5}).encode() for index in range(1000)]
+
+        def full_validation(payload):
+            try:
+                decoder.decode(payload)
+            except jsonschema.ValidationError as e:
+                return "missing_keys", e.message
+
+        reject = full_validation if implementation == "full-validation" else prescreen.check
+        rejections = benchmark(lambda: [reject(payload) for payload in payloads])
+
+        assert rejections == [("missing_keys", "'familyComposition' is a required property")] * 1000
+
+    def test_rate_limiter_benchmark(self, benchmark):
+        """
+        Token bucket checks for requests spread over 1000 topic ids
+        """
+        benchmark.group = "admission"
+        limiter = TokenBucketLimiter(rate=1000000, burst=1000000)
+        keys = [f"client-{index % 1000}" for index in range(10000)]
+
+        waits = benchmark(lambda: [limiter.acquire(key) for key in keys])
+
+        assert not any(waits)
+        assert limiter.stats()["clients"] == 1000
+
+    def test_result_store_record_benchmark(self, benchmark, tmp_path):
+        """
+        Cost of storing 1000 published results on the publish path, with the writer batching them
+        """
+        benchmark.group = "result_store"
+        store = ResultStore(str(tmp_path / "results.sqlite"), queue_size=10 ** 7)
+        store.start()
+        payload = json.dumps({"id": "bench", "isEligible": True, "baseAmount": 60.0, "childrenAmount": 0.0,
+                              "supplementAmount": 60.0}).encode()
+
+        try:
+            benchmark(lambda: [store.record("bench", "out", payload, "2024.1") for _ in range(1000)])
+            assert store.flush(timeout=60)
+        finally:
+            store.close()
+        assert store.stats()["dropped"] == 0
+        assert store.stats()["written"] > 0
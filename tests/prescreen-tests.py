@@ -0,0 +1,245 @@
+import json
+
+import jsonschema
+import pytest
+from jsonschema import ValidationError
+from unittest.mock import MagicMock, patch
+
+from winter_supplement_engine.config import (
+    MQTT_BATCH_INPUT_TOPIC_BASE,
+    MQTT_BATCH_OUTPUT_TOPIC_BASE,
+    MQTT_INPUT_TOPIC_BASE,
+    MQTT_OUTPUT_TOPIC_BASE
+)
+from winter_supplement_engine.models import RequestDecoder
+from winter_supplement_engine.mqtt_client import WinterSupplementMQTTClient
+from winter_supplement_engine.prescreen import ERROR_CODES, REJECTION_REASONS, PreScreen
+from winter_supplement_engine.schemas import ERROR_RESULT_SCHEMA, validate_input
+from winter_supplement_engine.serialization import get_serializer
+
+
+VALID_INPUT = {
+    "id": "prescreen_1",
+    "numberOfChildren": 2,
+    "familyComposition": "couple",
+    "familyUnitInPayForDecember": True
+}
+
+PAYLOADS = [
+    json.dumps(VALID_INPUT).encode(),
+    b"  \n" + json.dumps(VALID_INPUT).encode(),
+    json.dumps({key: value for key, value in VALID_INPUT.items() if key != "id"}).encode(),
+    json.dumps({"id": "a"}).encode(),
+    json.dumps({**VALID_INPUT, "numberOfChildren": -1}).encode(),
+    json.dumps({**VALID_INPUT, "note": "numberOfChildren"}).encode(),
+    b'{"\\u0069d": "escaped", "numberOfChildren": 1, "familyComposition": "single", "familyUnitInPayForDecember": true}',
+    b"{invalid json}",
+    b"{",
+    b"[]",
+    b"[1, 2]",
+    b"42",
+    b"null",
+    b"not json",
+    b"",
+    b"   "
+]
+
+
+def make_message(payload, topic=f"{MQTT_INPUT_TOPIC_BASE}prescreen"):
+    msg = MagicMock()
+    msg.topic = topic
+    msg.payload = payload
+    return msg
+
+
+def full_validation_outcome(payload):
+    """
+    Error code of the decoder and schema validator, None for valid payloads
+    """
+    try:
+        RequestDecoder(get_serializer("json")).decode(payload)
+    except json.JSONDecodeError:
+        return "INVALID_JSON"
+    except ValidationError:
+        return "INVALID_INPUT"
+    return None
+
+
+class TestPreScreen:
+    @pytest.mark.parametrize("payload", PAYLOADS)
+    def test_agrees_with_full_validation(self, payload):
+        """
+        Only payloads that full validation rejects are rejected, with the same error code
+        """
+        rejection = PreScreen().check(payload)
+
+        if rejection is not None:
+            assert ERROR_CODES[rejection[0]] == full_validation_outcome(payload)
+
+    @pytest.mark.parametrize("payload, reason", [
+        (json.dumps({"id": "a"}).encode(), "missing_keys"),
+        (b"{invalid json}", "invalid_json"),
+        (b"[]", "not_object"),
+        (b"not json", "invalid_json"),
+        ("text", "invalid_json")
+    ])
+    def test_reasons(self, payload, reason):
+        assert PreScreen().check(payload)[0] == reason
+
+    def test_missing_key_message(self):
+        """
+        Missing keys are reported in the schema validator's words
+        """
+        data = {key: value for key, value in VALID_INPUT.items() if key != "familyComposition"}
+
+        reason, message = PreScreen().check(json.dumps(data).encode())
+
+        with pytest.raises(ValidationError) as expected:
+            validate_input(data)
+        assert (reason, message) == ("missing_keys", expected.value.message)
+
+    def test_size_limit(self):
+        payload = json.dumps({**VALID_INPUT, "id": "x" * 200}).encode()
+
+        assert PreScreen(max_size=100).check(payload)[0] == "too_large"
+        assert PreScreen(max_size=0).check(payload) is None
+        with pytest.raises(ValueError):
+            PreScreen(max_size=-1)
+
+    def test_escaped_keys_are_left_to_validation(self):
+        payload = PAYLOADS[6]
+
+        assert PreScreen().check(payload) is None
+        assert full_validation_outcome(payload) is None
+
+
+class TestErrorResults:
+    @pytest.fixture
+    def mqtt_client(self):
+        with patch('winter_supplement_engine.mqtt_client.ERROR_RESULTS_ENABLED', True):
+            yield WinterSupplementMQTTClient()
+
+    @pytest.mark.parametrize("payload, code", [
+        (b"{invalid json}", "INVALID_JSON"),
+        (json.dumps({"id": "a"}).encode(), "INVALID_INPUT"),
+        (json.dumps({**VALID_INPUT, "numberOfChildren": -1}).encode(), "INVALID_INPUT"),
+        (b"x" * 70000, "PAYLOAD_TOO_LARGE")
+    ])
+    def test_error_result_published(self, mqtt_client, payload, code):
+        """
+        Rejected requests get an error result on their output topic
+        """
+        mock_client = MagicMock()
+
+        mqtt_client._on_message(mock_client, None, make_message(payload))
+
+        mock_client.publish.assert_called_once()
+        topic, body = mock_client.publish.call_args[0][:2]
+        result = json.loads(body)
+        assert topic == f"{MQTT_OUTPUT_TOPIC_BASE}prescreen"
+        assert result["error"]["code"] == code
+        jsonschema.validate(result, ERROR_RESULT_SCHEMA)
+        assert mqtt_client.stats()["rejections"]["errorResults"] == 1
+
+    @pytest.mark.parametrize("payload, request_id", [
+        (json.dumps({**VALID_INPUT, "numberOfChildren": -1}).encode(), "prescreen_1"),
+        (json.dumps({"id": "partial"}).encode(), "partial"),
+        (json.dumps({**VALID_INPUT, "id": 7}).encode(), None),
+        (b"{invalid json}", None),
+        (json.dumps({**VALID_INPUT, "id": "x" * 70000}).encode(), None)
+    ])
+    def test_error_result_carries_request_id(self, mqtt_client, payload, request_id):
+        """
+        Error results echo the request id whenever the rejected payload is an object with one
+        """
+        mock_client = MagicMock()
+
+        mqtt_client._on_message(mock_client, None, make_message(payload))
+
+        result = json.loads(mock_client.publish.call_args[0][1])
+        assert result.get("id") == request_id
+        jsonschema.validate(result, ERROR_RESULT_SCHEMA)
+
+    def test_error_topic(self, mqtt_client):
+        mock_client = MagicMock()
+
+        with patch('winter_supplement_engine.mqtt_client.ERROR_TOPIC_BASE', 'BRE/errors/'):
+            mqtt_client._on_message(mock_client, None, make_message(b"not json"))
+
+        assert mock_client.publish.call_args[0][0] == "BRE/errors/prescreen"
+
+    def test_batch_error_result(self, mqtt_client):
+        mock_client = MagicMock()
+        msg = make_message(json.dumps({"batchId": "b"}).encode(), f"{MQTT_BATCH_INPUT_TOPIC_BASE}prescreen")
+
+        with patch('winter_supplement_engine.mqtt_client.MQTT_BATCH_ENABLED', True):
+            mqtt_client._on_message(mock_client, None, msg)
+
+        topic, body = mock_client.publish.call_args[0][:2]
+        assert topic == f"{MQTT_BATCH_OUTPUT_TOPIC_BASE}prescreen"
+        assert json.loads(body)["error"]["code"] == "INVALID_INPUT"
+
+    def test_oversized_batch_is_rejected(self, mqtt_client):
+        """
+        Batches are held to MAX_PAYLOAD_SIZE before they are decoded, and counted as too large
+        """
+        mock_client = MagicMock()
+        items = [{**VALID_INPUT, "id": f"item-{index}"} for index in range(10)]
+        msg = make_message(json.dumps({"batchId": "b", "items": items}).encode(),
+                           f"{MQTT_BATCH_INPUT_TOPIC_BASE}prescreen")
+        mqtt_client.prescreen.max_size = 200
+
+        with patch('winter_supplement_engine.mqtt_client.MQTT_BATCH_ENABLED', True), \
+                patch.object(mqtt_client.serializer, 'loads', side_effect=AssertionError("decoded")):
+            mqtt_client._on_message(mock_client, None, msg)
+
+        topic, body = mock_client.publish.call_args[0][:2]
+        assert topic == f"{MQTT_BATCH_OUTPUT_TOPIC_BASE}prescreen"
+        assert json.loads(body)["error"]["code"] == "PAYLOAD_TOO_LARGE"
+        assert mqtt_client.stats()["rejections"]["reasons"]["too_large"] == 1
+
+    def test_processing_errors_get_no_error_result(self, mqtt_client):
+        """
+        Only invalid requests are answered; failures of valid requests are not
+        """
+        mock_client = MagicMock()
+
+        with patch('winter_supplement_engine.calculator.WinterSupplementCalculator.calculate_supplement',
+                   side_effect=Exception("Unexpected error")):
+            mqtt_client._on_message(mock_client, None, make_message(json.dumps(VALID_INPUT).encode()))
+
+        mock_client.publish.assert_not_called()
+
+    def test_disabled_by_default(self):
+        mqtt_client = WinterSupplementMQTTClient()
+        mock_client = MagicMock()
+
+        mqtt_client._on_message(mock_client, None, make_message(b"not json"))
+
+        mock_client.publish.assert_not_called()
+        assert mqtt_client.stats()["rejections"] == {
+            "reasons": {**dict.fromkeys(REJECTION_REASONS, 0), "invalid_json": 1},
+            "errorResults": 0
+        }
+
+
+class TestRejectionCounters:
+    def test_counted_by_reason(self):
+        """
+        Rejections are counted by reason and also count as failed messages by error type
+        """
+        mqtt_client = WinterSupplementMQTTClient()
+        payloads = [b"not json", b"[]", json.dumps({"id": "a"}).encode(), b"{",
+                    json.dumps({**VALID_INPUT, "numberOfChildren": -1}).encode(), json.dumps(VALID_INPUT).encode()]
+
+        for payload in payloads:
+            mqtt_client._on_message(MagicMock(), None, make_message(payload))
+
+        stats = mqtt_client.stats()
+        assert stats["rejections"]["reasons"] == {
+            "too_large": 0, "not_object": 1, "missing_keys": 1, "invalid_json": 2, "invalid_input": 1
+        }
+        assert stats["messages"]["failed"] == 5
+        assert stats["metrics"]["errors"]["json"] == 2
+        assert stats["metrics"]["errors"]["input_validation"] == 3
+        assert 'winter_supplement_rejections_total{reason="missing_keys"} 1' in mqtt_client.metrics_text()
@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+from winter_supplement_engine.processing import MessageProcessingPool
+
+
+class TestMessageProcessingPool:
+    def test_processes_all_messages(self):
+        """
+        Every submitted message is handled exactly once
+        """
+        handled = []
+        lock = threading.Lock()
+
+        def handler(value):
+            with lock:
+                handled.append(value)
+
+        pool = MessageProcessingPool(handler, workers=4, ordered=False)
+        pool.start()
+        for i in range(200):
+            assert pool.submit(f"topic_{i % 7}", i)
+        pool.stop()
+
+        assert sorted(handled) == list(range(200))
+        stats = pool.stats()
+        assert stats["submitted"] == 200
+        assert stats["completed"] == 200
+        assert stats["queueDepth"] == 0
+
+    def test_ordered_mode_preserves_per_topic_order(self):
+        """
+        Messages sharing a topic are processed in submission order
+        """
+        handled = {}
+        lock = threading.Lock()
+
+        def handler(topic, value):
+            time.sleep(0.0001)
+            with lock:
+                handled.setdefault(topic, []).append(value)
+
+        pool = MessageProcessingPool(handler, workers=4, ordered=True)
+        pool.start()
+        for i in range(300):
+            topic = f"topic_{i % 5}"
+            pool.submit(topic, topic, i)
+        pool.stop()
+
+        for topic, values in handled.items():
+            assert values == sorted(values), f"Out of order for {topic}"
+        assert sum(len(values) for values in handled.values()) == 300
+
+    def test_drop_policy_when_queue_full(self):
+        """
+        With the drop policy a full queue rejects messages instead of blocking
+        """
+        release = threading.Event()
+        pool = MessageProcessingPool(lambda value: release.wait(), workers=1, queue_size=1, queue_full_policy="drop")
+        pool.start()
+
+        results = [pool.submit("topic", i) for i in range(5)]
+        release.set()
+        pool.stop()
+
+        assert results[0] is True
+        assert results.count(False) >= 3
+        assert pool.stats()["dropped"] == results.count(False)
+
+    def test_block_policy_records_backpressure(self):
+        """
+        With the block policy a full queue waits for space and records the stall
+        """
+        pool = MessageProcessingPool(lambda value: time.sleep(0.01), workers=1, queue_size=1, queue_full_policy="block")
+        pool.start()
+        for i in range(5):
+            assert pool.submit("topic", i)
+        pool.stop()
+
+        stats = pool.stats()
+        assert stats["completed"] == 5
+        assert stats["blocked"] > 0
+        assert stats["blockedSeconds"] > 0
+        assert stats["maxQueueDepth"] == 1
+
+    def test_handler_failures_are_counted(self):
+        """
+        Handler exceptions are logged and counted without killing the worker
+        """
+        def handler(value):
+            if value % 2:
+                raise ValueError("odd")
+
+        pool = MessageProcessingPool(handler, workers=1)
+        pool.start()
+        for i in range(10):
+            pool.submit("topic", i)
+        pool.stop()
+
+        stats = pool.stats()
+        assert stats["failed"] == 5
+        assert stats["completed"] == 5
+
+    @pytest.mark.parametrize("kwargs", [
+        {"workers": 0},
+        {"workers": 1, "queue_full_policy": "explode"}
+    ])
+    def test_invalid_configuration(self, kwargs):
+        """
+        Invalid pool configuration is rejected
+        """
+        with pytest.raises(ValueError):
+            MessageProcessingPool(lambda: None, **kwargs)
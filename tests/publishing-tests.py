@@ -0,0 +1,281 @@
+import socket
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+import pytest
+from unittest.mock import MagicMock, patch
+
+from winter_supplement_engine.config import MQTT_INPUT_TOPIC_BASE, MQTT_OUTPUT_TOPIC_BASE
+from winter_supplement_engine.loadgen import LoadGenerator
+from winter_supplement_engine.local_broker import LocalBroker
+from winter_supplement_engine.mqtt_client import WinterSupplementMQTTClient
+from winter_supplement_engine.publishing import OutputPublisher
+
+
+VALID_PAYLOAD = b'{"id": "publish_1", "numberOfChildren": 2, "familyComposition": "couple", "familyUnitInPayForDecember": true}'
+
+
+class RecordingClient:
+    """
+    Stand-in MQTT client recording publishes, optionally holding them until released.
+    """
+
+    def __init__(self, rc=mqtt.MQTT_ERR_SUCCESS):
+        self.rc = rc
+        self.published = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def publish(self, topic, payload, qos=0):
+        self.release.wait(5)
+        self.published.append((topic, payload, qos))
+        return mqtt.MQTTMessageInfo(len(self.published)) if self.rc == 0 else MagicMock(rc=self.rc)
+
+    def socket(self):
+        return None
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestOutputPublisher:
+    def test_direct_publish(self):
+        """
+        Without batching, results are published immediately with the configured QoS
+        """
+        client = RecordingClient()
+        publisher = OutputPublisher(client, qos=1)
+        publisher.start()
+
+        assert publisher.publish(client, "out/1", b"a") is True
+        assert client.published == [("out/1", b"a", 1)]
+        assert publisher.stats()["published"] == 1
+        assert publisher.stats()["batching"] is False
+
+    @pytest.mark.parametrize("kwargs", [{"qos": 3}, {"batch_size": 0}, {"queue_size": 0},
+                                        {"flush_interval": -1}, {"overflow_policy": "spill"}])
+    def test_invalid_arguments(self, kwargs):
+        with pytest.raises(ValueError):
+            OutputPublisher(RecordingClient(), **kwargs)
+
+    def test_batches_flush_in_order(self):
+        """
+        Queued results are flushed in batches, in the order they were published
+        """
+        client = RecordingClient()
+        publisher = OutputPublisher(client, batch_size=10, flush_interval=0.05)
+        publisher.start()
+        try:
+            for index in range(25):
+                assert publisher.publish(client, f"out/{index}", b"x")
+            assert wait_for(lambda: len(client.published) == 25)
+        finally:
+            publisher.stop()
+
+        assert [topic for topic, _, _ in client.published] == [f"out/{index}" for index in range(25)]
+        stats = publisher.stats()
+        assert stats["published"] == 25
+        assert 3 <= stats["flushes"] < 25
+        assert stats["queueDepth"] == 0
+
+    def test_flush_interval_sends_partial_batch(self):
+        """
+        A batch that does not fill up is flushed once the interval passes
+        """
+        client = RecordingClient()
+        publisher = OutputPublisher(client, batch_size=100, flush_interval=0.05)
+        publisher.start()
+        try:
+            publisher.publish(client, "out/1", b"x")
+            assert wait_for(lambda: len(client.published) == 1, timeout=1)
+        finally:
+            publisher.stop()
+
+    def test_stop_flushes_queue(self):
+        client = RecordingClient()
+        client.release.clear()
+        publisher = OutputPublisher(client, batch_size=2, flush_interval=10)
+        publisher.start()
+        for index in range(5):
+            publisher.publish(client, f"out/{index}", b"x")
+        client.release.set()
+        publisher.stop()
+
+        assert len(client.published) == 5
+
+    def _saturate(self, policy):
+        """
+        Fill a two-slot queue while the flusher is stuck on its first batch.
+        """
+        client = RecordingClient()
+        client.release.clear()
+        publisher = OutputPublisher(client, batch_size=1, flush_interval=0.01, queue_size=2, overflow_policy=policy)
+        publisher.start()
+        publisher.publish(client, "out/0", b"x")
+        assert wait_for(lambda: publisher.stats()["queueDepth"] == 0)  # taken by the flusher
+        publisher.publish(client, "out/1", b"x")
+        publisher.publish(client, "out/2", b"x")
+        return client, publisher
+
+    def test_overflow_fail(self):
+        """
+        The "fail" policy rejects new results while the queue is full
+        """
+        client, publisher = self._saturate("fail")
+        assert publisher.publish(client, "out/3", b"x") is False
+        client.release.set()
+        publisher.stop()
+
+        assert [topic for topic, _, _ in client.published] == ["out/0", "out/1", "out/2"]
+        assert publisher.stats()["rejected"] == 1
+
+    def test_overflow_drop_oldest(self):
+        """
+        The "drop-oldest" policy makes room by discarding the oldest queued result
+        """
+        client, publisher = self._saturate("drop-oldest")
+        assert publisher.publish(client, "out/3", b"x") is True
+        client.release.set()
+        publisher.stop()
+
+        assert [topic for topic, _, _ in client.published] == ["out/0", "out/2", "out/3"]
+        assert publisher.stats()["dropped"] == 1
+
+    def test_overflow_block(self):
+        """
+        The "block" policy waits for room, so nothing is lost
+        """
+        client, publisher = self._saturate("block")
+        blocked = threading.Thread(target=publisher.publish, args=(client, "out/3", b"x"))
+        blocked.start()
+        blocked.join(0.1)
+        assert blocked.is_alive()
+
+        client.release.set()
+        blocked.join(5)
+        publisher.stop()
+
+        assert [topic for topic, _, _ in client.published] == ["out/0", "out/1", "out/2", "out/3"]
+        assert publisher.stats()["blocked"] == 1
+
+    def test_client_queue_full(self):
+        """
+        Results refused by paho's outgoing queue limit are reported as rejected
+        """
+        client = RecordingClient(rc=mqtt.MQTT_ERR_QUEUE_SIZE)
+        publisher = OutputPublisher(client, qos=1)
+
+        assert publisher.publish(client, "out/1", b"x") is False
+        assert publisher.stats()["rejected"] == 1
+        assert publisher.stats()["published"] == 0
+
+    @pytest.mark.skipif(not hasattr(socket, "TCP_CORK"), reason="TCP_CORK is Linux only")
+    def test_cork_toggles_socket(self):
+        """
+        Batches are written with the client socket corked, then uncorked
+        """
+        listener = socket.create_server(("127.0.0.1", 0))
+        sock = socket.create_connection(listener.getsockname())
+        try:
+            client = RecordingClient()
+            client.socket = lambda: sock
+            states = []
+            original_publish = client.publish
+
+            def publish(topic, payload, qos=0):
+                states.append(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_CORK))
+                return original_publish(topic, payload, qos)
+
+            client.publish = publish
+            publisher = OutputPublisher(client, batch_size=2)
+            publisher._flush([(client, "out/1", b"x"), (client, "out/2", b"x")])
+
+            assert states == [1, 1]
+            assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_CORK) == 0
+        finally:
+            sock.close()
+            listener.close()
+
+
+class TestClientPublishing:
+    def test_client_applies_flow_control(self):
+        with patch('winter_supplement_engine.mqtt_client.MQTT_MAX_INFLIGHT', 100), \
+                patch('winter_supplement_engine.mqtt_client.MQTT_MAX_QUEUED', 500), \
+                patch('winter_supplement_engine.mqtt_client.MQTT_PUBLISH_QOS', 1):
+            mqtt_client = WinterSupplementMQTTClient()
+
+        assert mqtt_client.client._max_inflight_messages == 100
+        assert mqtt_client.client._max_queued_messages == 500
+        assert mqtt_client.publisher.qos == 1
+        assert mqtt_client.stats()["publishing"]["qos"] == 1
+
+    def test_socket_tuning(self):
+        """
+        Buffer sizes and TCP_NODELAY are applied to the broker socket when it opens
+        """
+        with patch('winter_supplement_engine.mqtt_client.MQTT_SOCKET_SNDBUF', 65536), \
+                patch('winter_supplement_engine.mqtt_client.MQTT_SOCKET_RCVBUF', 32768), \
+                patch('winter_supplement_engine.mqtt_client.MQTT_TCP_NODELAY', True):
+            mqtt_client = WinterSupplementMQTTClient()
+            sock = MagicMock()
+            mqtt_client._on_socket_open(mqtt_client.client, None, sock)
+
+        sock.setsockopt.assert_any_call(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
+        sock.setsockopt.assert_any_call(socket.SOL_SOCKET, socket.SO_RCVBUF, 32768)
+        sock.setsockopt.assert_any_call(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def test_default_socket_untouched(self):
+        mqtt_client = WinterSupplementMQTTClient()
+        sock = MagicMock()
+        mqtt_client._on_socket_open(mqtt_client.client, None, sock)
+
+        sock.setsockopt.assert_not_called()
+
+    def test_rejected_publish_counts_as_failed(self):
+        """
+        A result the publisher refuses is counted as a failed message, not a published one
+        """
+        mqtt_client = WinterSupplementMQTTClient()
+        client = RecordingClient(rc=mqtt.MQTT_ERR_QUEUE_SIZE)
+        msg = MagicMock(topic=f"{MQTT_INPUT_TOPIC_BASE}publish", payload=VALID_PAYLOAD)
+
+        mqtt_client._on_message(client, None, msg)
+
+        stats = mqtt_client.stats()
+        assert stats["messages"]["published"] == 0
+        assert stats["messages"]["failed"] == 1
+        assert stats["metrics"]["errors"]["publish"] == 1
+        assert client.published[0][0] == f"{MQTT_OUTPUT_TOPIC_BASE}publish"
+
+    @pytest.mark.integration
+    def test_batched_qos1_round_trip(self):
+        """
+        With QoS 1 and coalesced flushes every request still gets its result
+        """
+        with LocalBroker() as broker, \
+                patch('winter_supplement_engine.mqtt_client.MQTT_BROKER', "127.0.0.1"), \
+                patch('winter_supplement_engine.mqtt_client.MQTT_PORT', broker.port), \
+                patch('winter_supplement_engine.mqtt_client.MQTT_PUBLISH_QOS', 1), \
+                patch('winter_supplement_engine.mqtt_client.MQTT_MAX_INFLIGHT', 0), \
+                patch('winter_supplement_engine.mqtt_client.PUBLISH_BATCH_SIZE', 16), \
+                patch('winter_supplement_engine.mqtt_client.PUBLISH_FLUSH_INTERVAL', 0.005):
+            mqtt_client = WinterSupplementMQTTClient()
+            thread = threading.Thread(target=mqtt_client.connect, daemon=True)
+            thread.start()
+            assert wait_for(lambda: broker.stats["connections"] >= 1, timeout=10)
+            time.sleep(0.2)  # let the engine subscribe
+            try:
+                report = LoadGenerator("127.0.0.1", broker.port, rate=400, duration=0.5, topic_ids=10, qos=1).run()
+            finally:
+                mqtt_client.client.disconnect()
+                thread.join(10)
+
+        assert report["received"] == report["sent"] == 200
+        publishing = mqtt_client.stats()["publishing"]
+        assert publishing["published"] == 200
+        assert publishing["flushes"] <= 200
@@ -0,0 +1,347 @@
+import json
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+import pytest
+from unittest.mock import MagicMock, patch
+
+from winter_supplement_engine.config import MQTT_BROKER, MQTT_PORT, MQTT_INPUT_TOPIC_BASE, MQTT_OUTPUT_TOPIC_BASE
+from winter_supplement_engine.local_broker import LocalBroker
+from winter_supplement_engine.mqtt_client import WinterSupplementMQTTClient
+from winter_supplement_engine.publishing import OutputPublisher
+from winter_supplement_engine.reconnect import ConnectionMonitor, ExponentialBackoff
+
+
+VALID_INPUT = {
+    "id": "reconnect_1",
+    "numberOfChildren": 1,
+    "familyComposition": "single",
+    "familyUnitInPayForDecember": True
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class OfflineClient:
+    """
+    Stand-in for paho that fails QoS 0 publishes while disconnected, as paho does.
+    """
+
+    def __init__(self):
+        self.connected = False
+        self.published = []
+
+    def publish(self, topic, payload, qos=0):
+        info = MagicMock()
+        if not self.connected and qos == 0:
+            info.rc = mqtt.MQTT_ERR_NO_CONN
+        else:
+            info.rc = mqtt.MQTT_ERR_SUCCESS
+            self.published.append((topic, payload))
+        return info
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+class TestExponentialBackoff:
+    def test_doubles_up_to_maximum(self):
+        backoff = ExponentialBackoff(1, 8, jitter=False)
+
+        assert [backoff.next_delay() for _ in range(6)] == [1, 2, 4, 8, 8, 8]
+        backoff.reset()
+        assert backoff.next_delay() == 1
+
+    def test_full_jitter(self):
+        """
+        Each delay is drawn between 0 and its exponential value
+        """
+        assert [ExponentialBackoff(2, 60, rng=lambda: 0.5).next_delay() for _ in range(2)] == [1.0, 1.0]
+        backoff = ExponentialBackoff(1, 4)
+        delays = [backoff.next_delay() for _ in range(50)]
+
+        assert all(0 <= delay <= 4 for delay in delays)
+        assert delays[0] <= 1
+        assert len(set(delays)) > 1
+
+    def test_many_attempts(self):
+        backoff = ExponentialBackoff(1, 30, jitter=False)
+
+        assert [backoff.next_delay() for _ in range(2000)][-1] == 30
+
+    @pytest.mark.parametrize("args", [(-1, 5), (5, 1), (1, 5, 0.5)])
+    def test_invalid_arguments(self, args):
+        with pytest.raises(ValueError):
+            ExponentialBackoff(*args)
+
+
+class TestConnectionMonitor:
+    def test_reconnect_times(self):
+        clock = FakeClock()
+        monitor = ConnectionMonitor(clock=clock)
+
+        monitor.record_connect()
+        clock.now += 10
+        monitor.record_disconnect(expected=False)
+        monitor.record_disconnect(expected=False)  # Reported again by another callback
+        clock.now += 1.5
+        assert monitor.stats()["downSeconds"] == 1.5
+        monitor.record_failed_attempt()
+        clock.now += 1
+        monitor.record_connect()
+
+        assert monitor.stats() == {
+            "connected": True, "connects": 2, "disconnects": 1, "reconnects": 1, "failedAttempts": 1,
+            "lastReconnectSeconds": 2.5, "totalReconnectSeconds": 2.5, "downSeconds": 0.0
+        }
+        assert monitor.reconnect_histogram().count == 1
+
+    def test_expected_disconnect(self):
+        monitor = ConnectionMonitor()
+        monitor.record_connect()
+
+        monitor.record_disconnect(expected=True)
+
+        assert not monitor.lost
+        assert monitor.stats()["disconnects"] == 0
+
+
+class TestOfflineBuffer:
+    def test_results_flushed_after_reconnect(self):
+        """
+        QoS 0 results published while disconnected are kept and published in order once reconnected
+        """
+        client = OfflineClient()
+        publisher = OutputPublisher(client, offline_buffer_size=10)
+
+        for index in range(3):
+            assert publisher.publish(client, f"out/{index}", b"x")
+        assert client.published == []
+        assert publisher.stats()["offline"] == {"buffered": 3, "dropped": 0, "flushed": 0}
+
+        client.connected = True
+        assert publisher.flush_offline(client) == 3
+
+        assert [topic for topic, _ in client.published] == ["out/0", "out/1", "out/2"]
+        assert publisher.stats()["offline"] == {"buffered": 0, "dropped": 0, "flushed": 3}
+        assert publisher.stats()["published"] == 3
+
+    def test_bounded(self):
+        """
+        The oldest results are dropped once the buffer is full
+        """
+        client = OfflineClient()
+        publisher = OutputPublisher(client, offline_buffer_size=2)
+
+        for index in range(5):
+            publisher.publish(client, f"out/{index}", b"x")
+        client.connected = True
+        publisher.flush_offline(client)
+
+        assert [topic for topic, _ in client.published] == ["out/3", "out/4"]
+        assert publisher.stats()["offline"]["dropped"] == 3
+
+    def test_flush_stops_when_disconnected_again(self):
+        client = OfflineClient()
+        publisher = OutputPublisher(client, offline_buffer_size=10)
+        publisher.publish(client, "out/0", b"x")
+
+        assert publisher.flush_offline(client) == 0
+        assert publisher.stats()["offline"]["buffered"] == 1
+
+    def test_disabled_or_qos1(self):
+        """
+        Without a buffer results are lost as before; QoS 1 results are kept by paho instead
+        """
+        client = OfflineClient()
+        OutputPublisher(client).publish(client, "out/0", b"x")
+        OutputPublisher(client, qos=1, offline_buffer_size=10).publish(client, "out/1", b"x")
+
+        assert client.published == [("out/1", b"x")]
+
+    def test_flushed_on_connect(self):
+        with patch('winter_supplement_engine.mqtt_client.OFFLINE_BUFFER_SIZE', 10):
+            mqtt_client = WinterSupplementMQTTClient()
+        client = OfflineClient()
+        mqtt_client.publisher.publish(client, "out/0", b"x")
+        client.connected = True
+        client.subscribe = MagicMock()
+
+        mqtt_client._on_connect(client, None, {}, 0)
+
+        assert client.published == [("out/0", b"x")]
+
+
+class TestConnectRetries:
+    @pytest.fixture
+    def mqtt_client(self):
+        client = WinterSupplementMQTTClient()
+        client.client = MagicMock(spec=mqtt.Client)
+        return client
+
+    def test_exponential_backoff(self, mqtt_client):
+        mqtt_client.client.connect.side_effect = Exception("Mocked connection failure")
+
+        with patch('winter_supplement_engine.mqtt_client.MAX_RETRIES', 4), \
+                patch('winter_supplement_engine.mqtt_client.RETRY_DELAY', 1), \
+                patch('winter_supplement_engine.mqtt_client.RETRY_MAX_DELAY', 3), \
+                patch('winter_supplement_engine.mqtt_client.RETRY_JITTER', False), \
+                patch('time.sleep') as sleep:
+            mqtt_client.connect()
+
+        assert [call[0][0] for call in sleep.call_args_list] == [1, 2, 3]
+        assert mqtt_client.client.connect.call_count == 4
+        assert mqtt_client.stats()["connection"]["failedAttempts"] == 4
+
+    def test_unlimited_retries(self, mqtt_client):
+        """
+        With MAX_RETRIES 0 the client keeps trying until the broker is back
+        """
+        mqtt_client.client.connect.side_effect = [Exception("down")] * 7 + [0]
+
+        with patch('winter_supplement_engine.mqtt_client.MAX_RETRIES', 0), patch('time.sleep') as sleep:
+            mqtt_client.connect()
+
+        assert sleep.call_count == 7
+        mqtt_client.client.loop_forever.assert_called_once()
+
+    def test_reconnects_after_lost_connection(self, mqtt_client):
+        """
+        A dropped connection is re-established after a backoff delay, and the reconnect is counted
+        """
+        disconnect_codes = iter([mqtt.MQTT_ERR_CONN_LOST, 0])
+
+        def loop_forever():
+            mqtt_client._on_connect(mqtt_client.client, None, {}, 0)
+            mqtt_client._on_disconnect(mqtt_client.client, None, next(disconnect_codes))
+
+        mqtt_client.client.loop_forever.side_effect = loop_forever
+
+        with patch('time.sleep') as sleep:
+            mqtt_client.connect()
+
+        assert mqtt_client.client.connect.call_count == 2
+        assert sleep.call_count == 1
+        stats = mqtt_client.stats()["connection"]
+        assert (stats["connects"], stats["disconnects"], stats["reconnects"]) == (2, 1, 1)
+        assert "winter_supplement_reconnect_seconds_count 1" in mqtt_client.metrics_text()
+        assert "winter_supplement_disconnects_total 1" in mqtt_client.metrics_text()
+
+    def test_refused_connection_is_retried(self, mqtt_client):
+        refusals = iter([5, 0])
+
+        def loop_forever():
+            rc = next(refusals)
+            mqtt_client._on_connect(mqtt_client.client, None, {}, rc)
+            mqtt_client._on_disconnect(mqtt_client.client, None, 0 if rc == 0 else mqtt.MQTT_ERR_CONN_REFUSED)
+
+        mqtt_client.client.loop_forever.side_effect = loop_forever
+
+        with patch('time.sleep'):
+            mqtt_client.connect()
+
+        assert mqtt_client.client.connect.call_count == 2
+        assert mqtt_client.stats()["connection"]["failedAttempts"] == 1
+
+
+class TestPersistentSession:
+    def test_clean_session_off(self):
+        with patch('winter_supplement_engine.mqtt_client.MQTT_CLIENT_ID', 'engine-1'), \
+                patch('winter_supplement_engine.mqtt_client.MQTT_CLEAN_SESSION', False), \
+                patch('winter_supplement_engine.mqtt_client.MQTT_SUBSCRIBE_QOS', 1):
+            mqtt_client = WinterSupplementMQTTClient()
+        mock_client = MagicMock()
+
+        mqtt_client._on_connect(mock_client, None, {"session present": 1}, 0)
+
+        assert mqtt_client.client._client_id == b"engine-1"
+        assert mqtt_client.client._clean_session is False
+        mock_client.subscribe.assert_called_once_with(f"{MQTT_INPUT_TOPIC_BASE}+", qos=1)
+
+    def test_mqtt5_session_expiry(self):
+        with patch('winter_supplement_engine.mqtt_client.MQTT_PROTOCOL', '5'), \
+                patch('winter_supplement_engine.mqtt_client.MQTT_CLIENT_ID', 'engine-1'), \
+                patch('winter_supplement_engine.mqtt_client.MQTT_CLEAN_SESSION', False), \
+                patch('winter_supplement_engine.mqtt_client.MQTT_SESSION_EXPIRY', 600):
+            mqtt_client = WinterSupplementMQTTClient()
+        mqtt_client.client = MagicMock(spec=mqtt.Client)
+
+        with patch('time.sleep'):
+            mqtt_client.connect()
+
+        kwargs = mqtt_client.client.connect.call_args[1]
+        assert mqtt_client.client.connect.call_args[0] == (MQTT_BROKER, MQTT_PORT)
+        assert kwargs["clean_start"] is False
+        assert kwargs["properties"].SessionExpiryInterval == 600
+
+    def test_client_id_required(self):
+        with patch('winter_supplement_engine.mqtt_client.MQTT_CLEAN_SESSION', False):
+            with pytest.raises(ValueError):
+                WinterSupplementMQTTClient()
+
+    def test_requests_queued_while_disconnected(self):
+        """
+        Requests sent while the engine is away are held by the broker and answered after it reconnects
+        """
+        resume = threading.Event()
+        with LocalBroker() as broker, \
+                patch('winter_supplement_engine.mqtt_client.MQTT_BROKER', "127.0.0.1"), \
+                patch('winter_supplement_engine.mqtt_client.MQTT_PORT', broker.port), \
+                patch('winter_supplement_engine.mqtt_client.MQTT_CLIENT_ID', 'engine-1'), \
+                patch('winter_supplement_engine.mqtt_client.MQTT_CLEAN_SESSION', False), \
+                patch('winter_supplement_engine.mqtt_client.MQTT_SUBSCRIBE_QOS', 1), \
+                patch('winter_supplement_engine.mqtt_client.RETRY_DELAY', 0.05), \
+                patch('winter_supplement_engine.mqtt_client.RETRY_MAX_DELAY', 0.05):
+            engine = WinterSupplementMQTTClient()
+            connect = engine.client.connect
+            attempts = []
+
+            def gated_connect(*args, **kwargs):
+                attempts.append(args)
+                if len(attempts) > 1:
+                    resume.wait(10)  # Hold the engine offline until the request is queued
+                return connect(*args, **kwargs)
+
+            engine.client.connect = gated_connect
+            thread = threading.Thread(target=engine.connect, daemon=True)
+            thread.start()
+            requester = mqtt.Client()
+            try:
+                assert wait_for(lambda: engine.connection.connected)
+                time.sleep(0.2)  # let the engine subscribe
+                broker.disconnect_all()
+                assert wait_for(lambda: not engine.connection.connected)
+
+                results = []
+                requester.on_message = lambda client, userdata, msg: results.append(json.loads(msg.payload))
+                requester.connect("127.0.0.1", broker.port)
+                requester.subscribe(f"{MQTT_OUTPUT_TOPIC_BASE}+")
+                requester.loop_start()
+                time.sleep(0.2)
+                requester.publish(f"{MQTT_INPUT_TOPIC_BASE}queued", json.dumps(VALID_INPUT), qos=1)
+                assert wait_for(lambda: broker.stats["received"] == 1)
+                resume.set()
+
+                assert wait_for(lambda: results)
+                assert results[0]["id"] == "reconnect_1"
+                stats = engine.stats()["connection"]
+                assert (stats["connected"], stats["reconnects"]) == (True, 1)
+                assert stats["lastReconnectSeconds"] > 0
+            finally:
+                resume.set()
+                requester.loop_stop()
+                engine.client.disconnect()
+                thread.join(10)
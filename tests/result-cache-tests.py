@@ -0,0 +1,344 @@
+import copy
+import json
+
+import pytest
+from unittest.mock import Mock, MagicMock, patch
+
+from winter_supplement_engine.calculator import WinterSupplementCalculator
+from winter_supplement_engine.config import MQTT_INPUT_TOPIC_BASE
+from winter_supplement_engine.mqtt_client import WinterSupplementMQTTClient
+from winter_supplement_engine.models import SupplementRequest, SupplementResult
+from winter_supplement_engine.result_cache import ResultCache, ResultTable
+from winter_supplement_engine.rules import CompiledRules
+
+
+def make_input(result_id, children=2, composition="couple", eligible=True):
+    return {
+        "id": result_id,
+        "numberOfChildren": children,
+        "familyComposition": composition,
+        "familyUnitInPayForDecember": eligible
+    }
+
+
+@pytest.fixture
+def restore_rules():
+    """
+    Put the built-in rules back after a test installs others.
+    """
+    rules = WinterSupplementCalculator.rules
+    yield
+    WinterSupplementCalculator.install_rules(rules)
+
+
+def install_rules(version="2025.1", eligibility=None):
+    """
+    Install a copy of the built-in rules with another version and, optionally, other eligibility conditions.
+    """
+    definition = copy.deepcopy(WinterSupplementCalculator.rules.definition)
+    definition["version"] = version
+    if eligibility is not None:
+        definition["eligibility"] = eligibility
+    WinterSupplementCalculator.install_rules(CompiledRules(definition, SupplementResult))
+
+
+def cached_calculation(cache, input_data):
+    """
+    Run a calculation through the cache the way the MQTT client does.
+    """
+    cached = cache.get(input_data)
+    if cached:
+        return cached
+    result = WinterSupplementCalculator.calculate_supplement(input_data)
+    return result, cache.put(input_data, result)
+
+
+class TestResultCache:
+    @pytest.mark.parametrize("input_data", [
+        make_input("first"),
+        make_input("quote\"and\\backslash"),
+        make_input("unicode-é☃", children=0, composition="single"),
+        make_input("ineligible", eligible=False)
+    ])
+    def test_hit_matches_fresh_calculation(self, input_data):
+        """
+        Cached results and payloads are identical to calculating and serializing from scratch
+        """
+        cache = ResultCache()
+        cached_calculation(cache, make_input("warm-up", input_data["numberOfChildren"],
+                                             input_data["familyComposition"], input_data["familyUnitInPayForDecember"]))
+
+        result, payload = cache.get(input_data)
+
+        expected = WinterSupplementCalculator.calculate_supplement(input_data)
+        assert result == expected
+        assert list(result) == list(expected)
+        assert payload == json.dumps(expected).encode()
+        assert cache.stats()["hits"] == 1
+
+    def test_ineligible_inputs_keyed_by_every_field(self):
+        """
+        The rules decide eligibility, so inputs without the December flag are not assumed to be ineligible
+        """
+        cache = ResultCache()
+        cached_calculation(cache, make_input("a", children=3, composition="single", eligible=False))
+
+        assert cache.get(make_input("b", children=0, composition="couple", eligible=False)) is None
+        assert cache.stats()["size"] == 1
+
+    def test_rules_with_other_eligibility(self, restore_rules):
+        install_rules(eligibility=[{"field": "numberOfChildren", "min": 1}])
+        cache = ResultCache()
+        cached_calculation(cache, make_input("warm-up", children=0, eligible=False))
+
+        input_data = make_input("x", children=2, eligible=False)
+        assert cache.get(input_data) is None
+        result, payload = cached_calculation(cache, input_data)
+        assert result == WinterSupplementCalculator.calculate_supplement(input_data)
+        assert result["supplementAmount"] == 160.0
+        assert cache.get(input_data)[0] == result
+
+    def test_invalidated_when_rules_version_changes(self, restore_rules):
+        """
+        New rules empty the cache even when their rates are the same
+        """
+        cache = ResultCache()
+        cached_calculation(cache, make_input("a"))
+
+        install_rules(version="2025.1")
+
+        assert cache.get(make_input("b")) is None
+        assert cache.stats()["invalidations"] == 1
+
+    def test_rules_reading_other_fields_bypass_the_cache(self, restore_rules):
+        install_rules(eligibility=[{"field": "id", "in": ["vip"]}])
+        cache = ResultCache()
+
+        cached_calculation(cache, make_input("vip"))
+
+        assert cache.get(make_input("other")) is None
+        assert cache.stats()["size"] == 0
+
+    def test_lru_eviction(self):
+        """
+        The least recently used entry is evicted once the cache is full
+        """
+        cache = ResultCache(maxsize=2)
+        cached_calculation(cache, make_input("a", children=0))
+        cached_calculation(cache, make_input("b", children=1))
+        cache.get(make_input("a", children=0))  # refresh a
+        cached_calculation(cache, make_input("c", children=2))
+
+        assert cache.get(make_input("a", children=0)) is not None
+        assert cache.get(make_input("b", children=1)) is None
+        assert cache.stats()["evictions"] == 1
+        assert cache.stats()["size"] == 2
+
+    def test_invalidated_when_rates_change(self):
+        """
+        Changing SUPPLEMENT_RATES empties the cache so new rates apply immediately
+        """
+        cache = ResultCache()
+        cached_calculation(cache, make_input("a"))
+
+        with patch.dict(WinterSupplementCalculator.SUPPLEMENT_RATES, {"child_rate": 25.0}):
+            assert cache.get(make_input("b")) is None
+            result, payload = cached_calculation(cache, make_input("b"))
+            assert result["childrenAmount"] == 50.0
+            assert cache.stats()["invalidations"] == 1
+
+        assert cache.get(make_input("c")) is None
+        assert cache.stats()["invalidations"] == 2
+
+    def test_invalid_size(self):
+        """
+        The cache needs room for at least one entry
+        """
+        with pytest.raises(ValueError):
+            ResultCache(maxsize=0)
+
+
+class TestClientResultCache:
+    def test_repeat_inputs_hit_the_cache(self):
+        """
+        A repeated calculation skips calculate_supplement and publishes the same payload shape
+        """
+        mqtt_client = WinterSupplementMQTTClient()
+        mock_client = Mock()
+
+        for result_id in ("first", "second"):
+            msg = MagicMock()
+            msg.topic = f"{MQTT_INPUT_TOPIC_BASE}{result_id}"
+            msg.payload = json.dumps(make_input(result_id)).encode()
+            if result_id == "second":
+                with patch.object(WinterSupplementCalculator, 'calculate_supplement') as calculate:
+                    mqtt_client._on_message(mock_client, None, msg)
+                calculate.assert_not_called()
+            else:
+                mqtt_client._on_message(mock_client, None, msg)
+
+        payloads = [json.loads(call.args[1]) for call in mock_client.publish.call_args_list]
+        assert payloads == [
+            WinterSupplementCalculator.calculate_supplement(make_input("first")),
+            WinterSupplementCalculator.calculate_supplement(make_input("second"))
+        ]
+        assert mqtt_client.stats()["resultCache"]["hits"] == 1
+        assert mqtt_client.stats()["resultCache"]["misses"] == 1
+
+    def test_cache_can_be_disabled(self):
+        """
+        RESULT_CACHE_SIZE=0 disables the cache
+        """
+        with patch('winter_supplement_engine.mqtt_client.RESULT_CACHE_SIZE', 0):
+            mqtt_client = WinterSupplementMQTTClient()
+        assert mqtt_client.result_cache is None
+        assert "resultCache" not in mqtt_client.stats()
+
+
+class TestResultTable:
+    @pytest.mark.parametrize("input_data", [
+        make_input("first"),
+        make_input("quote\"and\\backslash", children=10),
+        make_input("unicode-é☃", children=0, composition="single"),
+        make_input("ineligible", children=5, eligible=False)
+    ])
+    def test_matches_fresh_calculation(self, input_data):
+        """
+        Precomputed results and payloads are identical to calculating and serializing from scratch
+        """
+        table = ResultTable(max_children=10)
+
+        result, payload = table.get(input_data)
+
+        expected = WinterSupplementCalculator.calculate_supplement(input_data)
+        assert result == expected
+        assert list(result) == list(expected)
+        assert payload == json.dumps(expected).encode()
+
+    def test_accepts_requests(self):
+        table = ResultTable(max_children=3)
+        request = SupplementRequest.from_dict(make_input("typed", children=3))
+
+        result, _ = table.get(request)
+
+        assert result == WinterSupplementCalculator.calculate_supplement(make_input("typed", children=3))
+
+    def test_out_of_range_falls_back(self):
+        table = ResultTable(max_children=3)
+
+        assert table.get(make_input("many", children=4)) is None
+        assert table.get(make_input("unknown", composition="triple")) is None
+
+    def test_packed_keys_are_unique(self):
+        """
+        Every input has its own slot, with or without the December flag
+        """
+        table = ResultTable(max_children=5)
+        keys = [table.key(in_pay, composition, children)
+                for in_pay in (False, True) for composition in ("single", "couple") for children in range(6)]
+
+        assert len(set(keys)) == len(keys)
+        assert table.key(False, "couple", 99) is None
+        assert table.get(make_input("ineligible", children=99, eligible=False)) is None
+        assert table.stats() == {"size": 24, "maxChildren": 5, "rebuilds": 1}
+
+    def test_rules_with_other_eligibility(self, restore_rules):
+        """
+        The table follows the installed rules' eligibility instead of assuming the December flag decides it
+        """
+        install_rules(eligibility=[{"field": "numberOfChildren", "min": 1}])
+        table = ResultTable(max_children=3)
+
+        for input_data in (make_input("x", children=2, eligible=False), make_input("y", children=0)):
+            result, payload = table.get(input_data)
+            assert result == WinterSupplementCalculator.calculate_supplement(input_data)
+            assert json.loads(payload) == result
+        assert table.get(make_input("x", children=2, eligible=False))[0]["supplementAmount"] == 160.0
+
+    def test_rules_reading_other_fields_leave_the_table_empty(self, restore_rules):
+        install_rules(eligibility=[{"field": "id", "in": ["vip"]}])
+        table = ResultTable(max_children=3)
+
+        assert table.get(make_input("vip")) is None
+        assert table.stats()["size"] == 0
+
+    def test_rebuilt_when_rates_change(self):
+        table = ResultTable(max_children=3)
+
+        with patch.dict(WinterSupplementCalculator.SUPPLEMENT_RATES, {"child_rate": 25.0}):
+            result, _ = table.get(make_input("b"))
+            assert result["childrenAmount"] == 50.0
+
+        result, _ = table.get(make_input("c"))
+        assert result["childrenAmount"] == 40.0
+        assert table.stats()["rebuilds"] == 3
+
+    def test_rules_version(self):
+        table = ResultTable(max_children=1, rules_version=True)
+
+        result, payload = table.get(make_input("v", children=1))
+
+        assert result["rulesVersion"] == WinterSupplementCalculator.rules.version
+        assert json.loads(payload) == result
+
+    def test_invalid_results_left_out(self):
+        """
+        Results failing output validation are not precomputed, so they take the regular path
+        """
+        with patch.dict(WinterSupplementCalculator.SUPPLEMENT_RATES, {"child_rate": -20.0}):
+            table = ResultTable(max_children=2)
+            assert table.get(make_input("negative", children=1)) is None
+            assert table.get(make_input("none", children=0)) is not None
+
+    def test_invalid_size(self):
+        with pytest.raises(ValueError):
+            ResultTable(max_children=-1)
+
+
+class TestClientResultTable:
+    def test_table_serves_before_cache(self):
+        """
+        With the table enabled, in-range requests never reach the calculator or the cache
+        """
+        with patch('winter_supplement_engine.mqtt_client.RESULT_TABLE_ENABLED', True), \
+                patch('winter_supplement_engine.mqtt_client.RESULT_TABLE_MAX_CHILDREN', 3):
+            mqtt_client = WinterSupplementMQTTClient()
+        mock_client = Mock()
+
+        for result_id, children in (("in-range", 3), ("out-of-range", 4)):
+            msg = MagicMock()
+            msg.topic = f"{MQTT_INPUT_TOPIC_BASE}{result_id}"
+            msg.payload = json.dumps(make_input(result_id, children=children)).encode()
+            mqtt_client._on_message(mock_client, None, msg)
+
+        payloads = [json.loads(call.args[1]) for call in mock_client.publish.call_args_list]
+        assert payloads == [
+            WinterSupplementCalculator.calculate_supplement(make_input("in-range", children=3)),
+            WinterSupplementCalculator.calculate_supplement(make_input("out-of-range", children=4))
+        ]
+        stats = mqtt_client.stats()
+        assert stats["resultTable"]["maxChildren"] == 3
+        assert stats["resultCache"]["misses"] == 1
+
+    def test_integral_float_children_miss_the_table(self):
+        """
+        "numberOfChildren": 2.0 passes validation; it falls back to calculation instead of breaking the key
+        """
+        with patch('winter_supplement_engine.mqtt_client.RESULT_TABLE_ENABLED', True):
+            mqtt_client = WinterSupplementMQTTClient()
+        mock_client = Mock()
+        msg = MagicMock()
+        msg.topic = f"{MQTT_INPUT_TOPIC_BASE}float"
+        msg.payload = json.dumps(make_input("float", children=2.0)).encode()
+
+        assert mqtt_client._process_single_message(mock_client, msg)
+
+        assert json.loads(mock_client.publish.call_args[0][1]) == \
+            WinterSupplementCalculator.calculate_supplement(make_input("float", children=2))
+        assert mqtt_client.stats()["messages"]["failed"] == 0
+
+    def test_table_disabled_by_default(self):
+        mqtt_client = WinterSupplementMQTTClient()
+
+        assert mqtt_client.result_table is None
+        assert "resultTable" not in mqtt_client.stats()
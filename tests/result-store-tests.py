@@ -0,0 +1,310 @@
+import io
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+import main
+from winter_supplement_engine import result_store
+from winter_supplement_engine.calculator import WinterSupplementCalculator
+from winter_supplement_engine.config import (
+    MQTT_BATCH_INPUT_TOPIC_BASE,
+    MQTT_BATCH_OUTPUT_TOPIC_BASE,
+    MQTT_INPUT_TOPIC_BASE,
+    MQTT_OUTPUT_TOPIC_BASE
+)
+from winter_supplement_engine.mqtt_client import WinterSupplementMQTTClient
+from winter_supplement_engine.result_store import ResultStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_result(request_id, amount=60.0):
+    return {"id": request_id, "isEligible": True, "baseAmount": amount, "childrenAmount": 0.0,
+            "supplementAmount": amount}
+
+
+def make_payload(request_id, amount=60.0):
+    return json.dumps(make_result(request_id, amount)).encode()
+
+
+def make_message(topic, data):
+    msg = MagicMock()
+    msg.topic = topic
+    msg.payload = json.dumps(data).encode()
+    return msg
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "results.sqlite")
+
+
+class TestResultStore:
+    def test_lookup_by_id(self, store_path):
+        """
+        Every result for an id is kept, most recent first, with its topic, rules version and time
+        """
+        clock = FakeClock()
+        store = ResultStore(store_path, clock=clock)
+        store.record("a", "out/1", make_payload("a", 60.0), "2024.1")
+        clock.now += 10
+        store.record("b", "out/2", make_payload("b"), "2024.1")
+        clock.now += 10
+        store.record("a", "out/1", make_payload("a", 120.0), "2025.1")
+
+        records = store.lookup("a")
+        assert [(record["rulesVersion"], record["recordedAt"]) for record in records] == [("2025.1", 1020.0),
+                                                                                           ("2024.1", 1000.0)]
+        assert records[0] == {"id": "a", "topic": "out/1", "rulesVersion": "2025.1", "recordedAt": 1020.0,
+                              "result": make_result("a", 120.0)}
+        assert store.lookup("a", limit=1) == records[:1]
+        assert store.lookup("missing") == []
+        store.close()
+
+    def test_range_scans(self, store_path):
+        clock = FakeClock()
+        store = ResultStore(store_path, clock=clock)
+        for index in range(10):
+            store.record(f"id-{9 - index}", "out", make_payload(f"id-{9 - index}"), "2024.1" if index < 5 else "2025.1")
+            clock.now += 1
+
+        assert [record["id"] for record in store.scan(since=1002, until=1005)] == ["id-7", "id-6", "id-5"]
+        assert [record["id"] for record in store.scan(id_from="id-2", id_to="id-4")] == ["id-2", "id-3", "id-4"]
+        assert len(store.scan(rules_version="2025.1")) == 5
+        assert len(store.scan(limit=3)) == 3
+        assert len(store.scan(limit=None)) == 10
+        store.close()
+
+    def test_results_persist(self, store_path):
+        store = ResultStore(store_path)
+        store.record("a", "out", make_payload("a"))
+        store.close()
+
+        reopened = ResultStore(store_path)
+        assert [record["id"] for record in reopened.lookup("a")] == ["a"]
+        reopened.close()
+
+    def test_background_writer_batches(self, store_path):
+        """
+        The writer inserts queued results in batches; stop writes whatever is still queued
+        """
+        store = ResultStore(store_path, batch_size=100, flush_interval=5)
+        store.start()
+        for index in range(250):
+            assert store.record(f"id-{index}", "out", make_payload(f"id-{index}"))
+
+        assert store.flush(timeout=10)
+        stats = store.stats()
+        assert stats["written"] == 250
+        assert stats["queueDepth"] == 0
+        assert stats["batches"] < 250
+        store.record("last", "out", make_payload("last"))
+        store.stop()
+        assert len(store.lookup("last")) == 1
+        store.close()
+
+    def test_record_does_not_wait_for_the_database(self, store_path):
+        """
+        With the writer started, recording a result never waits for a write in progress
+        """
+        store = ResultStore(store_path, flush_interval=0)
+        store.start()
+        recorded = threading.Event()
+        with store._db_lock:
+            thread = threading.Thread(target=lambda: (store.record("a", "out", make_payload("a")), recorded.set()))
+            thread.start()
+            assert recorded.wait(5)
+        assert store.flush(timeout=5)
+        assert store.stats()["written"] == 1
+        store.close()
+
+    def test_full_queue_drops_results(self, store_path):
+        """
+        Results beyond the queue size are dropped and counted rather than blocking
+        """
+        store = ResultStore(store_path, batch_size=100, flush_interval=60, queue_size=2)
+        store.start()
+        recorded = [store.record(f"id-{index}", "out", make_payload(f"id-{index}")) for index in range(3)]
+        store.stop()
+
+        assert recorded == [True, True, False]
+        assert store.stats()["dropped"] == 1
+        assert store.stats()["written"] == 2
+        store.close()
+
+    def test_write_errors_are_counted(self, store_path):
+        store = ResultStore(store_path)
+        store.record(None, "out", make_payload("a"))
+
+        assert store.stats()["failed"] == 1
+        assert store.scan() == []
+        store.close()
+
+    @pytest.mark.parametrize("result", [make_result("a"), json.dumps(make_result("a"))])
+    def test_only_published_bytes_are_recorded(self, store_path, result):
+        store = ResultStore(store_path)
+
+        with pytest.raises(TypeError):
+            store.record("a", "out", result)
+        store.close()
+
+    @pytest.mark.parametrize("kwargs", [{"batch_size": 0}, {"queue_size": 0}, {"flush_interval": -1}])
+    def test_invalid_arguments(self, store_path, kwargs):
+        with pytest.raises(ValueError):
+            ResultStore(store_path, **kwargs)
+
+
+class TestResultStoreClient:
+    def test_published_results_are_stored(self, store_path):
+        """
+        Published results are stored as published, with the rules version; rejected requests are not
+        """
+        with patch('winter_supplement_engine.mqtt_client.RESULT_STORE_PATH', store_path):
+            mqtt_client = WinterSupplementMQTTClient()
+        mock_client = MagicMock()
+        data = {"id": "family-x", "numberOfChildren": 2, "familyComposition": "couple",
+                "familyUnitInPayForDecember": True}
+
+        mqtt_client._on_message(mock_client, None, make_message(f"{MQTT_INPUT_TOPIC_BASE}topic", data))
+        mqtt_client._on_message(mock_client, None, make_message(f"{MQTT_INPUT_TOPIC_BASE}topic", {"id": "bad"}))
+
+        records = mqtt_client.result_store.lookup("family-x")
+        published = json.loads(mock_client.publish.call_args_list[0][0][1])
+        assert len(records) == 1
+        assert records[0]["topic"] == f"{MQTT_OUTPUT_TOPIC_BASE}topic"
+        assert records[0]["result"] == published
+        assert records[0]["rulesVersion"] == WinterSupplementCalculator.rules.version
+        assert mqtt_client.result_store.scan() == records
+        assert mqtt_client.stats()["resultStore"]["written"] == 1
+        mqtt_client.result_store.close()
+
+    def test_batch_results_are_stored_per_item(self, store_path):
+        with patch('winter_supplement_engine.mqtt_client.RESULT_STORE_PATH', store_path), \
+                patch('winter_supplement_engine.mqtt_client.MQTT_BATCH_ENABLED', True):
+            mqtt_client = WinterSupplementMQTTClient()
+            items = [
+                {"id": "a", "numberOfChildren": 1, "familyComposition": "single", "familyUnitInPayForDecember": True},
+                {"id": "b", "numberOfChildren": -1, "familyComposition": "single", "familyUnitInPayForDecember": True},
+                {"id": "c", "numberOfChildren": 0, "familyComposition": "couple", "familyUnitInPayForDecember": False}
+            ]
+            mock_client = MagicMock()
+            mqtt_client._on_message(mock_client, None, make_message(
+                f"{MQTT_BATCH_INPUT_TOPIC_BASE}topic", {"batchId": "batch-1", "items": items}
+            ))
+
+        records = mqtt_client.result_store.scan()
+        assert [record["id"] for record in records] == ["a", "c"]
+        assert {record["topic"] for record in records} == {f"{MQTT_BATCH_OUTPUT_TOPIC_BASE}topic"}
+        assert records[1]["result"]["supplementAmount"] == 0
+        # Each stored result has the bytes it was published with inside the batch
+        published = mock_client.publish.call_args[0][1]
+        db = sqlite3.connect(store_path)
+        stored = [row[0].encode() for row in db.execute("SELECT result FROM results ORDER BY seq")]
+        db.close()
+        assert all(result in published for result in stored)
+        mqtt_client.result_store.close()
+
+    def test_disabled_by_default(self):
+        mqtt_client = WinterSupplementMQTTClient()
+
+        assert mqtt_client.result_store is None
+        assert "resultStore" not in mqtt_client.stats()
+
+
+class TestResultsCommand:
+    @pytest.fixture
+    def populated_store(self, store_path):
+        clock = FakeClock()
+        clock.now = datetime(2024, 12, 1, 12, 0).timestamp()
+        store = ResultStore(store_path, clock=clock)
+        for request_id in ("a", "b", "a"):
+            store.record(request_id, "out", make_payload(request_id), "2024.1")
+            clock.now += 3600
+        store.close()
+        return store_path
+
+    def run_command(self, argv):
+        args = main.parse_args(argv)
+        output = io.StringIO()
+        count = result_store.run_from_args(args, output)
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        assert len(records) == count
+        return records
+
+    def test_lookup(self, populated_store):
+        records = self.run_command(["results", "--store", populated_store, "lookup", "a"])
+
+        assert [record["id"] for record in records] == ["a", "a"]
+        assert records[0]["recordedAt"] > records[1]["recordedAt"]
+
+    def test_scan(self, populated_store):
+        """
+        Scans take ISO 8601 times or seconds since the epoch
+        """
+        records = self.run_command(["results", "--store", populated_store, "scan", "--since", "2024-12-01T13:00"])
+        assert [record["id"] for record in records] == ["b", "a"]
+
+        until = str(datetime(2024, 12, 1, 13, 0).timestamp())
+        records = self.run_command(["results", "--store", populated_store, "scan", "--until", until])
+        assert [record["id"] for record in records] == ["a"]
+
+        records = self.run_command(["results", "--store", populated_store, "scan", "--from-id", "b"])
+        assert [record["id"] for record in records] == ["b"]
+
+    def test_main_prints_records(self, populated_store, capsys):
+        main.main(["results", "--store", populated_store, "lookup", "b"])
+
+        assert json.loads(capsys.readouterr().out)["result"] == make_result("b")
+
+    def test_missing_store(self, store_path):
+        with pytest.raises(ValueError):
+            result_store.run_from_args(main.parse_args(["results", "--store", store_path, "lookup", "a"]))
+
+    def test_main_reports_errors(self, store_path, tmp_path):
+        """
+        A missing or unreadable store exits non-zero with a message instead of a traceback
+        """
+        with pytest.raises(SystemExit) as missing:
+            main.main(["results", "--store", store_path, "lookup", "a"])
+        assert missing.value.code == f"results: error: No result store at {store_path}"
+
+        not_a_store = tmp_path / "notes.txt"
+        not_a_store.write_text("not a database " * 100)
+        with pytest.raises(SystemExit) as unreadable:
+            main.main(["results", "--store", str(not_a_store), "lookup", "a"])
+        assert unreadable.value.code.startswith(f"results: error: Could not read the result store at {not_a_store}")
+
+    def test_queries_are_read_only(self, tmp_path):
+        """
+        Queries leave the file as they found it: no WAL switch, no schema changes
+        """
+        path = str(tmp_path / "results.sqlite")
+        db = sqlite3.connect(path)
+        db.execute("CREATE TABLE results (seq INTEGER PRIMARY KEY, id TEXT NOT NULL, topic TEXT NOT NULL, "
+                   "rules_version TEXT, recorded_at REAL NOT NULL, result TEXT NOT NULL)")
+        db.execute("INSERT INTO results (id, topic, rules_version, recorded_at, result) VALUES (?, ?, ?, ?, ?)",
+                   ("a", "out", "2024.1", 1000.0, json.dumps(make_result("a"))))
+        db.commit()
+        db.close()
+
+        records = self.run_command(["results", "--store", path, "lookup", "a"])
+
+        assert [record["id"] for record in records] == ["a"]
+        db = sqlite3.connect(path)
+        assert db.execute("PRAGMA journal_mode").fetchone() == ("delete",)
+        assert db.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall() == []
+        db.close()
+        store = ResultStore(path, read_only=True)
+        store.record("b", "out", make_payload("b"))
+        assert store.stats()["failed"] == 1
+        store.close()
@@ -0,0 +1,393 @@
+import copy
+import importlib.util
+import itertools
+import json
+import threading
+import time
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from winter_supplement_engine.calculator import WinterSupplementCalculator
+from winter_supplement_engine.config import MQTT_BATCH_INPUT_TOPIC_BASE, MQTT_INPUT_TOPIC_BASE
+from winter_supplement_engine.models import SupplementRequest, SupplementResult
+from winter_supplement_engine.mqtt_client import WinterSupplementMQTTClient
+from winter_supplement_engine.result_cache import ResultCache
+from winter_supplement_engine.rules import DEFAULT_RULES_PATH, CompiledRules, RulesWatcher, load_rules
+
+
+with open(DEFAULT_RULES_PATH, encoding="utf-8") as rules_file:
+    DEFINITION = json.load(rules_file)
+
+
+def hand_written(input_data):
+    """
+    The calculation as it was written before the rules definition.
+    """
+    if not input_data['familyUnitInPayForDecember']:
+        return {"id": input_data['id'], "isEligible": False, "baseAmount": 0.0,
+                "childrenAmount": 0.0, "supplementAmount": 0.0}
+    base_amount = {"single": 60.0, "couple": 120.0}.get(input_data['familyComposition'], 0.0)
+    children_amount = input_data['numberOfChildren'] * 20.0
+    return {"id": input_data['id'], "isEligible": True, "baseAmount": base_amount,
+            "childrenAmount": children_amount, "supplementAmount": base_amount + children_amount}
+
+
+ALL_INPUTS = [
+    {"id": f"rules_{index}", "numberOfChildren": children, "familyComposition": composition,
+     "familyUnitInPayForDecember": eligible}
+    for index, (children, composition, eligible) in enumerate(
+        itertools.product((0, 1, 3, 20), ("single", "couple"), (True, False))
+    )
+]
+
+
+class TestBuiltInRules:
+    @pytest.mark.parametrize("input_data", ALL_INPUTS, ids=lambda data: data["id"])
+    def test_matches_hand_written_calculation(self, input_data):
+        """
+        The built-in rules give exactly the results of the original hand-written code
+        """
+        assert WinterSupplementCalculator.calculate_supplement(input_data) == hand_written(input_data)
+
+    @pytest.mark.parametrize("input_data", ALL_INPUTS[:4], ids=lambda data: data["id"])
+    def test_record_matches_dict(self, input_data):
+        result = WinterSupplementCalculator.calculate_supplement(SupplementRequest.from_dict(input_data))
+
+        assert isinstance(result, SupplementResult)
+        assert result.to_dict() == hand_written(input_data)
+
+    def test_rates_are_shared(self):
+        """
+        SUPPLEMENT_RATES is the table the compiled rules read, so edits apply immediately
+        """
+        rules = WinterSupplementCalculator.rules
+        assert WinterSupplementCalculator.SUPPLEMENT_RATES is rules.rates
+        assert rules.rates == {"single": 60.0, "couple": 120.0, "child_rate": 20.0}
+
+    def test_versioned(self):
+        info = WinterSupplementCalculator.rules.info()
+
+        assert info["name"] == "winter-supplement"
+        assert info["version"] == DEFINITION["version"]
+        assert len(info["fingerprint"]) == 12
+
+
+class TestCompiledRules:
+    def test_fingerprint_follows_definition(self):
+        """
+        Any change to the definition changes the fingerprint, even under the same version
+        """
+        changed = copy.deepcopy(DEFINITION)
+        changed["rates"]["child_rate"] = 25.0
+
+        assert CompiledRules(DEFINITION).fingerprint == CompiledRules(copy.deepcopy(DEFINITION)).fingerprint
+        assert CompiledRules(changed).fingerprint != CompiledRules(DEFINITION).fingerprint
+
+    def test_rate_change(self):
+        changed = copy.deepcopy(DEFINITION)
+        changed["rates"]["child_rate"] = 25.0
+
+        result = CompiledRules(changed).calculate(
+            {"id": "a", "numberOfChildren": 1, "familyComposition": "single", "familyUnitInPayForDecember": True}
+        )
+
+        assert result["childrenAmount"] == 25.0
+        assert result["supplementAmount"] == 85.0
+
+    def test_other_supplement(self):
+        """
+        A different supplement with its own conditions, amounts and output names
+        """
+        rules = CompiledRules({
+            "name": "heating-supplement",
+            "version": "1",
+            "rates": {"flat": 50.0, "per_room": 5.0, "north": 30.0, "south": 10.0},
+            "eligibility": [
+                {"field": "region", "in": ["north", "south"]},
+                {"field": "rooms", "min": 1},
+                {"field": "rooms", "max": 10},
+                {"field": "receivesAssistance", "equals": True},
+                {"field": "optedOut", "equals": False}
+            ],
+            "amounts": {
+                "flatAmount": {"rate": "flat"},
+                "regionAmount": {"lookup": "region"},
+                "roomAmount": {"field": "rooms", "times": "per_room"}
+            },
+            "total": "heatingAmount"
+        })
+        request = {"id": "h", "region": "north", "rooms": 4, "receivesAssistance": True, "optedOut": False}
+
+        assert rules.calculate(request) == {
+            "id": "h", "isEligible": True, "flatAmount": 50.0, "regionAmount": 30.0,
+            "roomAmount": 20.0, "heatingAmount": 100.0
+        }
+        for change in ({"region": "east"}, {"rooms": 0}, {"rooms": 11}, {"receivesAssistance": False},
+                       {"optedOut": True}):
+            assert rules.calculate({**request, **change})["isEligible"] is False
+        assert rules.calculate_record is None
+
+    def test_no_conditions(self):
+        rules = CompiledRules({"version": "1", "rates": {"flat": 1.0}, "amounts": {"flat": {"rate": "flat"}},
+                               "total": "total"})
+
+        assert rules.calculate({"id": "a"}) == {"id": "a", "isEligible": True, "flat": 1.0, "total": 1.0}
+
+    @pytest.mark.parametrize("change", [
+        {"version": None},
+        {"rates": {"single": "sixty"}},
+        {"rates": {"single": True}},
+        {"amounts": {}},
+        {"amounts": {"baseAmount": {"field": "numberOfChildren", "times": "unknown_rate"}}},
+        {"amounts": {"baseAmount": {"multiply": "numberOfChildren"}}},
+        {"amounts": {"base Amount": {"rate": "single"}}},
+        {"amounts": {"baseAmount": {"lookup": "__import__('os')"}}},
+        {"eligibility": [{"field": "familyUnitInPayForDecember"}]},
+        {"eligibility": [{"field": "numberOfChildren", "min": 0, "max": 5}]},
+        {"eligibility": [{"field": "familyComposition", "in": "single"}]},
+        {"eligibility": [{"field": "familyComposition", "in": [["single"]]}]},
+        {"eligibility": [{"field": "numberOfChildren", "min": "3"}]},
+        {"eligibility": [{"field": "numberOfChildren", "max": True}]},
+        {"eligibility": [{"field": "numberOfChildren", "equals": {"value": 1}}]},
+        {"eligibility": ["familyUnitInPayForDecember"]},
+        {"eligibility": {"field": "numberOfChildren", "min": 1}},
+        {"amounts": {"baseAmount": "lookup"}},
+        {"amounts": {"baseAmount": {"lookup": "familyComposition", "default": "0"}}},
+        {"total": "baseAmount"},
+        {"total": "class"}
+    ])
+    def test_invalid_definitions(self, change):
+        definition = {**copy.deepcopy(DEFINITION), **change}
+        if change.get("version", "") is None:
+            del definition["version"]
+
+        with pytest.raises(ValueError):
+            CompiledRules(definition)
+
+    def test_load_json(self, tmp_path):
+        path = tmp_path / "rules.json"
+        path.write_text(json.dumps({**DEFINITION, "version": "2025.1"}))
+
+        rules = load_rules(str(path), result_type=SupplementResult)
+
+        assert rules.version == "2025.1"
+        assert rules.calculate_record(SupplementRequest.from_dict(ALL_INPUTS[0])).to_dict() == hand_written(ALL_INPUTS[0])
+
+    @pytest.mark.skipif(importlib.util.find_spec("yaml") is None, reason="PyYAML is not installed")
+    def test_load_yaml(self, tmp_path):
+        import yaml
+
+        path = tmp_path / "rules.yaml"
+        path.write_text(yaml.safe_dump(DEFINITION))
+
+        assert load_rules(str(path)).fingerprint == CompiledRules(DEFINITION).fingerprint
+
+
+@pytest.fixture
+def restore_rules():
+    """
+    Put the built-in rules back after a test installs others.
+    """
+    rules = WinterSupplementCalculator.rules
+    yield
+    WinterSupplementCalculator.install_rules(rules)
+
+
+def versioned(version, child_rate=20.0):
+    definition = copy.deepcopy(DEFINITION)
+    definition["version"] = version
+    definition["rates"]["child_rate"] = child_rate
+    return definition
+
+
+def make_message(topic, payload):
+    msg = MagicMock()
+    msg.topic = topic
+    msg.payload = json.dumps(payload).encode() if isinstance(payload, dict) else payload
+    return msg
+
+
+REQUEST = {"id": "reload", "numberOfChildren": 2, "familyComposition": "single", "familyUnitInPayForDecember": True}
+
+
+class TestRulesWatcher:
+    def test_detects_changes(self, tmp_path):
+        path = tmp_path / "rules.json"
+        path.write_text(json.dumps(versioned("1")))
+        changes = []
+        watcher = RulesWatcher(str(path), changes.append, interval=1)
+
+        assert watcher.check() is False
+        path.write_text(json.dumps(versioned("2.0", child_rate=25.0)))
+        assert watcher.check() is True
+        assert watcher.check() is False
+        assert changes == [str(path)]
+
+    def test_missing_file(self, tmp_path):
+        watcher = RulesWatcher(str(tmp_path / "missing.json"), lambda path: None, interval=1)
+
+        assert watcher.check() is False
+
+    def test_invalid_interval(self, tmp_path):
+        with pytest.raises(ValueError):
+            RulesWatcher(str(tmp_path / "rules.json"), lambda path: None, interval=0)
+
+
+class TestHotReload:
+    def test_reload_from_watched_file(self, tmp_path, restore_rules):
+        """
+        A changed rules file is picked up by the watcher thread without restarting the client
+        """
+        path = tmp_path / "rules.json"
+        path.write_text(json.dumps(versioned("1")))
+        with patch('winter_supplement_engine.mqtt_client.RULES_PATH', str(path)), \
+                patch('winter_supplement_engine.mqtt_client.RULES_WATCH_INTERVAL', 0.01):
+            mqtt_client = WinterSupplementMQTTClient()
+        mqtt_client.rules_watcher.start()
+        try:
+            path.write_text(json.dumps(versioned("2.0", child_rate=25.0)))
+            deadline = time.monotonic() + 5
+            while WinterSupplementCalculator.rules.version != "2.0" and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            mqtt_client.rules_watcher.stop()
+
+        assert WinterSupplementCalculator.calculate_supplement(REQUEST)["childrenAmount"] == 50.0
+        assert mqtt_client.stats()["rules"]["version"] == "2.0"
+        assert mqtt_client.stats()["rules"]["reloads"] == 1
+
+    def test_invalid_file_keeps_rules(self, tmp_path, restore_rules):
+        path = tmp_path / "rules.json"
+        path.write_text('{"version": "broken"')
+        rules = WinterSupplementCalculator.rules
+        mqtt_client = WinterSupplementMQTTClient()
+
+        assert mqtt_client.reload_rules_file(str(path)) is False
+        assert WinterSupplementCalculator.rules is rules
+        assert mqtt_client.stats()["rules"]["reloadErrors"] == 1
+
+    def test_control_topic(self, restore_rules):
+        """
+        A definition published on the control topic is installed and not processed as a request
+        """
+        with patch('winter_supplement_engine.mqtt_client.RULES_CONTROL_TOPIC', "BRE/rules"):
+            mqtt_client = WinterSupplementMQTTClient()
+        mock_client = MagicMock()
+
+        mqtt_client._on_message(mock_client, None, make_message("BRE/rules", versioned("control", child_rate=30.0)))
+        mqtt_client._on_message(mock_client, None, make_message("BRE/rules", b"not json"))
+        mqtt_client._on_message(mock_client, None, make_message(f"{MQTT_INPUT_TOPIC_BASE}reload", REQUEST))
+
+        assert WinterSupplementCalculator.rules.version == "control"
+        assert json.loads(mock_client.publish.call_args[0][1])["childrenAmount"] == 60.0
+        stats = mqtt_client.stats()
+        assert stats["messages"]["received"] == 1
+        assert stats["rules"]["reloads"] == 1
+        assert stats["rules"]["reloadErrors"] == 1
+
+    @pytest.mark.parametrize("change", [
+        {"amounts": {"baseAmount": {"lookup": "familyComposition"}}},
+        {"amounts": {**DEFINITION["amounts"], "bonusAmount": {"rate": "single"}}},
+        {"rates": {**DEFINITION["rates"], "child_rate": -20.0}}
+    ])
+    def test_rules_are_dry_run_before_install(self, restore_rules, change):
+        """
+        Rules producing other result fields or invalid results are rejected and requests keep working
+        """
+        with patch('winter_supplement_engine.mqtt_client.RULES_CONTROL_TOPIC', "BRE/rules"):
+            mqtt_client = WinterSupplementMQTTClient()
+        mock_client = MagicMock()
+        rules = WinterSupplementCalculator.rules
+
+        mqtt_client._on_message(mock_client, None, make_message("BRE/rules", {**versioned("broken"), **change}))
+        mqtt_client._on_message(mock_client, None, make_message(f"{MQTT_INPUT_TOPIC_BASE}reload", REQUEST))
+
+        assert WinterSupplementCalculator.rules is rules
+        assert json.loads(mock_client.publish.call_args[0][1])["supplementAmount"] > 0
+        assert mqtt_client.stats()["rules"]["reloads"] == 0
+        assert mqtt_client.stats()["rules"]["reloadErrors"] == 1
+
+    def test_control_topic_is_not_shared(self):
+        with patch('winter_supplement_engine.mqtt_client.RULES_CONTROL_TOPIC', "BRE/rules"):
+            mqtt_client = WinterSupplementMQTTClient(shared_group="engines")
+        mock_client = MagicMock()
+
+        mqtt_client._on_connect(mock_client, None, None, 0)
+
+        mock_client.subscribe.assert_any_call("BRE/rules")
+
+    def test_result_cache_follows_rules(self, restore_rules):
+        """
+        Installing rules empties the result cache, and results of replaced rules are not cached
+        """
+        cache = ResultCache()
+        old_rules = WinterSupplementCalculator.rules
+        cache.put(REQUEST, WinterSupplementCalculator.calculate_supplement(REQUEST), old_rules)
+        assert cache.get(REQUEST) is not None
+
+        WinterSupplementCalculator.install_rules(CompiledRules(versioned("2", child_rate=25.0), SupplementResult))
+        assert cache.get(REQUEST) is None
+
+        cache.put(REQUEST, WinterSupplementCalculator.calculate_supplement(REQUEST, rules=old_rules), old_rules)
+        assert cache.get(REQUEST) is None
+
+    def test_rules_version_in_result(self, restore_rules):
+        with patch('winter_supplement_engine.mqtt_client.RULES_VERSION_IN_RESULT', True):
+            mqtt_client = WinterSupplementMQTTClient()
+            mock_client = MagicMock()
+            msg = make_message(f"{MQTT_INPUT_TOPIC_BASE}reload", REQUEST)
+            mqtt_client._on_message(mock_client, None, msg)
+            mqtt_client._on_message(mock_client, None, msg)  # served from the result cache
+
+            WinterSupplementCalculator.install_rules(CompiledRules(versioned("2"), SupplementResult))
+            mqtt_client._on_message(mock_client, None, msg)
+
+        versions = [json.loads(call[0][1])["rulesVersion"] for call in mock_client.publish.call_args_list]
+        assert versions == [DEFINITION["version"], DEFINITION["version"], "2"]
+
+    def test_rules_version_in_batch_results(self, restore_rules):
+        with patch('winter_supplement_engine.mqtt_client.RULES_VERSION_IN_RESULT', True), \
+                patch('winter_supplement_engine.mqtt_client.MQTT_BATCH_ENABLED', True):
+            mqtt_client = WinterSupplementMQTTClient()
+            mock_client = MagicMock()
+            WinterSupplementCalculator.install_rules(CompiledRules(versioned("batch"), SupplementResult))
+            mqtt_client._on_message(mock_client, None, make_message(
+                f"{MQTT_BATCH_INPUT_TOPIC_BASE}reload", {"batchId": "b", "items": [REQUEST, {"id": "bad"}, REQUEST]}
+            ))
+
+        entries = json.loads(mock_client.publish.call_args[0][1])["results"]
+        assert [entry.get("result", {}).get("rulesVersion") for entry in entries] == ["batch", None, "batch"]
+
+    def test_reload_under_load(self, restore_rules):
+        """
+        Results calculated while rules are swapped repeatedly each come from a single version
+        """
+        rule_sets = [CompiledRules(versioned("20"), SupplementResult),
+                     CompiledRules(versioned("25", child_rate=25.0), SupplementResult)]
+        stopping = threading.Event()
+
+        def swap_rules():
+            for rules in itertools.cycle(rule_sets):
+                if stopping.is_set():
+                    return
+                WinterSupplementCalculator.install_rules(rules)
+
+        with patch('winter_supplement_engine.mqtt_client.RULES_VERSION_IN_RESULT', True), \
+                patch('winter_supplement_engine.mqtt_client.RESULT_CACHE_SIZE', 0):
+            mqtt_client = WinterSupplementMQTTClient()
+            mock_client = MagicMock()
+            swapper = threading.Thread(target=swap_rules)
+            swapper.start()
+            try:
+                for index in range(500):
+                    request = {**REQUEST, "id": f"load_{index}"}
+                    mqtt_client._on_message(mock_client, None, make_message(f"{MQTT_INPUT_TOPIC_BASE}reload", request))
+            finally:
+                stopping.set()
+                swapper.join()
+
+        results = [json.loads(call[0][1]) for call in mock_client.publish.call_args_list]
+        assert len(results) == 500
+        for result in results:
+            assert result["childrenAmount"] == 2 * float(result["rulesVersion"])
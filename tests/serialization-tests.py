@@ -0,0 +1,86 @@
+import json
+import sys
+
+import pytest
+from unittest.mock import Mock, MagicMock, patch
+
+from winter_supplement_engine.config import MQTT_INPUT_TOPIC_BASE
+from winter_supplement_engine.mqtt_client import WinterSupplementMQTTClient
+from winter_supplement_engine.serialization import available_serializers, get_serializer, SERIALIZERS
+
+
+SERIALIZER_NAMES = [
+    pytest.param(name, marks=pytest.mark.skipif(name not in available_serializers(), reason=f"{name} is not installed"))
+    for name in SERIALIZERS
+]
+
+
+class TestSerializers:
+    @pytest.mark.parametrize("name", SERIALIZER_NAMES)
+    @pytest.mark.parametrize("data", [
+        {"id": "a", "numberOfChildren": 2, "familyComposition": "couple", "familyUnitInPayForDecember": True},
+        {"id": "unicode-é☃ \"quoted\"", "isEligible": False, "baseAmount": 0.0, "supplementAmount": 1.5},
+        {"id": "big", "supplementAmount": sys.maxsize * 20.0},
+        {"batchId": "b", "results": [{"index": 0, "error": {"code": "X", "message": "y"}}]}
+    ])
+    def test_round_trip(self, name, data):
+        """
+        Every serializer encodes to bytes that any JSON decoder reads back unchanged
+        """
+        serializer = get_serializer(name)
+        encoded = serializer.dumps(data)
+
+        assert isinstance(encoded, bytes)
+        assert json.loads(encoded) == data
+        assert serializer.loads(encoded) == data
+        assert serializer.loads(memoryview(encoded)) == data
+        assert serializer.loads(encoded.decode()) == data
+
+    @pytest.mark.parametrize("name", SERIALIZER_NAMES)
+    @pytest.mark.parametrize("payload", [b"Invalid JSON", b"{\"id\": ", b"\xff\xfe\xfa", Mock()])
+    def test_decode_errors_are_json_decode_errors(self, name, payload):
+        """
+        Undecodable payloads raise json.JSONDecodeError whichever library is used
+        """
+        with pytest.raises(json.JSONDecodeError):
+            get_serializer(name).loads(payload)
+
+    def test_auto_picks_fastest_available(self):
+        """
+        auto selects the first available serializer
+        """
+        assert get_serializer("auto").name == available_serializers()[0]
+        assert available_serializers()[-1] == "json"
+
+    def test_unknown_serializer(self):
+        """
+        Unknown serializer names are rejected
+        """
+        with pytest.raises(ValueError):
+            get_serializer("pickle")
+
+    @pytest.mark.parametrize("name", SERIALIZER_NAMES)
+    def test_client_uses_configured_serializer(self, name):
+        """
+        The MQTT client decodes and publishes with the serializer selected in config
+        """
+        with patch('winter_supplement_engine.mqtt_client.JSON_SERIALIZER', name):
+            mqtt_client = WinterSupplementMQTTClient()
+        assert mqtt_client.serializer.name == name
+
+        mock_client = Mock()
+        msg = MagicMock()
+        msg.topic = f"{MQTT_INPUT_TOPIC_BASE}serializer_topic"
+        msg.payload = json.dumps({
+            "id": "serializer",
+            "numberOfChildren": 1,
+            "familyComposition": "couple",
+            "familyUnitInPayForDecember": True
+        }).encode()
+
+        for _ in range(2):  # second message comes from the result cache
+            mqtt_client._on_message(mock_client, None, msg)
+
+        for call in mock_client.publish.call_args_list:
+            assert isinstance(call.args[1], bytes)
+            assert json.loads(call.args[1])["supplementAmount"] == 140.0
@@ -0,0 +1,120 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from winter_supplement_engine import schemas
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What a blocking engine imports before it connects: the entry point and the MQTT client
+SERVE_IMPORTS = "import main, winter_supplement_engine.mqtt_client"
+
+# Optional or mode-specific modules the blocking engine must not import at startup
+DEFERRED_MODULES = ("jsonschema", "numpy", "yaml", "asyncio", "concurrent.futures.process")
+
+# Regression budgets for the startup imports, best of a few runs. Third-party
+# imports (paho, dotenv) dominate the total; jsonschema waits for the first validator,
+# and the engine's own modules are kept tight.
+TOTAL_BUDGET_SECONDS = 0.5
+ENGINE_BUDGET_SECONDS = 0.1
+
+
+def import_times(statement=SERVE_IMPORTS):
+    """
+    Import modules in a fresh interpreter under ``-X importtime``.
+
+    Returns:
+        dict: Module name -> (self seconds, cumulative seconds, nesting depth)
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        times[name.strip()] = (int(self_us) / 1e6, int(cumulative_us) / 1e6, depth)
+    return times
+
+
+def startup_seconds(times):
+    """
+    Total import time, and the self time of the engine's own modules.
+    """
+    total = sum(cumulative for _, cumulative, depth in times.values() if depth == 0)
+    engine = sum(self_time for name, (self_time, _, _) in times.items()
+                 if name == "main" or name.startswith("winter_supplement_engine"))
+    return total, engine
+
+
+class TestStartup:
+    def test_deferred_modules_not_imported(self):
+        """
+        Modules only some modes need are imported when those modes run, not at startup
+        """
+        times = import_times()
+
+        assert "winter_supplement_engine.mqtt_client" in times
+        assert [name for name in DEFERRED_MODULES if name in times] == []
+
+    @pytest.mark.parametrize("use_async", [False, True])
+    def test_supervisor_preloads_its_client(self, use_async):
+        """
+        A forking supervisor preloads the client its workers run; blocking workers never get asyncio
+        """
+        statement = ("import multiprocessing; from winter_supplement_engine.supervisor import Supervisor; "
+                     f"supervisor = Supervisor(workers=1, use_async={use_async}); "
+                     "supervisor._context = multiprocessing.get_context('fork'); "
+                     "supervisor._spawn = lambda index: None; supervisor.start()")
+
+        times = import_times(statement)
+
+        assert "winter_supplement_engine.mqtt_client" in times
+        assert ("asyncio" in times) == use_async
+        assert ("winter_supplement_engine.async_client" in times) == use_async
+
+    def test_startup_budget(self):
+        runs = [startup_seconds(import_times()) for _ in range(3)]
+        total = min(total for total, _ in runs)
+        engine = min(engine for _, engine in runs)
+
+        assert total < TOTAL_BUDGET_SECONDS, f"Startup imports took {total:.3f}s"
+        assert engine < ENGINE_BUDGET_SECONDS, f"Engine modules took {engine:.3f}s to import"
+
+    def test_validators_built_on_first_use(self):
+        """
+        Importing the schemas module builds no validator; first use or warm_up does
+        """
+        validator = schemas.LazySchemaValidator(schemas.INPUT_SCHEMA)
+
+        assert validator._compiled is None
+        assert not validator.is_valid({"id": "a"})
+        compiled = validator._compiled
+        assert compiled is not None
+        validator.validate({"id": "a", "numberOfChildren": 1, "familyComposition": "single",
+                            "familyUnitInPayForDecember": True})
+        assert validator._compiled is compiled
+
+        schemas.warm_up()
+        assert schemas.BATCH_OUTPUT_VALIDATOR._compiled is not None
+
+    @pytest.mark.parametrize("command", ["serve", "bulk"])
+    def test_startup_benchmark(self, benchmark, command):
+        """
+        Cold import time of the blocking engine and of the bulk command
+        """
+        benchmark.group = "startup"
+        statement = SERVE_IMPORTS if command == "serve" else "import main, winter_supplement_engine.bulk"
+
+        times = benchmark.pedantic(import_times, args=(statement,), rounds=5, iterations=1)
+
+        total, engine = startup_seconds(times)
+        slowest = sorted(times.items(), key=lambda item: item[1][0], reverse=True)[:5]
+        benchmark.extra_info["importSeconds"] = round(total, 4)
+        benchmark.extra_info["engineSeconds"] = round(engine, 4)
+        benchmark.extra_info["slowestModules"] = {name: round(module_times[0], 4) for name, module_times in slowest}
@@ -0,0 +1,170 @@
+import json
+import os
+import signal
+import threading
+import time
+
+import pytest
+from unittest.mock import patch
+import paho.mqtt.client as mqtt
+
+from winter_supplement_engine.config import MQTT_INPUT_TOPIC_BASE, MQTT_OUTPUT_TOPIC_BASE
+from winter_supplement_engine.local_broker import LocalBroker, topic_matches
+from winter_supplement_engine.supervisor import Supervisor
+
+
+def wait_for(condition, timeout=10.0):
+    """
+    Poll until condition() is true or the timeout expires.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class ResultCollector:
+    """
+    Test MQTT client publishing requests and collecting results.
+    """
+
+    def __init__(self, port, protocol=mqtt.MQTTv311):
+        self.results = {}
+        self.lock = threading.Lock()
+        self.client = mqtt.Client(protocol=protocol)
+        self.client.on_message = self._on_message
+        self.client.connect("127.0.0.1", port)
+        self.client.subscribe(f"{MQTT_OUTPUT_TOPIC_BASE}+", qos=1)
+        self.client.loop_start()
+
+    def _on_message(self, client, userdata, msg):
+        with self.lock:
+            self.results[msg.topic.rsplit("/", 1)[-1]] = json.loads(msg.payload)
+
+    def request(self, topic_id, input_data):
+        self.client.publish(f"{MQTT_INPUT_TOPIC_BASE}{topic_id}", json.dumps(input_data), qos=1)
+
+    def close(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+
+def make_input(i):
+    return {
+        "id": f"user_{i}",
+        "numberOfChildren": i % 4,
+        "familyComposition": "single" if i % 2 else "couple",
+        "familyUnitInPayForDecember": True
+    }
+
+
+@pytest.fixture
+def broker():
+    with LocalBroker() as local_broker:
+        yield local_broker
+
+
+@pytest.fixture
+def engine_config(broker):
+    """
+    Point engine clients (including forked or spawned workers) at the local broker.
+    """
+    settings = {"MQTT_BROKER": "127.0.0.1", "MQTT_PORT": broker.port}
+    with patch.dict(os.environ, {key: str(value) for key, value in settings.items()}), \
+            patch('winter_supplement_engine.mqtt_client.MQTT_BROKER', settings["MQTT_BROKER"]), \
+            patch('winter_supplement_engine.mqtt_client.MQTT_PORT', settings["MQTT_PORT"]):
+        yield settings
+
+
+class TestLocalBroker:
+    @pytest.mark.parametrize("topic_filter, topic, expected", [
+        ("a/b", "a/b", True),
+        ("a/+", "a/b", True),
+        ("a/+", "a/b/c", False),
+        ("a/#", "a/b/c", True),
+        ("#", "a/b", True),
+        ("#", "$SYS/x", False),
+        ("a/b", "a/c", False)
+    ])
+    def test_topic_matches(self, topic_filter, topic, expected):
+        """
+        Wildcard matching follows the MQTT rules
+        """
+        assert topic_matches(topic_filter, topic) is expected
+
+    @pytest.mark.parametrize("protocol", [mqtt.MQTTv311, mqtt.MQTTv5])
+    def test_shared_subscription_load_balances(self, broker, protocol):
+        """
+        Members of a shared subscription group each receive part of the traffic, none twice
+        """
+        received = {0: [], 1: []}
+        subscribers = []
+        for index in received:
+            subscriber = mqtt.Client(protocol=protocol)
+            subscriber.on_message = lambda client, userdata, msg, index=index: received[index].append(msg.payload)
+            subscriber.connect("127.0.0.1", broker.port)
+            subscriber.subscribe("$share/group/jobs/+", qos=1)
+            subscriber.loop_start()
+            subscribers.append(subscriber)
+        time.sleep(0.2)
+
+        publisher = mqtt.Client(protocol=protocol)
+        publisher.connect("127.0.0.1", broker.port)
+        publisher.loop_start()
+        for i in range(20):
+            publisher.publish(f"jobs/{i}", str(i), qos=1)
+
+        assert wait_for(lambda: len(received[0]) + len(received[1]) == 20)
+        assert received[0] and received[1]
+        assert sorted(received[0] + received[1], key=int) == [str(i).encode() for i in range(20)]
+
+        for client in subscribers + [publisher]:
+            client.disconnect()
+            client.loop_stop()
+
+
+class TestSupervisor:
+    def test_invalid_configuration(self):
+        """
+        Supervisors need at least one worker and a shared group
+        """
+        with pytest.raises(ValueError):
+            Supervisor(workers=0)
+        with pytest.raises(ValueError):
+            Supervisor(workers=1, shared_group="")
+
+    @pytest.mark.integration
+    def test_workers_share_load_and_restart(self, broker, engine_config):
+        """
+        Worker processes split requests between them, crashed workers restart, stats are combined
+        """
+        supervisor = Supervisor(workers=2, stats_interval=0.2, restart_delay=0.1)
+        supervisor_thread = threading.Thread(target=supervisor.run, daemon=True)
+        supervisor_thread.start()
+        collector = ResultCollector(broker.port)
+        try:
+            assert wait_for(lambda: broker.stats["connections"] >= 3)
+            time.sleep(0.3)  # let the workers subscribe
+
+            for i in range(40):
+                collector.request(f"topic_{i}", make_input(i))
+            assert wait_for(lambda: len(collector.results) == 40)
+            assert collector.results["topic_3"]["supplementAmount"] == 120.0
+
+            assert wait_for(lambda: supervisor.stats()["messages"]["published"] == 40)
+            per_worker = [worker["messages"].get("published", 0) for worker in supervisor.stats()["workers"]]
+            assert all(count > 0 for count in per_worker), per_worker
+
+            crashed_pid = supervisor.stats()["workers"][0]["pid"]
+            os.kill(crashed_pid, signal.SIGKILL)
+            assert wait_for(lambda: supervisor.stats()["workers"][0]["restarts"] == 1)
+            assert wait_for(lambda: supervisor.stats()["alive"] == 2)
+            assert supervisor.stats()["workers"][0]["pid"] != crashed_pid
+            # Counters from the crashed worker are kept in the totals
+            assert supervisor.stats()["messages"]["published"] >= 40
+        finally:
+            collector.close()
+            supervisor.stop()
+            supervisor_thread.join(10)
@@ -1,9 +1,20 @@
 import pytest
 import sys
+import jsonschema
 from jsonschema import ValidationError
 
 from winter_supplement_engine.calculator import WinterSupplementCalculator
-from winter_supplement_engine.schemas import validate_input, INPUT_SCHEMA, OUTPUT_SCHEMA
+from winter_supplement_engine.schemas import (
+    validate_input,
+    validate_output,
+    validate_batch_input,
+    validate_batch_output,
+    compile_fast_check,
+    CompiledSchemaValidator,
+    INPUT_SCHEMA,
+    OUTPUT_SCHEMA,
+    BATCH_OUTPUT_SCHEMA
+)
 
 
 class TestInputValidation:
@@ -124,3 +135,114 @@ class TestInputValidation:
             except Exception as e:
                 # Validation should either sanitize or reject
                 assert isinstance(e, Exception)
+
+
+class TestCompiledValidators:
+    VALID_INPUT = {
+        "id": "compiled_valid",
+        "numberOfChildren": 2,
+        "familyComposition": "couple",
+        "familyUnitInPayForDecember": True
+    }
+
+    @pytest.mark.parametrize("overrides", [
+        {},
+        {"numberOfChildren": True},  # bool is not an integer
+        {"numberOfChildren": 2.0},  # integral float is an integer
+        {"numberOfChildren": 2.5},
+        {"numberOfChildren": -1},
+        {"familyComposition": "Single"},
+        {"familyComposition": None},
+        {"familyUnitInPayForDecember": 1},
+        {"id": None},
+        {"extraField": "ignored"}
+    ])
+    def test_input_matches_jsonschema(self, overrides):
+        """
+        The compiled input validator must agree with jsonschema.validate, including the error raised
+        """
+        instance = {**self.VALID_INPUT, **overrides}
+        try:
+            jsonschema.validate(instance=instance, schema=INPUT_SCHEMA)
+            expected = None
+        except ValidationError as e:
+            expected = e
+
+        if expected is None:
+            validate_input(instance)
+        else:
+            with pytest.raises(ValidationError) as excinfo:
+                validate_input(instance)
+            assert excinfo.value.message == expected.message
+            assert list(excinfo.value.path) == list(expected.path)
+            assert excinfo.value.validator == expected.validator
+
+    @pytest.mark.parametrize("instance", [
+        {"id": "a", "isEligible": True, "baseAmount": 60.0, "childrenAmount": 0.0, "supplementAmount": 60.0},
+        {"id": "a", "isEligible": False, "baseAmount": 0, "childrenAmount": 0, "supplementAmount": 0},
+        {"id": "a", "isEligible": True, "baseAmount": -1.0, "childrenAmount": 0.0, "supplementAmount": 60.0},
+        {"id": "a", "isEligible": "yes", "baseAmount": 60.0, "childrenAmount": 0.0, "supplementAmount": 60.0},
+        {"id": "a"},
+        []
+    ])
+    def test_output_matches_jsonschema(self, instance):
+        """
+        The compiled output validator must agree with jsonschema.validate
+        """
+        expected_valid = jsonschema.Draft202012Validator(OUTPUT_SCHEMA).is_valid(instance)
+        if expected_valid:
+            validate_output(instance)
+        else:
+            with pytest.raises(ValidationError):
+                validate_output(instance)
+
+    @pytest.mark.parametrize("results", [
+        [],
+        [{"index": 0, "result": {"id": "a", "isEligible": True, "baseAmount": 60.0,
+                                 "childrenAmount": 0.0, "supplementAmount": 60.0}}],
+        [{"index": 0, "error": {"code": "INVALID_INPUT", "message": "bad"}}],
+        [{"index": 0, "result": {"id": "a"}}],
+        [{"index": -1, "error": {"code": "INVALID_INPUT", "message": "bad"}}],
+        [{"error": {"code": "INVALID_INPUT", "message": "bad"}}],
+        [{"index": 0, "error": "bad"}],
+        "not a list"
+    ])
+    def test_batch_output_matches_jsonschema(self, results):
+        """
+        The compiled batch output validator, including its array handling, agrees with jsonschema
+        """
+        instance = {"batchId": "batch", "results": results}
+        if jsonschema.Draft202012Validator(BATCH_OUTPUT_SCHEMA).is_valid(instance):
+            validate_batch_output(instance)
+        else:
+            with pytest.raises(ValidationError):
+                validate_batch_output(instance)
+
+    def test_batch_input_envelope(self):
+        """
+        Batch envelopes need an id and an items array; items are checked separately
+        """
+        validate_batch_input({"batchId": "batch", "items": [{}, "anything"]})
+        with pytest.raises(ValidationError):
+            validate_batch_input({"batchId": "batch", "items": {}})
+        with pytest.raises(ValidationError):
+            validate_batch_input({"items": []})
+
+    def test_unsupported_schema_falls_back(self):
+        """
+        Schemas using keywords the compiler does not know still validate via jsonschema
+        """
+        schema = {"type": "string", "pattern": "^a"}
+        assert compile_fast_check(schema) is None
+
+        validator = CompiledSchemaValidator(schema)
+        assert validator.is_valid("abc")
+        with pytest.raises(ValidationError):
+            validator.validate("xyz")
+
+    def test_invalid_schema_rejected(self):
+        """
+        Schema errors surface when the validator is built, not per message
+        """
+        with pytest.raises(jsonschema.SchemaError):
+            CompiledSchemaValidator({"type": "not-a-type"})
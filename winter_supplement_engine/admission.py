@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+
+# What happens to shed requests: a busy result is published, or they are dropped silently
+SHED_POLICIES = ("busy", "drop")
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket rate limiter keyed on client ids.
+
+    Each key gets a bucket holding up to ``burst`` tokens, refilled at
+    ``rate`` tokens per second; a request takes one token. Buckets are kept in
+    least recently used order. A bucket left idle long enough to refill
+    completely is the same as a new one, so it is evicted, keeping memory
+    proportional to the clients active within that time.
+    """
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        """
+        Args:
+            rate (float): Tokens added per second to each bucket
+            burst (float): Bucket capacity; defaults to ``rate``, and is at least 1
+            clock (callable): Monotonic clock in seconds
+
+        Raises:
+            ValueError: If rate is not positive or burst is below 1
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        burst = burst if burst else max(1.0, rate)
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._clock = clock
+        self._idle_timeout = self.burst / self.rate
+        self._buckets = OrderedDict()  # key -> [tokens, last update], least recently updated first
+        self._lock = threading.Lock()
+        self._evictions = 0
+
+    def acquire(self, key):
+        """
+        Take a token from a key's bucket.
+
+        Args:
+            key (str): Client id
+
+        Returns:
+            float: 0.0 if a token was taken, otherwise seconds until one is available
+        """
+        now = self._clock()
+        with self._lock:
+            self._evict(now)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+                self._buckets.move_to_end(key)
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / self.rate
+
+    def _evict(self, now):
+        """
+        Drop buckets that have been idle long enough to be full again.
+        """
+        buckets = self._buckets
+        while buckets:
+            key, bucket = next(iter(buckets.items()))
+            if now - bucket[1] < self._idle_timeout:
+                break
+            del buckets[key]
+            self._evictions += 1
+
+    def stats(self):
+        """
+        Snapshot of the limiter.
+
+        Returns:
+            dict: Rate, burst, tracked clients and evicted buckets
+        """
+        with self._lock:
+            self._evict(self._clock())
+            return {"rate": self.rate, "burst": self.burst, "clients": len(self._buckets), "evictions": self._evictions}
@@ -0,0 +1,190 @@
+import asyncio
+import functools
+import threading
+
+from .config import (
+    MQTT_BROKER,
+    MQTT_PORT,
+    MAX_RETRIES,
+    RETRY_DELAY,
+    RETRY_MAX_DELAY,
+    RETRY_JITTER
+)
+from .mqtt_client import WinterSupplementMQTTClient
+from .schemas import warm_up
+from .reconnect import ExponentialBackoff
+
+
+class AsyncWinterSupplementMQTTClient(WinterSupplementMQTTClient):
+    """
+    asyncio service mode for the Winter Supplement MQTT client.
+
+    Drives paho's socket hooks (``loop_read``/``loop_write``/``loop_misc``)
+    from the running event loop instead of ``loop_forever``, so the engine can
+    be embedded next to other async services. Topics, schemas and results are
+    the same as the blocking client.
+
+    Messages go through the same admission control and are processed inline
+    on the event loop as they are read: processing is synchronous, so a task
+    per message would add overhead without any concurrency. Set
+    ``PROCESSING_WORKERS`` to process them on worker threads instead.
+    """
+
+    MISC_INTERVAL = 1.0  # Seconds between loop_misc calls (keepalive, retries)
+
+    def __init__(self, shared_group=None, metrics_port=None, client_id=None):
+        """
+        Initialize the client and register the asyncio socket hooks.
+
+        Args:
+            shared_group (str): Shared subscription group; defaults to MQTT_SHARED_GROUP
+            metrics_port (int): Port for the ``/metrics`` endpoint; defaults to METRICS_PORT
+            client_id (str): MQTT client id; defaults to MQTT_CLIENT_ID
+        """
+        super().__init__(shared_group=shared_group, metrics_port=metrics_port, client_id=client_id)
+        self._loop = None
+        self._loop_thread_id = None
+        self._stopping = None
+        self._disconnected = None
+
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+        self.client.on_disconnect = self._on_disconnect
+
+    async def run(self):
+        """
+        Connect with retries and process messages until ``stop`` is called.
+
+        Reconnects with the same retry policy if the broker connection drops.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stopping = asyncio.Event()
+        self.backoff = ExponentialBackoff(RETRY_DELAY, RETRY_MAX_DELAY, jitter=RETRY_JITTER)
+
+        warm_up()
+        self.publisher.start()
+        if self.result_store:
+            self.result_store.start()
+        if self.processing_pool:
+            self.processing_pool.start()
+        self.start_metrics()
+        if self.rules_watcher:
+            self.rules_watcher.start()
+        misc_task = self._loop.create_task(self._misc_loop())
+        try:
+            reconnecting = False
+            while not self._stopping.is_set():
+                if not await self._connect_with_retries(reconnecting):
+                    break
+                stop_task = self._loop.create_task(self._stopping.wait())
+                await asyncio.wait({stop_task, self._disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                stop_task.cancel()
+                if not self._stopping.is_set():
+                    self.logger.warning("Connection to MQTT broker lost, reconnecting")
+                    reconnecting = True
+        finally:
+            misc_task.cancel()
+            self.publisher.stop()
+            if self.client.is_connected():
+                self.client.disconnect()
+                self.client.loop_write()  # Flush the DISCONNECT packet; the loop is stopping
+            if self.rules_watcher:
+                self.rules_watcher.stop()
+            self.stop_metrics()
+            if self.processing_pool:
+                self.processing_pool.stop()
+            if self.result_store:
+                self.result_store.stop()
+
+    def stop(self):
+        """
+        Ask a running ``run`` coroutine to disconnect and return. Thread-safe.
+        """
+        if self._loop is not None and self._stopping is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    async def _connect_with_retries(self, reconnecting=False):
+        """
+        Connect to the broker, retrying up to ``MAX_RETRIES`` times (forever when it is 0).
+
+        Args:
+            reconnecting (bool): Wait a backoff delay before the first attempt, after a lost connection
+
+        Returns:
+            bool: True once connected, False when all attempts failed or ``stop`` was called
+        """
+        attempts = 0
+        while not MAX_RETRIES or attempts < MAX_RETRIES:
+            if attempts or reconnecting:
+                delay = self.backoff.next_delay()
+                self.logger.info(f"Retrying in {delay:.2f} seconds...")
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+            if self._stopping.is_set():
+                return False
+            try:
+                self.logger.info(f"Attempting to connect to {MQTT_BROKER}:{MQTT_PORT} (Attempt {attempts + 1})")
+                self._disconnected = self._loop.create_future()
+                # paho's connect resolves the broker and opens the socket synchronously, so it
+                # runs on a worker thread; its socket hooks hand the registration back to the loop
+                await self._loop.run_in_executor(
+                    None, functools.partial(self.client.connect, MQTT_BROKER, MQTT_PORT, **self._connect_options)
+                )
+                self.logger.info("Successfully connected to MQTT broker")
+                return True
+            except Exception as e:
+                self.logger.error(f"Connection attempt failed: {e}")
+                self.connection.record_failed_attempt()
+                attempts += 1
+        self.logger.error("Maximum connection attempts reached. Exiting.")
+        return False
+
+    async def _misc_loop(self):
+        """
+        Periodically run paho housekeeping (keepalive pings, retries).
+        """
+        while True:
+            await asyncio.sleep(self.MISC_INTERVAL)
+            self.client.loop_misc()
+
+    def _on_disconnect(self, client, userdata, rc, properties=None):
+        """
+        Callback for broker disconnection; wakes up ``run``.
+        """
+        super()._on_disconnect(client, userdata, rc, properties)
+        if self._disconnected is not None and not self._disconnected.done():
+            self._disconnected.set_result(rc)
+
+    def _call_in_loop(self, func, *args):
+        """
+        Run ``func`` on the event loop thread; paho may call hooks from worker threads.
+        """
+        if threading.get_ident() == self._loop_thread_id:
+            func(*args)
+        else:
+            self._loop.call_soon_threadsafe(func, *args)
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._tune_socket(sock)
+        self._call_in_loop(self._loop.add_reader, sock, self._on_readable)
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._call_in_loop(self._loop.remove_reader, sock)
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._call_in_loop(self._loop.add_writer, sock, self._on_writable)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._call_in_loop(self._loop.remove_writer, sock)
+
+    def _on_readable(self):
+        # A failed read closes the socket and fires on_disconnect inside paho
+        self.client.loop_read()
+
+    def _on_writable(self):
+        self.client.loop_write()
@@ -0,0 +1,540 @@
+import argparse
+import csv
+import io
+import json
+import logging
+import mmap
+import os
+import stat
+import sys
+import time
+from collections import Counter, deque
+from itertools import islice
+
+from jsonschema import ValidationError
+
+from .calculator import WinterSupplementCalculator
+from .config import JSON_SERIALIZER
+from .models import RequestDecoder, as_dict
+from .schemas import INPUT_VALIDATOR, validate_output
+from .serialization import get_serializer
+
+FORMATS = ("ndjson", "csv")
+_EXTENSIONS = {"csv": "csv", "ndjson": "ndjson", "jsonl": "ndjson", "json": "ndjson"}
+_WHITESPACE = b" \t\n\r\x0b\x0c"
+
+# Per-process codec, created on first use in each worker
+_codec = None
+# Per-process (path, mmap) of the input file, mapped on first use in each worker
+_mapping = None
+
+
+def detect_format(path, default="ndjson"):
+    """
+    Guess a file format from its extension.
+
+    Args:
+        path (str): File path, or "-" for a standard stream
+        default (str): Format for paths without a known extension
+
+    Returns:
+        str: "csv" for ``.csv`` files, "ndjson" for ``.ndjson``/``.jsonl``/``.json`` files, otherwise ``default``
+    """
+    extension = path.lower().rpartition(".")[2]
+    return _EXTENSIONS.get(extension, default)
+
+
+def read_chunks(stream, input_format, chunk_size):
+    """
+    Read input records in chunks, holding at most one chunk in memory.
+
+    NDJSON chunks hold raw lines, decoded later by whichever process handles
+    the chunk. CSV is parsed here, since quoted fields may span lines; chunks
+    hold the rows and the first chunk's header is returned alongside.
+
+    Args:
+        stream (io.BufferedIOBase): Binary input stream
+        input_format (str): "ndjson" or "csv"
+        chunk_size (int): Records per chunk
+
+    Yields:
+        tuple: (header or None, list of (line number, record))
+    """
+    if input_format == "csv":
+        reader = csv.reader(io.TextIOWrapper(stream, encoding="utf-8", newline=""))
+        header = next(reader, None)
+        rows = ((reader.line_num, row) for row in reader if row)
+    else:
+        header = None
+        rows = ((number, line) for number, line in enumerate(stream, 1) if line.strip())
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield header, chunk
+
+
+def map_file(stream):
+    """
+    Memory-map an open input file for reading.
+
+    Args:
+        stream (io.BufferedIOBase): Binary input stream
+
+    Returns:
+        mmap.mmap: Read-only mapping of the file, or None if it is not a non-empty regular file
+    """
+    info = os.fstat(stream.fileno())
+    if not stat.S_ISREG(info.st_mode) or info.st_size == 0:
+        return None
+    return mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def iter_lines(buffer, start=0, end=None, first_line=1):
+    """
+    Split a buffer into lines without copying them.
+
+    Lines are found by scanning for newline offsets and handed out as
+    memoryview slices of the buffer, which the decoders parse in place.
+    Blank lines are skipped but still counted.
+
+    Args:
+        buffer (mmap.mmap): Buffer supporting ``find``, such as a mapped file or bytes
+        start (int): Offset of the first line
+        end (int): Offset just past the last line; defaults to the end of the buffer
+        first_line (int): Line number of the first line
+
+    Yields:
+        tuple: (line number, memoryview of the line without its newline)
+    """
+    end = len(buffer) if end is None else end
+    find = buffer.find
+    line = first_line
+    with memoryview(buffer) as view:
+        while start < end:
+            stop = find(b"\n", start, end)
+            if stop < 0:
+                stop = end
+            # Only lines starting with whitespace are copied to check whether they are blank
+            if stop > start and (buffer[start] not in _WHITESPACE or buffer[start:stop].strip()):
+                yield line, view[start:stop]
+            line += 1
+            start = stop + 1
+
+
+def chunk_bounds(buffer, chunk_size):
+    """
+    Split a mapped file into ranges of whole lines.
+
+    Ranges are sized in bytes from the average length of the first lines;
+    each holds about ``chunk_size`` lines. Newlines are counted with ``find``
+    on the mapping, so no range is copied into this process.
+
+    Args:
+        buffer (mmap.mmap): Mapped input file
+        chunk_size (int): Lines per range, blank lines included
+
+    Yields:
+        tuple: (first line number, start offset, end offset)
+    """
+    size = len(buffer)
+    sample = buffer[:65536]
+    range_size = chunk_size * max(1, len(sample) // max(1, sample.count(b"\n")))
+    start = 0
+    line = 1
+    while start < size:
+        stop = buffer.find(b"\n", min(start + range_size, size) - 1)
+        end = size if stop < 0 else stop + 1
+        yield line, start, end
+        line += _count_lines(buffer, start, end)
+        start = end
+
+
+def _count_lines(buffer, start, end):
+    """
+    Number of newlines between two offsets of a buffer, without copying it.
+    """
+    find = buffer.find
+    count = 0
+    stop = find(b"\n", start, end)
+    while stop >= 0:
+        count += 1
+        stop = find(b"\n", stop + 1, end)
+    return count
+
+
+def _csv_record(header, row):
+    """
+    Map a CSV row onto an input record, converting the integer and boolean columns.
+
+    Values that do not convert are kept as text so validation reports them.
+    """
+    record = dict(zip(header, row))
+    children = record.get("numberOfChildren")
+    if children is not None and children.strip().lstrip("-").isdigit():
+        record["numberOfChildren"] = int(children)
+    eligible = record.get("familyUnitInPayForDecember")
+    if eligible is not None and eligible.strip().lower() in ("true", "false"):
+        record["familyUnitInPayForDecember"] = eligible.strip().lower() == "true"
+    return record
+
+
+def _csv_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+def _get_codec():
+    global _codec
+    if _codec is None:
+        serializer = get_serializer(JSON_SERIALIZER)
+        _codec = (serializer, RequestDecoder(serializer))
+    return _codec
+
+
+def process_chunk(input_format, output_format, header, chunk):
+    """
+    Validate, calculate and serialize one chunk of records.
+
+    Runs in the calling process or in a worker process.
+
+    Args:
+        input_format (str): "ndjson" or "csv"
+        output_format (str): "ndjson" or "csv"
+        header (list): CSV column names, None for NDJSON
+        chunk (list): (line number, raw line or CSV row) pairs
+
+    Returns:
+        tuple: (encoded results, list of error records, number of records)
+    """
+    decoder = _get_codec()[1]
+    requests = []
+    errors = []
+    for line, record in chunk:
+        try:
+            if input_format == "csv":
+                request = _csv_record(header, record)
+                error = INPUT_VALIDATOR.best_error(request)
+                if error is not None:
+                    raise error
+            else:
+                request = decoder.decode(record)
+        except json.JSONDecodeError as e:
+            errors.append({"line": line, "error": {"code": "INVALID_JSON", "message": str(e)}})
+            continue
+        except ValidationError as e:
+            errors.append({"line": line, "error": {"code": "INVALID_INPUT", "message": e.message}})
+            continue
+        requests.append((line, request))
+
+    encoded = _calculate_chunk(requests, output_format, errors)
+    return encoded, errors, len(chunk)
+
+
+def process_range(buffer, first_line, start, end, output_format):
+    """
+    Validate, calculate and serialize a range of lines of a mapped NDJSON file.
+
+    The range is decoded in place in a single pass. Ranges holding rejected
+    records are processed line by line to report each error with its line.
+
+    Args:
+        buffer (mmap.mmap): Mapped input file
+        first_line (int): Line number at ``start``
+        start (int): Offset of the first line
+        end (int): Offset just past the last line
+        output_format (str): "ndjson" or "csv"
+
+    Returns:
+        tuple: See ``process_chunk``
+    """
+    decoder = _get_codec()[1]
+    with memoryview(buffer) as view, view[start:end] as lines:
+        requests = decoder.decode_lines(lines)
+    if requests is not None:
+        errors = []
+        encoded = _calculate_chunk([(None, request) for request in requests], output_format, errors)
+        if not errors:
+            return encoded, errors, len(requests)
+    return process_chunk("ndjson", output_format, None, list(iter_lines(buffer, start, end, first_line)))
+
+
+def _calculate_chunk(requests, output_format, errors):
+    """
+    Calculate and encode the results of decoded requests.
+
+    Args:
+        requests (list): (line number, request) pairs
+        output_format (str): "ndjson" or "csv"
+        errors (list): Receives an error record for each invalid result
+
+    Returns:
+        bytes: Encoded results
+    """
+    serializer = _get_codec()[0]
+    calculate = WinterSupplementCalculator.calculate_supplement
+    fields = WinterSupplementCalculator.rules.result_fields
+    results = []
+    for line, request in requests:
+        result = as_dict(calculate(request))
+        try:
+            validate_output(result)
+        except ValidationError as e:
+            errors.append({"line": line, "id": result.get("id"), "error": {"code": "INVALID_OUTPUT", "message": e.message}})
+            continue
+        results.append(result)
+
+    if output_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerows([_csv_value(result.get(field)) for field in fields] for result in results)
+        encoded = buffer.getvalue().encode()
+    else:
+        dumps = serializer.dumps
+        encoded = b"".join(dumps(result) + b"\n" for result in results)
+    return encoded
+
+
+def process_mapped_chunk(path, first_line, start, end, output_format):
+    """
+    Process a range of lines of an NDJSON file in a worker process.
+
+    The worker maps the file itself, so only the offsets cross the process
+    boundary.
+
+    Args:
+        path (str): NDJSON input file
+        first_line (int): Line number at ``start``
+        start (int): Offset of the first line
+        end (int): Offset just past the last line
+        output_format (str): "ndjson" or "csv"
+
+    Returns:
+        tuple: See ``process_chunk``
+    """
+    global _mapping
+    if _mapping is None or _mapping[0] != path:
+        with open(path, "rb") as stream:
+            _mapping = (path, mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ))
+    return process_range(_mapping[1], first_line, start, end, output_format)
+
+
+def warm_up():
+    """
+    Prepare a process for processing chunks.
+
+    Runs as the initializer of each worker process, so its first chunk does
+    not pay for building the codec or for the first use of the calculator and
+    of the input and output validators, on both their valid and invalid paths.
+    """
+    serializer, decoder = _get_codec()
+    sample = {"id": "warm-up", "numberOfChildren": 1, "familyComposition": "single", "familyUnitInPayForDecember": True}
+    validate_output(as_dict(WinterSupplementCalculator.calculate_supplement(decoder.decode(serializer.dumps(sample)))))
+    INPUT_VALIDATOR.best_error({**sample, "numberOfChildren": -1})
+
+
+def run_chunk(function, *args):
+    """
+    Run a chunk task and time it.
+
+    Args:
+        function (callable): ``process_chunk``, ``process_range`` or ``process_mapped_chunk``
+        *args: Arguments for ``function``
+
+    Returns:
+        tuple: (outcome of ``function``, seconds taken, id of the process that ran it)
+    """
+    started = time.perf_counter()
+    outcome = function(*args)
+    return outcome, time.perf_counter() - started, os.getpid()
+
+
+def run_bulk(input_path, output_path="-", input_format=None, output_format=None, errors_path=None,
+             processes=0, chunk_size=10000, use_mmap=None, ordered=True, chunk_report_path=None):
+    """
+    Calculate supplements for every record in a file, streaming chunk by chunk.
+
+    Results are written in input order, or with ``ordered=False`` as each
+    chunk completes. Invalid records are skipped and counted, and written to
+    ``errors_path`` as NDJSON when given.
+
+    Args:
+        input_path (str): NDJSON or CSV input file, "-" for stdin
+        output_path (str): Output file, "-" for stdout
+        input_format (str): "ndjson" or "csv"; guessed from the input extension when None
+        output_format (str): "ndjson" or "csv"; guessed from the output extension when None
+        errors_path (str): Optional NDJSON file receiving one record per rejected input
+        processes (int): Worker processes; 0 processes chunks in this process
+        chunk_size (int): Records per chunk
+        use_mmap (bool): Memory-map NDJSON input and decode each chunk in place; by default
+            used for NDJSON input read from a regular file. Chunks then hold about
+            ``chunk_size`` lines
+        ordered (bool): Write chunks in input order; False writes them as workers finish,
+            so a slow chunk does not hold back the others
+        chunk_report_path (str): Optional NDJSON file receiving a report per chunk: its index,
+            first line, record, result and error counts, errors by code, seconds and worker
+
+    Returns:
+        dict: Record, result and error counts, elapsed seconds and records per second
+
+    Raises:
+        ValueError: If a format is unknown or processes/chunk_size are out of range
+    """
+    input_format = input_format or detect_format(input_path)
+    output_format = output_format or detect_format(output_path, default=input_format)
+    if input_format not in FORMATS or output_format not in FORMATS:
+        raise ValueError(f"Formats must be one of {FORMATS}")
+    if processes < 0 or chunk_size < 1:
+        raise ValueError("processes must not be negative and chunk_size must be positive")
+    if use_mmap and (input_format != "ndjson" or input_path == "-"):
+        raise ValueError("use_mmap needs an NDJSON input file")
+
+    logger = logging.getLogger(__name__)
+    serializer = get_serializer(JSON_SERIALIZER)
+    report = {"records": 0, "results": 0, "errors": 0, "chunks": 0, "processes": processes, "ordered": ordered}
+    started = time.perf_counter()
+
+    input_stream = sys.stdin.buffer if input_path == "-" else open(input_path, "rb")
+    output_stream = sys.stdout.buffer if output_path == "-" else open(output_path, "wb")
+    errors_stream = open(errors_path, "wb") if errors_path else None
+    chunk_report_stream = open(chunk_report_path, "wb") if chunk_report_path else None
+    mapped = None
+    try:
+        if use_mmap is not False and input_format == "ndjson" and input_path != "-":
+            mapped = map_file(input_stream)
+        if output_format == "csv":
+            output_stream.write((",".join(WinterSupplementCalculator.rules.result_fields) + "\n").encode())
+
+        def write(index, first_line, outcome, seconds, worker):
+            encoded, errors, records = outcome
+            output_stream.write(encoded)
+            if errors_stream is not None:
+                errors_stream.write(b"".join(serializer.dumps(error) + b"\n" for error in errors))
+            if chunk_report_stream is not None:
+                chunk_report_stream.write(serializer.dumps({
+                    "chunk": index,
+                    "firstLine": first_line,
+                    "records": records,
+                    "results": records - len(errors),
+                    "errors": len(errors),
+                    "errorCodes": dict(Counter(error["error"]["code"] for error in errors)),
+                    "seconds": seconds,
+                    "worker": worker
+                }) + b"\n")
+            report["records"] += records
+            report["errors"] += len(errors)
+            report["results"] += records - len(errors)
+            report["chunks"] += 1
+
+        # (first line, task) pairs; workers map the input file themselves
+        if mapped is not None:
+            function, source = (process_range, mapped) if processes == 0 else (process_mapped_chunk, input_path)
+            tasks = ((first_line, (function, source, first_line, start, end, output_format))
+                     for first_line, start, end in chunk_bounds(mapped, chunk_size))
+        else:
+            tasks = ((chunk[0][0], (process_chunk, input_format, output_format, header, chunk))
+                     for header, chunk in read_chunks(input_stream, input_format, chunk_size))
+
+        if processes == 0:
+            for index, (first_line, task) in enumerate(tasks):
+                write(index, first_line, *run_chunk(*task))
+        else:
+            # Imported here: the process pool pulls in multiprocessing, which inline runs never need
+            from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+            with ProcessPoolExecutor(processes, initializer=warm_up) as executor:
+                pending = deque()
+
+                def collect(limit):
+                    while len(pending) > limit:
+                        if ordered:
+                            done = [pending.popleft()]
+                        else:
+                            wait([future for _, _, future in pending], return_when=FIRST_COMPLETED)
+                            done = [entry for entry in pending if entry[2].done()]
+                            for entry in done:
+                                pending.remove(entry)
+                        for index, first_line, future in done:
+                            write(index, first_line, *future.result())
+
+                # Bound the chunks in flight so memory stays flat however large the input is
+                for index, (first_line, task) in enumerate(tasks):
+                    pending.append((index, first_line, executor.submit(run_chunk, *task)))
+                    collect(processes * 2 - 1)
+                collect(0)
+    finally:
+        if mapped is not None:
+            try:
+                mapped.close()
+            except BufferError:
+                # Line views held by an exception's traceback; the mapping closes once they are freed
+                pass
+        if input_stream is not sys.stdin.buffer:
+            input_stream.close()
+        if output_stream is sys.stdout.buffer:
+            output_stream.flush()
+        else:
+            output_stream.close()
+        if errors_stream is not None:
+            errors_stream.close()
+        if chunk_report_stream is not None:
+            chunk_report_stream.close()
+
+    report["seconds"] = time.perf_counter() - started
+    report["recordsPerSecond"] = report["records"] / report["seconds"] if report["seconds"] > 0 else 0.0
+    logger.info(
+        f"Processed {report['records']} records: {report['results']} results, {report['errors']} errors, "
+        f"{report['recordsPerSecond']:.0f} records/sec"
+    )
+    return report
+
+
+def add_arguments(parser):
+    """
+    Add the bulk mode options to an argument parser.
+
+    Args:
+        parser (argparse.ArgumentParser): Parser for the ``bulk`` command
+    """
+    parser.add_argument("input", help="NDJSON or CSV input file, - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="Output file, - for stdout (default: -)")
+    parser.add_argument("--input-format", choices=FORMATS, help="Input format (default: from the input extension)")
+    parser.add_argument("--output-format", choices=FORMATS,
+                        help="Output format (default: from the output extension, else the input format)")
+    parser.add_argument("--errors", help="NDJSON file receiving one record per rejected input")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="Worker processes; 0 processes in the main process (default: 0)")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Records per chunk (default: 10000)")
+    parser.add_argument("--no-mmap", dest="mmap", action="store_const", const=False, default=None,
+                        help="Read NDJSON input line by line instead of memory-mapping it")
+    parser.add_argument("--unordered", dest="ordered", action="store_false",
+                        help="Write chunks as workers finish them instead of in input order")
+    parser.add_argument("--chunk-report", help="NDJSON file receiving one report per chunk")
+
+
+def run_from_args(args):
+    report = run_bulk(
+        args.input,
+        args.output,
+        input_format=args.input_format,
+        output_format=args.output_format,
+        errors_path=args.errors,
+        processes=args.processes,
+        chunk_size=args.chunk_size,
+        use_mmap=args.mmap,
+        ordered=args.ordered,
+        chunk_report_path=args.chunk_report
+    )
+    print(json.dumps(report), file=sys.stderr)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calculate winter supplements for an NDJSON or CSV file")
+    add_arguments(parser)
+    return run_from_args(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
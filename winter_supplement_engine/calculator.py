@@ -1,48 +1,291 @@
-from typing import Dict, Union
+from collections.abc import Mapping
+from numbers import Integral
+from typing import Dict, List, Sequence, Union
+
+from .config import RULES_PATH
+from .models import SupplementRequest, SupplementResult
+from .rules import DEFAULT_RULES_PATH, CompiledRules, load_rules
+
+_NOT_IMPORTED = object()
+_numpy_module = _NOT_IMPORTED
+
+
+def _numpy():
+    """
+    Import numpy on first use; only the columnar batch backend needs it, and it is slow to import.
+
+    Returns:
+        module or None: numpy, or None when it is not installed
+    """
+    global _numpy_module
+    if _numpy_module is _NOT_IMPORTED:
+        try:
+            import numpy
+        except ImportError:  # pragma: no cover - numpy is an optional dependency
+            numpy = None
+        _numpy_module = numpy
+    return _numpy_module
 
 
 class WinterSupplementCalculator:
     """
     Calculator for Winter Supplement eligibility and amount determination.
+
+    The policy comes from a rules definition (``RULES_PATH``), compiled once
+    into generated functions; see ``rules.CompiledRules``.
     """
-    
-    SUPPLEMENT_RATES = {
-        "single": 60.0,
-        "couple": 120.0,
-        "child_rate": 20.0
-    }
+
+    rules = load_rules(RULES_PATH or DEFAULT_RULES_PATH, result_type=SupplementResult)
+
+    # The compiled rules read their rates from this dict, so changes to it apply immediately
+    SUPPLEMENT_RATES = rules.rates
+
+    # Integer codes accepted for ``familyComposition`` in columnar batches
+    FAMILY_COMPOSITION_CODES = ("single", "couple")
     
     @classmethod
-    def calculate_supplement(cls, input_data: Dict[str, Union[str, int, bool]]) -> Dict[str, Union[str, bool, float]]:
+    def calculate_supplement(
+        cls, input_data: Union[Dict[str, Union[str, int, bool]], SupplementRequest], rules: CompiledRules = None
+    ) -> Union[Dict[str, Union[str, bool, float]], SupplementResult]:
         """
         Calculate winter supplement based on family composition and children.
         
         Args:
-            input_data (dict): Client eligibility input data
+            input_data (dict or SupplementRequest): Client eligibility input data
+            rules (CompiledRules): Rules to apply; defaults to the installed rules
         
         Returns:
-            dict: Supplement calculation results
-        """
-        # Check basic eligibility
-        if not input_data['familyUnitInPayForDecember']:
-            return {
-                "id": input_data['id'],
-                "isEligible": False,
-                "baseAmount": 0.0,
-                "childrenAmount": 0.0,
-                "supplementAmount": 0.0
-            }
-        
-        # Base amount calculation
-        base_amount = cls.SUPPLEMENT_RATES.get(input_data['familyComposition'], 0.0)
-        
-        # Children amount calculation
-        children_amount = input_data['numberOfChildren'] * cls.SUPPLEMENT_RATES['child_rate']
-        
-        return {
-            "id": input_data['id'],
-            "isEligible": True,
-            "baseAmount": base_amount,
-            "childrenAmount": children_amount,
-            "supplementAmount": base_amount + children_amount
-        }
+            dict or SupplementResult: Supplement calculation results, a
+            SupplementResult when given a SupplementRequest
+        """
+        rules = rules or cls.rules
+        if isinstance(input_data, SupplementRequest):
+            return rules.calculate_record(input_data)
+        return rules.calculate(input_data)
+
+    @classmethod
+    def install_rules(cls, rules: CompiledRules) -> None:
+        """
+        Swap in new compiled rules without locking.
+
+        Calculations read ``rules`` once, so each one runs entirely under either
+        the old or the new rules.
+        """
+        cls.rules = rules
+        cls.SUPPLEMENT_RATES = rules.rates
+
+    @classmethod
+    def calculate_batch(
+        cls, batch: Union[Sequence[Dict], Mapping], backend: str = "auto", rules: CompiledRules = None
+    ) -> Union[List[Dict], Dict[str, List]]:
+        """
+        Calculate winter supplements for many family units at once.
+
+        Accepts either a list of input dicts (as passed to ``calculate_supplement``) or a
+        columnar mapping of field name to sequence. In columnar form ``familyComposition``
+        may hold the composition names or their index in ``FAMILY_COMPOSITION_CODES``.
+        Inputs are expected to have been validated already.
+
+        The numpy backend evaluates the rules definition on whole columns. Definitions
+        it cannot vectorize, such as a field multiplied by a rate when that field is not
+        numeric, are calculated row by row with the compiled rules instead.
+
+        Args:
+            batch (list or dict): Input records, or input columns
+            backend (str): "numpy", "python", or "auto" (numpy for columnar input when installed)
+            rules (CompiledRules): Rules to apply; defaults to the installed rules
+
+        Returns:
+            list or dict: Result dicts for record input, result columns for columnar input.
+            Values are identical to calling ``calculate_supplement`` on each item.
+
+        Raises:
+            ValueError: If the backend is unknown or numpy was requested but is not installed
+        """
+        rules = rules or cls.rules
+        columnar = isinstance(batch, Mapping)
+        if backend == "auto":
+            # Vectorizing only pays off when the data is already columnar; for records the
+            # column extraction costs more than the arithmetic it saves.
+            backend = "numpy" if columnar and _numpy() is not None else "python"
+        if backend not in ("numpy", "python"):
+            raise ValueError(f"Unknown batch backend: {backend}")
+        if backend == "numpy" and _numpy() is None:
+            raise ValueError("The numpy batch backend requires numpy to be installed")
+
+        if not columnar and backend == "python":
+            calculate = rules.calculate
+            return [calculate(item) for item in batch]
+
+        if columnar:
+            columns = batch
+        else:
+            columns = {field: [item[field] for item in batch] for field in ("id", *rules.input_fields)}
+
+        fields = rules.result_fields
+        if backend == "numpy":
+            result_columns = cls._calculate_columns_numpy(columns, rules)
+            if result_columns is not None:
+                if columnar:
+                    return result_columns
+                return [dict(zip(fields, row)) for row in zip(*(result_columns[field] for field in fields))]
+
+        results = cls._calculate_rows(columns, rules)
+        if not columnar:
+            return results
+        return {field: [result[field] for result in results] for field in fields}
+
+    @classmethod
+    def _composition_name(cls, composition):
+        """
+        Composition name for a name or integer code; None for unknown codes.
+        """
+        if isinstance(composition, str) or isinstance(composition, bool) or not isinstance(composition, Integral):
+            return composition
+        if 0 <= composition < len(cls.FAMILY_COMPOSITION_CODES):
+            return cls.FAMILY_COMPOSITION_CODES[composition]
+        return None
+
+    @classmethod
+    def _row_values(cls, field, column):
+        """
+        Plain Python values of an input column, with composition codes turned into names.
+        """
+        np = _numpy()
+        values = column.tolist() if np is not None and isinstance(column, np.ndarray) else list(column)
+        if field == "familyComposition":
+            values = [cls._composition_name(value) for value in values]
+        return values
+
+    @classmethod
+    def _calculate_rows(cls, columns, rules):
+        """
+        Row-by-row column calculation through the compiled rules.
+        """
+        names = ("id", *rules.input_fields)
+        calculate = rules.calculate
+        values = [cls._row_values(field, columns[field]) for field in names]
+        return [calculate(dict(zip(names, row))) for row in zip(*values)]
+
+    @classmethod
+    def _numpy_column(cls, np, field, column):
+        """
+        Prepare an input column for vectorized evaluation.
+
+        Returns:
+            tuple: ("numeric", array) for boolean and number columns, otherwise
+            ("categorical", (codes, values)) where ``values[codes]`` are the column's values
+        """
+        if field == "familyComposition" and isinstance(column, np.ndarray) and column.dtype.kind in "iu":
+            unknown = len(cls.FAMILY_COMPOSITION_CODES)
+            codes = np.where((column >= 0) & (column < unknown), column, unknown)
+            return "categorical", (codes, [*cls.FAMILY_COMPOSITION_CODES, None])
+        if field != "familyComposition":
+            array = column if isinstance(column, np.ndarray) else np.asarray(column)
+            if array.dtype.kind in "biuf":
+                return "numeric", array
+
+        values = column.tolist() if isinstance(column, np.ndarray) else column
+        index = {}
+        codes = np.fromiter((index.setdefault(value, len(index)) for value in values), dtype=np.intp,
+                            count=len(values))
+        # Composition codes are turned into names once per distinct value rather than per row
+        if field == "familyComposition":
+            return "categorical", (codes, [cls._composition_name(value) for value in index])
+        return "categorical", (codes, list(index))
+
+    @classmethod
+    def _calculate_columns_numpy(cls, columns, rules):
+        """
+        Vectorized column calculation with numpy, evaluating the rules definition on whole columns.
+
+        Mirrors the generated ``calculate`` function value for value. Returns None when the
+        definition needs an operation that only makes sense row by row.
+        """
+        np = _numpy()
+        definition = rules.definition
+        ids = list(columns["id"])
+        count = len(ids)
+        prepared = {}
+
+        def column(field):
+            if field not in prepared:
+                prepared[field] = cls._numpy_column(np, field, columns[field])
+            return prepared[field]
+
+        eligible = np.ones(count, dtype=bool)
+        for condition in definition.get("eligibility", []):
+            kind, data = column(condition["field"])
+            if kind == "categorical":
+                codes, values = data
+                if "equals" in condition:
+                    test = _equals_test(condition["equals"])
+                elif "in" in condition:
+                    allowed = tuple(condition["in"])
+                    test = allowed.__contains__
+                else:
+                    return None  # Ordering non-numeric values is left to the row-by-row path
+                eligible &= np.array([bool(test(value)) for value in values] or [False], dtype=bool)[codes]
+            elif "equals" in condition:
+                expected = condition["equals"]
+                if expected is True:
+                    eligible &= data != 0
+                elif expected is False:
+                    eligible &= data == 0
+                elif isinstance(expected, str):
+                    eligible[:] = False
+                else:
+                    eligible &= data == expected
+            elif "in" in condition:
+                matches = np.zeros(count, dtype=bool)
+                for value in condition["in"]:
+                    if not isinstance(value, str):
+                        matches |= data == value
+                eligible &= matches
+            elif "min" in condition:
+                eligible &= data >= condition["min"]
+            else:
+                eligible &= data <= condition["max"]
+
+        rates = rules.rates
+        amounts = []
+        for amount in definition["amounts"].values():
+            if "lookup" in amount:
+                default = float(amount.get("default", 0.0))
+                kind, data = column(amount["lookup"])
+                if kind == "categorical":
+                    codes, values = data
+                    table = np.array([rates.get(value, default) for value in values] or [default], dtype=np.float64)
+                    values = table[codes]
+                else:
+                    values = np.full(count, default)  # Rates are named, so numbers never match one
+            elif "field" in amount:
+                kind, data = column(amount["field"])
+                if kind != "numeric":
+                    return None
+                values = data.astype(np.float64) * rates[amount["times"]]
+            else:
+                values = np.full(count, rates[amount["rate"]])
+            amounts.append(np.where(eligible, values, 0.0))
+
+        total = amounts[0]
+        for values in amounts[1:]:
+            total = total + values
+        total = np.where(eligible, total, 0.0)
+
+        result = {"id": ids, "isEligible": eligible.tolist()}
+        for name, values in zip(definition["amounts"], amounts):
+            result[name] = values.tolist()
+        result[definition["total"]] = total.tolist()
+        return result
+
+
+def _equals_test(expected):
+    """
+    Predicate matching the generated code for an ``equals`` condition.
+    """
+    if expected is True:
+        return bool
+    if expected is False:
+        return lambda value: not value
+    return lambda value: value == expected
@@ -12,14 +12,102 @@ MQTT_BROKER = os.getenv('MQTT_BROKER', 'test.mosquitto.org')
 MQTT_PORT = int(os.getenv('MQTT_PORT', 1883))
 MQTT_INPUT_TOPIC_BASE = os.getenv('MQTT_INPUT_TOPIC_BASE', 'BRE/calculateWinterSupplementInput/')
 MQTT_OUTPUT_TOPIC_BASE = os.getenv('MQTT_OUTPUT_TOPIC_BASE', 'BRE/calculateWinterSupplementOutput/')
+# Batch requests: many calculations per message on dedicated topics
+MQTT_BATCH_ENABLED = os.getenv('MQTT_BATCH_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+MQTT_BATCH_INPUT_TOPIC_BASE = os.getenv('MQTT_BATCH_INPUT_TOPIC_BASE', 'BRE/calculateWinterSupplementBatchInput/')
+MQTT_BATCH_OUTPUT_TOPIC_BASE = os.getenv('MQTT_BATCH_OUTPUT_TOPIC_BASE', 'BRE/calculateWinterSupplementBatchOutput/')
+MQTT_PROTOCOL = os.getenv('MQTT_PROTOCOL', '3.1.1')  # MQTT protocol version: '3.1.1' or '5'
+
+# Session Configuration: a persistent session lets the broker queue QoS 1 requests while the engine is away
+MQTT_CLIENT_ID = os.getenv('MQTT_CLIENT_ID', '')  # Client id (unset lets the broker assign one)
+MQTT_CLEAN_SESSION = os.getenv('MQTT_CLEAN_SESSION', 'true').lower() in ('1', 'true', 'yes')  # false keeps the session
+MQTT_SESSION_EXPIRY = int(os.getenv('MQTT_SESSION_EXPIRY', 3600))  # Seconds an MQTT 5 session outlives its connection
+MQTT_SUBSCRIBE_QOS = int(os.getenv('MQTT_SUBSCRIBE_QOS', 0))  # QoS for input subscriptions (1 for queued requests)
+OFFLINE_BUFFER_SIZE = int(os.getenv('OFFLINE_BUFFER_SIZE', 0))  # QoS 0 results kept while disconnected (0 disables)
+
+# Publishing and Connection Tuning
+MQTT_PUBLISH_QOS = int(os.getenv('MQTT_PUBLISH_QOS', 0))  # QoS for published results
+MQTT_MAX_INFLIGHT = int(os.getenv('MQTT_MAX_INFLIGHT', 20))  # QoS>0 messages in flight at once (0 is unlimited)
+MQTT_MAX_QUEUED = int(os.getenv('MQTT_MAX_QUEUED', 0))  # QoS>0 messages queued by the client (0 is unlimited)
+MQTT_SOCKET_SNDBUF = int(os.getenv('MQTT_SOCKET_SNDBUF', 0))  # Socket send buffer in bytes (0 keeps the OS default)
+MQTT_SOCKET_RCVBUF = int(os.getenv('MQTT_SOCKET_RCVBUF', 0))  # Socket receive buffer in bytes (0 keeps the OS default)
+MQTT_TCP_NODELAY = os.getenv('MQTT_TCP_NODELAY', 'false').lower() in ('1', 'true', 'yes')  # Disable Nagle's algorithm
+PUBLISH_BATCH_SIZE = int(os.getenv('PUBLISH_BATCH_SIZE', 1))  # Results per coalesced flush (1 publishes immediately)
+PUBLISH_FLUSH_INTERVAL = float(os.getenv('PUBLISH_FLUSH_INTERVAL', 0))  # Seconds to wait for a batch to fill
+PUBLISH_QUEUE_SIZE = int(os.getenv('PUBLISH_QUEUE_SIZE', 10000))  # Results waiting to be flushed
+PUBLISH_OVERFLOW_POLICY = os.getenv('PUBLISH_OVERFLOW_POLICY', 'block')  # 'block', 'drop-oldest' or 'fail'
+
+# Optional: Shared subscription group; input topics are subscribed as $share/<group>/<topic>
+MQTT_SHARED_GROUP = os.getenv('MQTT_SHARED_GROUP', '')
+
+# Supervisor Configuration (multi-process mode)
+SUPERVISOR_WORKERS = int(os.getenv('SUPERVISOR_WORKERS', os.cpu_count() or 1))  # Worker processes
+SUPERVISOR_SHARED_GROUP = os.getenv('SUPERVISOR_SHARED_GROUP', 'winter-supplement')  # Group used by worker processes
+SUPERVISOR_STATS_INTERVAL = float(os.getenv('SUPERVISOR_STATS_INTERVAL', 10))  # Seconds between stats reports
+SUPERVISOR_RESTART_DELAY = float(os.getenv('SUPERVISOR_RESTART_DELAY', 1))  # Seconds before restarting a crashed worker
+
+# Rules Configuration
+RULES_PATH = os.getenv('RULES_PATH', '')  # Rules definition file (JSON, or YAML with PyYAML); unset uses the built-in rules
+RULES_WATCH_INTERVAL = float(os.getenv('RULES_WATCH_INTERVAL', 0))  # Seconds between rules file checks (0 disables reloads)
+RULES_CONTROL_TOPIC = os.getenv('RULES_CONTROL_TOPIC', '')  # Topic accepting new rules definitions (unset disables it)
+RULES_VERSION_IN_RESULT = os.getenv('RULES_VERSION_IN_RESULT', 'false').lower() in ('1', 'true', 'yes')  # Add rulesVersion to results
+
+# Invalid Request Configuration
+MAX_PAYLOAD_SIZE = int(os.getenv('MAX_PAYLOAD_SIZE', 65536))  # Largest request payload in bytes (0 is unlimited)
+ERROR_RESULTS_ENABLED = os.getenv('ERROR_RESULTS_ENABLED', 'false').lower() in ('1', 'true', 'yes')  # Reply to invalid requests
+ERROR_TOPIC_BASE = os.getenv('ERROR_TOPIC_BASE', '')  # Topic base for error results (unset uses the output topic)
+
+# Admission Control Configuration
+RATE_LIMIT_PER_CLIENT = float(os.getenv('RATE_LIMIT_PER_CLIENT', 0))  # Requests per second per topic id (0 disables)
+RATE_LIMIT_BURST = float(os.getenv('RATE_LIMIT_BURST', 0))  # Requests a topic id may send at once (0 uses the rate)
+MAX_CONCURRENT_REQUESTS = int(os.getenv('MAX_CONCURRENT_REQUESTS', 0))  # Requests in progress at once (0 is unlimited)
+SHED_POLICY = os.getenv('SHED_POLICY', 'busy')  # 'busy' replies to shed requests, 'drop' drops them silently
 
 # Connection Retry Configuration
-MAX_RETRIES = int(os.getenv('MAX_RETRIES', 5))  # Maximum number of connection retries
-RETRY_DELAY = int(os.getenv('RETRY_DELAY', 3))  # Delay (in seconds) between retries
+MAX_RETRIES = int(os.getenv('MAX_RETRIES', 5))  # Connection attempts before giving up (0 retries forever)
+RETRY_DELAY = float(os.getenv('RETRY_DELAY', 3))  # Delay (in seconds) before the first retry, doubling each retry
+RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', 60))  # Longest delay (in seconds) between retries
+RETRY_JITTER = os.getenv('RETRY_JITTER', 'true').lower() in ('1', 'true', 'yes')  # Randomize each retry delay
+
+# Message Processing Configuration
+PROCESSING_WORKERS = int(os.getenv('PROCESSING_WORKERS', 0))  # Worker threads (0 processes messages on the network thread)
+PROCESSING_QUEUE_SIZE = int(os.getenv('PROCESSING_QUEUE_SIZE', 1000))  # Queued messages per worker queue
+PROCESSING_ORDERED = os.getenv('PROCESSING_ORDERED', 'true').lower() in ('1', 'true', 'yes')  # Keep per-topic ordering
+PROCESSING_QUEUE_FULL_POLICY = os.getenv('PROCESSING_QUEUE_FULL_POLICY', 'block')  # 'block' or 'drop' when queue is full
+
+# Result Cache Configuration
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', 1024))  # Cached results (0 disables the cache)
+RESULT_TABLE_ENABLED = os.getenv('RESULT_TABLE_ENABLED', 'false').lower() in ('1', 'true', 'yes')  # Precompute results at startup
+RESULT_TABLE_MAX_CHILDREN = int(os.getenv('RESULT_TABLE_MAX_CHILDREN', 10))  # Largest children count in the precomputed table
+
+# Duplicate Request Configuration (replays results for redelivered messages)
+DEDUP_CACHE_SIZE = int(os.getenv('DEDUP_CACHE_SIZE', 0))  # Remembered requests (0 disables deduplication)
+DEDUP_TTL = float(os.getenv('DEDUP_TTL', 300))  # Seconds a request is remembered
+DEDUP_PATH = os.getenv('DEDUP_PATH', '')  # Optional SQLite file so deduplication survives restarts
+
+# Result Store Configuration (audit log of published results)
+RESULT_STORE_PATH = os.getenv('RESULT_STORE_PATH', '')  # SQLite file storing every published result (unset disables it)
+RESULT_STORE_BATCH_SIZE = int(os.getenv('RESULT_STORE_BATCH_SIZE', 500))  # Results per write transaction
+RESULT_STORE_FLUSH_INTERVAL = float(os.getenv('RESULT_STORE_FLUSH_INTERVAL', 1))  # Seconds to wait for a batch to fill
+RESULT_STORE_QUEUE_SIZE = int(os.getenv('RESULT_STORE_QUEUE_SIZE', 100000))  # Results waiting to be written (more are dropped)
+
+# JSON Serializer Configuration
+JSON_SERIALIZER = os.getenv('JSON_SERIALIZER', 'auto')  # 'auto', 'orjson', 'msgspec' or 'json'
+
+# Metrics Configuration
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')  # Per-stage latency and error metrics
+METRICS_SAMPLE_RATE = int(os.getenv('METRICS_SAMPLE_RATE', 10))  # Time one in every N messages for latency histograms
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')  # Interface for the /metrics endpoint
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))  # Port for the /metrics endpoint (0 disables it)
+METRICS_DUMP_INTERVAL = float(os.getenv('METRICS_DUMP_INTERVAL', 0))  # Seconds between metrics log lines (0 disables)
 
 # Logging Configuration
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_SAMPLE_RATE = int(os.getenv('LOG_SAMPLE_RATE', 1))  # Emit one in every N per-message INFO lines
+LOG_ASYNC = os.getenv('LOG_ASYNC', 'false').lower() in ('1', 'true', 'yes')  # Write logs from a background thread
 LOGGING_CONFIG = {
     'level': LOG_LEVEL,
-    'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    'sample_rate': LOG_SAMPLE_RATE,
+    'async': LOG_ASYNC
 }
@@ -0,0 +1,176 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class DedupStore:
+    """
+    Time- and size-bounded store of published results for redelivered requests.
+
+    Entries are keyed on the input topic (which carries the topic id) plus a
+    hash of the payload and of an optional ``context``, such as the rules
+    fingerprint, so results are only replayed under the rules that produced
+    them. When the same request arrives again within ``ttl`` seconds, the
+    previously published output can be replayed instead of recomputed. With ``path`` set, entries are also written to SQLite so
+    deduplication survives restarts.
+    """
+
+    def __init__(self, maxsize=10000, ttl=300.0, path=None, clock=time.time):
+        """
+        Args:
+            maxsize (int): Maximum number of remembered requests
+            ttl (float): Seconds a request is remembered
+            path (str): Optional SQLite file for on-disk backing
+            clock (callable): Time source in seconds, injectable for tests
+
+        Raises:
+            ValueError: If maxsize or ttl is not positive
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        if ttl <= 0:
+            raise ValueError("ttl must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, output_topic, output_payload)
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evicted = 0
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS dedup ("
+                "key BLOB PRIMARY KEY, expires_at REAL NOT NULL, output_topic TEXT NOT NULL, output_payload BLOB NOT NULL)"
+            )
+            self._load()
+
+    @staticmethod
+    def key(topic, payload, context=b""):
+        """
+        Dedup key for a request: topic plus digest of the context and payload.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        if context:
+            digest.update(context + b"\0")
+        digest.update(payload)
+        return topic.encode() + b"\0" + digest.digest()
+
+    def lookup(self, topic, payload, context=b""):
+        """
+        Find the output previously published for this request.
+
+        Args:
+            topic (str): Input topic
+            payload (bytes): Input payload
+            context (bytes): What else the output depended on, such as the rules fingerprint
+
+        Returns:
+            tuple or None: (output topic, output payload) to replay, None if not seen recently
+        """
+        key = self.key(topic, payload, context)
+        now = self._clock()
+        with self._lock:
+            self._purge_expired(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            return entry[1], entry[2]
+
+    def record(self, topic, payload, output_topic, output_payload, context=b""):
+        """
+        Remember the output published for a request.
+
+        Args:
+            topic (str): Input topic
+            payload (bytes): Input payload
+            output_topic (str): Topic the result was published on
+            output_payload (bytes or str): Published result
+            context (bytes): What else the output depended on, as passed to ``lookup``
+        """
+        if isinstance(output_payload, str):
+            output_payload = output_payload.encode()
+        key = self.key(topic, payload, context)
+        expires_at = self._clock() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, output_topic, output_payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._evicted += 1
+                if self._db is not None:
+                    self._db.execute("DELETE FROM dedup WHERE key = ?", (evicted_key,))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO dedup (key, expires_at, output_topic, output_payload) VALUES (?, ?, ?, ?)",
+                    (key, expires_at, output_topic, output_payload)
+                )
+
+    def stats(self):
+        """
+        Snapshot of dedup counters.
+
+        Returns:
+            dict: Size, hits (replays), misses, expired and evicted counts
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self._hits,
+                "misses": self._misses,
+                "expired": self._expired,
+                "evicted": self._evicted,
+                "persistent": self._db is not None
+            }
+
+    def close(self):
+        """
+        Close the on-disk backing, if any.
+        """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _purge_expired(self, now):
+        """
+        Drop expired entries from the front of the store. Caller holds the lock.
+
+        Entries are kept in expiry order because every record uses the same ttl
+        and moves its key to the end.
+        """
+        purged = False
+        while self._entries:
+            key, (expires_at, _, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[key]
+            self._expired += 1
+            purged = True
+        if purged and self._db is not None:
+            self._db.execute("DELETE FROM dedup WHERE expires_at <= ?", (now,))
+
+    def _load(self):
+        """
+        Load unexpired entries from disk, most recent last, keeping at most maxsize.
+        """
+        now = self._clock()
+        self._db.execute("DELETE FROM dedup WHERE expires_at <= ?", (now,))
+        rows = self._db.execute(
+            "SELECT key, expires_at, output_topic, output_payload FROM dedup ORDER BY expires_at DESC LIMIT ?",
+            (self.maxsize,)
+        ).fetchall()
+        for key, expires_at, output_topic, output_payload in reversed(rows):
+            self._entries[key] = (expires_at, output_topic, bytes(output_payload))
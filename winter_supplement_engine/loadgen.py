@@ -0,0 +1,426 @@
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import paho.mqtt.client as mqtt
+
+from .config import MQTT_INPUT_TOPIC_BASE, MQTT_OUTPUT_TOPIC_BASE
+from .local_broker import LocalBroker
+
+MAIN_SCRIPT = Path(__file__).resolve().parent.parent / "main.py"
+
+
+def percentile(sorted_values, q):
+    """
+    Nearest-rank percentile of already sorted values.
+
+    Args:
+        sorted_values (list): Values in ascending order
+        q (float): Percentile between 0 and 100
+
+    Returns:
+        float or None: The percentile, None for no values
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * q // 100))  # ceil without float rounding surprises
+    return sorted_values[int(rank) - 1]
+
+
+class LoadGenerator:
+    """
+    Publishes calculation requests at a fixed rate and measures round trips.
+
+    Requests are spread over ``topic_ids`` input topics and carry unique ids,
+    so each result on the matching output topic is paired with its request.
+    Requests still unanswered ``drain_timeout`` seconds after the last one was
+    sent are counted as dropped.
+    """
+
+    def __init__(self, host="127.0.0.1", port=1883, rate=1000.0, duration=10.0, topic_ids=100,
+                 qos=0, drain_timeout=5.0, protocol=mqtt.MQTTv311):
+        """
+        Args:
+            host (str): Broker address
+            port (int): Broker port
+            rate (float): Requests per second to publish
+            duration (float): Seconds to publish for
+            topic_ids (int): Number of distinct input topic ids to spread requests over
+            qos (int): QoS for requests and result subscriptions
+            drain_timeout (float): Seconds to wait for outstanding results after publishing ends
+            protocol (int): paho MQTT protocol version
+
+        Raises:
+            ValueError: If rate, duration or topic_ids is not positive
+        """
+        if rate <= 0 or duration <= 0 or topic_ids < 1:
+            raise ValueError("rate, duration and topic_ids must be positive")
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.duration = duration
+        self.topic_ids = topic_ids
+        self.qos = qos
+        self.drain_timeout = drain_timeout
+        self.protocol = protocol
+
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._latencies = []
+        self._last_received = None
+        self._subscribed = threading.Event()
+
+    def run(self):
+        """
+        Publish the configured load and wait for the results.
+
+        Returns:
+            dict: Load report, see ``_report``
+        """
+        client = mqtt.Client(protocol=self.protocol)
+        client.on_message = self._on_message
+        client.on_subscribe = lambda *args: self._subscribed.set()
+        client.connect(self.host, self.port)
+        client.subscribe(f"{MQTT_OUTPUT_TOPIC_BASE}+", qos=self.qos)
+        client.loop_start()
+        try:
+            if not self._subscribed.wait(10):
+                raise RuntimeError("Result subscription was not acknowledged by the broker")
+            started, sent = self._publish(client)
+            send_elapsed = time.perf_counter() - started
+            deadline = time.monotonic() + self.drain_timeout
+            while time.monotonic() < deadline:
+                with self._lock:
+                    if not self._pending:
+                        break
+                time.sleep(0.01)
+        finally:
+            client.disconnect()
+            client.loop_stop()
+        return self._report(started, sent, send_elapsed)
+
+    def _publish(self, client):
+        """
+        Publish requests on schedule; sleeps only when ahead of it, so a slow
+        sender catches up rather than silently lowering the rate.
+        """
+        total = int(self.rate * self.duration)
+        interval = 1.0 / self.rate
+        started = time.perf_counter()
+        for i in range(total):
+            ahead = started + i * interval - time.perf_counter()
+            if ahead > 0.001:
+                time.sleep(ahead)
+            request_id = f"lg-{i}"
+            payload = json.dumps({
+                "id": request_id,
+                "numberOfChildren": i % 5,
+                "familyComposition": "single" if i % 2 else "couple",
+                "familyUnitInPayForDecember": i % 7 != 0
+            })
+            with self._lock:
+                self._pending[request_id] = time.perf_counter()
+            client.publish(f"{MQTT_INPUT_TOPIC_BASE}lg{i % self.topic_ids}", payload, qos=self.qos)
+        return started, total
+
+    def _on_message(self, client, userdata, msg):
+        received = time.perf_counter()
+        try:
+            request_id = json.loads(msg.payload)["id"]
+        except (ValueError, KeyError, TypeError):
+            return
+        with self._lock:
+            sent = self._pending.pop(request_id, None)
+            if sent is not None:
+                self._latencies.append(received - sent)
+                self._last_received = received
+
+    def _report(self, started, sent, send_elapsed):
+        """
+        Summarize a run.
+
+        Returns:
+            dict: Requests sent, received and dropped, drop rate, the achieved send
+            rate, sustained result throughput and round-trip latency percentiles in ms
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            dropped = len(self._pending)
+            last_received = self._last_received
+        received = len(latencies)
+        elapsed = (last_received - started) if last_received else None
+        return {
+            "config": {
+                "rate": self.rate,
+                "duration": self.duration,
+                "topicIds": self.topic_ids,
+                "qos": self.qos
+            },
+            "sent": sent,
+            "received": received,
+            "dropped": dropped,
+            "dropRate": dropped / sent if sent else 0.0,
+            "sendRate": sent / send_elapsed if send_elapsed else None,
+            "throughput": received / elapsed if elapsed else None,
+            "latencyMs": {
+                "p50": _ms(percentile(latencies, 50)),
+                "p95": _ms(percentile(latencies, 95)),
+                "p99": _ms(percentile(latencies, 99)),
+                "mean": _ms(sum(latencies) / received) if received else None,
+                "max": _ms(latencies[-1]) if latencies else None
+            }
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def compare_reports(baseline, current):
+    """
+    Relative change of the headline numbers between two reports.
+
+    Args:
+        baseline (dict): Earlier report
+        current (dict): New report
+
+    Returns:
+        dict: Metric name to {"baseline", "current", "change"}, change as a fraction of the baseline
+    """
+    def headline(report):
+        return {
+            "throughput": report.get("throughput"),
+            "dropRate": report.get("dropRate"),
+            **{f"latency{key.capitalize()}Ms": value for key, value in report.get("latencyMs", {}).items()}
+        }
+
+    before, after = headline(baseline), headline(current)
+    comparison = {}
+    for metric, value in after.items():
+        old = before.get(metric)
+        change = (value - old) / old if value is not None and old else None
+        comparison[metric] = {"baseline": old, "current": value, "change": change}
+    return comparison
+
+
+def _serve_broker(connection):
+    """
+    Broker process entry point: run a LocalBroker until told to stop.
+    """
+    with LocalBroker() as broker:
+        connection.send(broker.port)
+        connection.recv()
+
+
+class BrokerProcess:
+    """
+    Runs the in-process broker stand-in in its own process, off the load generator's GIL.
+    """
+
+    def __init__(self):
+        self.port = None
+        self._connection = None
+        self._process = None
+
+    def start(self):
+        self._connection, child_connection = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_serve_broker, args=(child_connection,), daemon=True)
+        self._process.start()
+        self.port = self._connection.recv()
+        return self
+
+    def stop(self):
+        if self._process is not None:
+            self._connection.send(None)
+            self._process.join(5)
+            if self._process.is_alive():
+                self._process.terminate()
+            self._process = None
+
+
+class EngineProcess:
+    """
+    Runs ``main.py`` against a given broker in a subprocess.
+    """
+
+    def __init__(self, host, port, workers=0, use_async=False, log_path=None):
+        """
+        Args:
+            host (str): Broker address
+            port (int): Broker port
+            workers (int): Worker processes (``--workers``); 0 runs a single client
+            use_async (bool): Run the asyncio client (``--async``)
+            log_path (str): File receiving the engine's output; discarded when not set
+        """
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.use_async = use_async
+        self.log_path = log_path
+        self._process = None
+        self._log = None
+
+    def start(self):
+        command = [sys.executable, str(MAIN_SCRIPT)]
+        if self.workers:
+            command += ["--workers", str(self.workers)]
+        if self.use_async:
+            command.append("--async")
+        env = {**os.environ, "MQTT_BROKER": self.host, "MQTT_PORT": str(self.port)}
+        env.pop("MQTT_TOPIC_ID", None)  # The load is spread over many topic ids
+        self._log = open(self.log_path, "ab") if self.log_path else subprocess.DEVNULL
+        self._process = subprocess.Popen(command, env=env, stdout=self._log, stderr=self._log)
+        return self
+
+    def stop(self, timeout=10):
+        """
+        Interrupt the engine like Ctrl+C, so a supervisor also stops its workers.
+        """
+        if self._process is None:
+            return
+        if self._process.poll() is None:
+            self._process.send_signal(signal.SIGINT)
+            try:
+                self._process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+        if self._log is not subprocess.DEVNULL:
+            self._log.close()
+        self._process = None
+
+
+def wait_until_ready(host, port, timeout=30.0):
+    """
+    Send probe requests until the engine answers one.
+
+    Raises:
+        TimeoutError: If no result arrives within the timeout
+    """
+    answered = threading.Event()
+    client = mqtt.Client()
+    client.on_message = lambda *args: answered.set()
+    client.connect(host, port)
+    client.subscribe(f"{MQTT_OUTPUT_TOPIC_BASE}loadgen-probe", qos=1)
+    client.loop_start()
+    try:
+        deadline = time.monotonic() + timeout
+        probe = json.dumps({
+            "id": "loadgen-probe",
+            "numberOfChildren": 0,
+            "familyComposition": "single",
+            "familyUnitInPayForDecember": True
+        })
+        while not answered.is_set():
+            if time.monotonic() > deadline:
+                raise TimeoutError("The rules engine did not answer probe requests")
+            client.publish(f"{MQTT_INPUT_TOPIC_BASE}loadgen-probe", probe, qos=1)
+            answered.wait(0.2)
+    finally:
+        client.disconnect()
+        client.loop_stop()
+
+
+def run_benchmark(rate=1000.0, duration=10.0, topic_ids=100, qos=0, broker=None, start_engine=True,
+                  workers=0, use_async=False, engine_log=None, drain_timeout=5.0):
+    """
+    Run the rules engine against a broker under generated load.
+
+    Args:
+        rate (float): Requests per second
+        duration (float): Seconds of load
+        topic_ids (int): Distinct input topic ids
+        qos (int): MQTT QoS for requests and results
+        broker (tuple): (host, port) of an existing broker such as mosquitto; a local stand-in is started when None
+        start_engine (bool): Start ``main.py`` against the broker; False measures an engine that is already running
+        workers (int): Engine worker processes
+        use_async (bool): Run the engine's asyncio client
+        engine_log (str): File receiving the engine's log output
+        drain_timeout (float): Seconds to wait for outstanding results
+
+    Returns:
+        dict: Load report including the engine configuration
+    """
+    broker_process = None
+    engine = None
+    if broker is None:
+        broker_process = BrokerProcess().start()
+        broker = ("127.0.0.1", broker_process.port)
+    host, port = broker
+    try:
+        if start_engine:
+            engine = EngineProcess(host, port, workers, use_async, engine_log).start()
+        wait_until_ready(host, port)
+        report = LoadGenerator(host, port, rate, duration, topic_ids, qos, drain_timeout).run()
+    finally:
+        if engine:
+            engine.stop()
+        if broker_process:
+            broker_process.stop()
+
+    report["config"].update({
+        "broker": "local" if broker_process else f"{host}:{port}",
+        "workers": workers,
+        "async": use_async
+    })
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end load benchmark for the Winter Supplement Rules Engine")
+    parser.add_argument("--rate", type=float, default=1000.0, help="Requests per second (default: 1000)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load (default: 10)")
+    parser.add_argument("--topics", type=int, default=100, help="Distinct input topic ids (default: 100)")
+    parser.add_argument("--qos", type=int, choices=(0, 1), default=0, help="MQTT QoS (default: 0)")
+    parser.add_argument("--broker", help="host:port of an existing broker; a local stand-in is started by default")
+    parser.add_argument("--no-engine", dest="start_engine", action="store_false",
+                        help="Do not start the engine; measure one already connected to --broker")
+    parser.add_argument("--workers", type=int, default=0, help="Engine worker processes (default: single client)")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Run the engine's asyncio client")
+    parser.add_argument("--engine-log", help="File receiving the engine's log output")
+    parser.add_argument("--drain-timeout", type=float, default=5.0,
+                        help="Seconds to wait for outstanding results (default: 5)")
+    parser.add_argument("--output", help="Save the report as JSON to this file")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against")
+    args = parser.parse_args(argv)
+    if args.broker:
+        host, _, port = args.broker.rpartition(":")
+        args.broker = (host or "127.0.0.1", int(port))
+    elif not args.start_engine:
+        parser.error("--no-engine needs --broker")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmark(
+        rate=args.rate,
+        duration=args.duration,
+        topic_ids=args.topics,
+        qos=args.qos,
+        broker=args.broker,
+        start_engine=args.start_engine,
+        workers=args.workers,
+        use_async=args.use_async,
+        engine_log=args.engine_log,
+        drain_timeout=args.drain_timeout
+    )
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            report["comparison"] = compare_reports(json.load(baseline_file), report)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+import asyncio
+import itertools
+import logging
+import struct
+import threading
+
+
+def _encode_varint(value):
+    """
+    Encode an MQTT variable byte integer.
+    """
+    encoded = bytearray()
+    while True:
+        byte = value % 128
+        value //= 128
+        if value:
+            byte |= 0x80
+        encoded.append(byte)
+        if not value:
+            return bytes(encoded)
+
+
+def _decode_varint(data, offset):
+    """
+    Decode an MQTT variable byte integer.
+
+    Returns:
+        tuple: (value, offset after the integer)
+    """
+    multiplier = 1
+    value = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value += (byte & 0x7F) * multiplier
+        if not byte & 0x80:
+            return value, offset
+        multiplier *= 128
+
+
+def _encode_string(value):
+    encoded = value.encode() if isinstance(value, str) else value
+    return struct.pack("!H", len(encoded)) + encoded
+
+
+def _decode_string(data, offset):
+    (length,) = struct.unpack_from("!H", data, offset)
+    offset += 2
+    return bytes(data[offset:offset + length]), offset + length
+
+
+def topic_matches(topic_filter, topic):
+    """
+    Check whether a topic matches an MQTT subscription filter (``+`` and ``#`` wildcards).
+
+    Args:
+        topic_filter (str): Subscription filter
+        topic (str): Published topic
+
+    Returns:
+        bool: True if the topic matches
+    """
+    filter_parts = topic_filter.split("/")
+    topic_parts = topic.split("/")
+    if topic.startswith("$") and filter_parts[0] in ("+", "#"):
+        return False
+    for index, part in enumerate(filter_parts):
+        if part == "#":
+            return True
+        if index >= len(topic_parts):
+            return False
+        if part != "+" and part != topic_parts[index]:
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+class _Session:
+    """
+    Broker-side state for one client id.
+    """
+
+    def __init__(self, client_id, clean_session):
+        self.client_id = client_id
+        self.clean_session = clean_session
+        self.protocol_level = 4
+        self.writer = None
+        self.subscriptions = {}  # filter -> granted qos
+        self.pending = []  # QoS 1 messages queued while offline
+        self.packet_ids = itertools.cycle(range(1, 65536))
+
+    @property
+    def connected(self):
+        return self.writer is not None
+
+
+class LocalBroker:
+    """
+    Minimal in-process MQTT broker for tests, benchmarks and local development.
+
+    Stand-in for mosquitto supporting MQTT 3.1.1 and 5 clients, QoS 0 and 1,
+    ``+``/``#`` wildcards, ``$share/<group>/<filter>`` shared subscriptions
+    (round-robin across group members) and persistent sessions
+    (clean session off) that queue QoS 1 messages while the client is away.
+    Retained messages, wills, QoS 2 and authentication are not supported.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        """
+        Args:
+            host (str): Interface to listen on
+            port (int): Port to listen on, 0 picks a free port
+        """
+        self.logger = logging.getLogger(__name__)
+        self.host = host
+        self.port = port
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._started = threading.Event()
+        self._sessions = {}
+        self._share_cursors = {}
+        self.stats = {"connections": 0, "received": 0, "delivered": 0}
+
+    def start(self):
+        """
+        Start the broker on a background thread and wait until it accepts connections.
+
+        Returns:
+            LocalBroker: self, with ``port`` set to the bound port
+        """
+        self._thread = threading.Thread(target=self._run, name="local-mqtt-broker", daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def stop(self):
+        """
+        Stop the broker and close all client connections.
+        """
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def disconnect_all(self):
+        """
+        Drop every client connection, as a broker restart or network failure would.
+        """
+        def close_all():
+            for session in self._sessions.values():
+                if session.writer is not None:
+                    session.writer.close()
+        self._loop.call_soon_threadsafe(close_all)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle_connection, self.host, self.port)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._started.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            for session in self._sessions.values():
+                if session.writer is not None:
+                    session.writer.close()
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._loop.close()
+
+    async def _read_packet(self, reader):
+        header = await reader.readexactly(1)
+        remaining = 0
+        multiplier = 1
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            remaining += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = await reader.readexactly(remaining) if remaining else b""
+        return header[0], body
+
+    async def _handle_connection(self, reader, writer):
+        session = None
+        try:
+            header, body = await self._read_packet(reader)
+            if header & 0xF0 != 0x10:
+                return
+            session = self._handle_connect(body, writer)
+            while True:
+                header, body = await self._read_packet(reader)
+                packet_type = header & 0xF0
+                if packet_type == 0x30:
+                    self._handle_publish(session, header, body)
+                elif packet_type == 0x80:
+                    self._handle_subscribe(session, body)
+                elif packet_type == 0xA0:
+                    self._handle_unsubscribe(session, body)
+                elif packet_type == 0xC0:
+                    writer.write(b"\xd0\x00")
+                elif packet_type == 0xE0:
+                    break
+                # PUBACK and anything else needs no reply
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if session is not None and session.writer is writer:
+                session.writer = None
+                if session.clean_session:
+                    self._sessions.pop(session.client_id, None)
+            writer.close()
+
+    def _handle_connect(self, body, writer):
+        _, offset = _decode_string(body, 0)
+        protocol_level = body[offset]
+        flags = body[offset + 1]
+        offset += 4  # level, flags, keepalive
+        if protocol_level == 5:
+            properties_length, offset = _decode_varint(body, offset)
+            offset += properties_length
+        client_id, offset = _decode_string(body, offset)
+        clean_session = bool(flags & 0x02)
+        client_id = client_id.decode() or f"auto-{id(writer)}"
+
+        session = self._sessions.get(client_id)
+        session_present = session is not None and not clean_session
+        if session is None or clean_session:
+            session = _Session(client_id, clean_session)
+            self._sessions[client_id] = session
+        if session.writer is not None:
+            session.writer.close()
+        session.clean_session = clean_session
+        session.protocol_level = protocol_level
+        session.writer = writer
+        self.stats["connections"] += 1
+
+        if protocol_level == 5:
+            writer.write(b"\x20\x03" + bytes([int(session_present), 0, 0]))
+        else:
+            writer.write(b"\x20\x02" + bytes([int(session_present), 0]))
+
+        for topic, payload, properties in session.pending:
+            self._deliver(session, topic, payload, 1, properties)
+        session.pending = []
+        return session
+
+    def _handle_publish(self, session, header, body):
+        qos = (header >> 1) & 0x03
+        topic, offset = _decode_string(body, 0)
+        packet_id = None
+        if qos:
+            (packet_id,) = struct.unpack_from("!H", body, offset)
+            offset += 2
+        properties = b""
+        if session.protocol_level == 5:
+            properties_length, properties_start = _decode_varint(body, offset)
+            offset = properties_start + properties_length
+            properties = bytes(body[properties_start:offset])
+        payload = bytes(body[offset:])
+
+        if qos == 1:
+            session.writer.write(b"\x40\x02" + struct.pack("!H", packet_id))
+        elif qos == 2:
+            raise ConnectionError("QoS 2 is not supported by the local broker")
+
+        self.stats["received"] += 1
+        self._route(topic.decode(), payload, qos, properties)
+
+    def _route(self, topic, payload, qos, properties):
+        shared_groups = {}
+        for session in list(self._sessions.values()):
+            for topic_filter, granted_qos in session.subscriptions.items():
+                if topic_filter.startswith("$share/"):
+                    _, group, real_filter = topic_filter.split("/", 2)
+                    if topic_matches(real_filter, topic):
+                        shared_groups.setdefault((group, real_filter), []).append((session, granted_qos))
+                elif topic_matches(topic_filter, topic):
+                    self._send(session, topic, payload, min(qos, granted_qos), properties)
+
+        for key, members in shared_groups.items():
+            online = [member for member in members if member[0].connected] or members
+            cursor = self._share_cursors.get(key, 0)
+            session, granted_qos = online[cursor % len(online)]
+            self._share_cursors[key] = cursor + 1
+            self._send(session, topic, payload, min(qos, granted_qos), properties)
+
+    def _send(self, session, topic, payload, qos, properties):
+        if session.connected:
+            self._deliver(session, topic, payload, qos, properties)
+        elif qos and not session.clean_session:
+            session.pending.append((topic, payload, properties))
+
+    def _deliver(self, session, topic, payload, qos, properties):
+        variable_header = _encode_string(topic)
+        if qos:
+            variable_header += struct.pack("!H", next(session.packet_ids))
+        if session.protocol_level == 5:
+            variable_header += _encode_varint(len(properties)) + properties
+        packet = variable_header + payload
+        session.writer.write(bytes([0x30 | (qos << 1)]) + _encode_varint(len(packet)) + packet)
+        self.stats["delivered"] += 1
+
+    def _handle_subscribe(self, session, body):
+        (packet_id,) = struct.unpack_from("!H", body, 0)
+        offset = 2
+        if session.protocol_level == 5:
+            properties_length, offset = _decode_varint(body, offset)
+            offset += properties_length
+        granted = []
+        while offset < len(body):
+            topic_filter, offset = _decode_string(body, offset)
+            qos = min(body[offset] & 0x03, 1)
+            offset += 1
+            session.subscriptions[topic_filter.decode()] = qos
+            granted.append(qos)
+
+        response = struct.pack("!H", packet_id)
+        if session.protocol_level == 5:
+            response += b"\x00"
+        response += bytes(granted)
+        session.writer.write(b"\x90" + _encode_varint(len(response)) + response)
+
+    def _handle_unsubscribe(self, session, body):
+        (packet_id,) = struct.unpack_from("!H", body, 0)
+        offset = 2
+        if session.protocol_level == 5:
+            properties_length, offset = _decode_varint(body, offset)
+            offset += properties_length
+        count = 0
+        while offset < len(body):
+            topic_filter, offset = _decode_string(body, offset)
+            session.subscriptions.pop(topic_filter.decode(), None)
+            count += 1
+
+        response = struct.pack("!H", packet_id)
+        if session.protocol_level == 5:
+            response += b"\x00" + bytes(count)
+        session.writer.write(b"\xb0" + _encode_varint(len(response)) + response)
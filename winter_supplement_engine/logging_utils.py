@@ -0,0 +1,96 @@
+import atexit
+import itertools
+import logging
+import logging.handlers
+import queue
+
+from .config import LOGGING_CONFIG
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that leaves all formatting to the listener thread.
+
+    The stock ``QueueHandler.prepare`` formats the message on the logging
+    thread; here records are queued as they are, so the calling thread only
+    pays for the enqueue. Log arguments must therefore not be mutated after
+    the logging call.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class LogSampler:
+    """
+    Lets through one in every ``rate`` per-message log lines.
+
+    Calling the sampler returns True when the next line should be emitted.
+    Lines are only counted while the level is enabled on the logger.
+    """
+
+    def __init__(self, logger, rate=1, level=logging.INFO):
+        """
+        Args:
+            logger (logging.Logger): Logger the sampled lines go to
+            rate (int): Emit one line in every ``rate``
+            level (int): Level of the sampled lines
+
+        Raises:
+            ValueError: If rate is not positive
+        """
+        if rate < 1:
+            raise ValueError("rate must be at least 1")
+        self.logger = logger
+        self.rate = rate
+        self.level = level
+        self._counter = itertools.count()
+
+    def __call__(self):
+        if not self.logger.isEnabledFor(self.level):
+            return False
+        return self.rate == 1 or next(self._counter) % self.rate == 0
+
+
+def configure_logging(config=LOGGING_CONFIG, logger=None, stream=None):
+    """
+    Configure log output from LOGGING_CONFIG.
+
+    Like ``logging.basicConfig`` this does nothing when the logger already has
+    handlers. With ``config['async']`` set, records go through an unbounded
+    queue to a listener thread that formats and writes them, so log I/O never
+    blocks message processing. The listener is flushed and stopped at exit.
+
+    Args:
+        config (dict): Logging configuration with 'level', 'format' and optional 'async'
+        logger (logging.Logger): Logger to configure; defaults to the root logger
+        stream (file): Output stream; defaults to stderr
+
+    Returns:
+        logging.handlers.QueueListener or None: The started listener in async mode
+    """
+    logger = logger if logger is not None else logging.getLogger()
+    if logger.handlers:
+        return None
+
+    logger.setLevel(config['level'])
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(config['format']))
+    if not config.get('async'):
+        logger.addHandler(handler)
+        return None
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    listener.start()
+    atexit.register(_stop_listener, listener)
+    return listener
+
+
+def _stop_listener(listener):
+    """
+    Flush and stop a queue listener unless it was already stopped.
+    """
+    if listener._thread is not None:
+        listener.stop()
@@ -0,0 +1,397 @@
+import bisect
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds, from 10µs (a cached result) up to 1s
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0
+)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram. Not thread-safe; ``PipelineMetrics`` locks around it.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot counts values above every bound
+        self.sum = 0.0
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """
+        Estimate a quantile by linear interpolation within its bucket, as Prometheus does.
+
+        Args:
+            q (float): Quantile between 0 and 1
+
+        Returns:
+            float or None: Estimated value in seconds, None when nothing was observed
+        """
+        count = self.count
+        if not count:
+            return None
+        rank = q * count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def copy(self):
+        histogram = Histogram(self.buckets)
+        histogram.counts = list(self.counts)
+        histogram.sum = self.sum
+        return histogram
+
+
+class StageTimer:
+    """
+    Measures one message: each ``lap`` closes the current stage.
+    """
+
+    __slots__ = ("started", "stages", "_mark")
+
+    def __init__(self):
+        self.started = self._mark = time.perf_counter()
+        self.stages = []
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.stages.append((stage, now - self._mark))
+        self._mark = now
+
+
+class _NullStageTimer:
+    """
+    Stand-in timer used when metrics are disabled.
+    """
+
+    __slots__ = ()
+
+    def lap(self, stage):
+        pass
+
+
+NULL_STAGE_TIMER = _NullStageTimer()
+
+
+class PipelineMetrics:
+    """
+    Latency histograms and error counts for the message pipeline.
+
+    Timed messages record their total latency and the latency of each stage
+    they went through. ``decode`` covers JSON parsing and input validation,
+    which run as a single pass; ``calculate`` covers the result cache lookup
+    and calculation. Cache hits skip ``validate_output`` and ``encode``.
+
+    To stay cheap enough to leave on, only one in every ``sample_rate``
+    messages is timed; error counts cover every message.
+    """
+
+    STAGES = ("decode", "calculate", "validate_output", "encode", "publish")
+    ERROR_TYPES = ("json", "input_validation", "output_validation", "processing", "dropped", "publish", "shed")
+
+    def __init__(self, buckets=LATENCY_BUCKETS, sample_rate=1, clock=time.monotonic):
+        """
+        Args:
+            buckets (tuple): Histogram bucket upper bounds in seconds
+            sample_rate (int): Time one in every ``sample_rate`` messages
+            clock (callable): Clock used for the uptime
+
+        Raises:
+            ValueError: If sample_rate is not positive
+        """
+        if sample_rate < 1:
+            raise ValueError("sample_rate must be at least 1")
+        self.sample_rate = sample_rate
+        self._sampled = itertools.count()
+        self._lock = threading.Lock()
+        self._clock = clock
+        self._started = clock()
+        self._stages = {stage: Histogram(buckets) for stage in self.STAGES}
+        self._total = Histogram(buckets)
+        self._errors = dict.fromkeys(self.ERROR_TYPES, 0)
+
+    def timer(self):
+        """
+        Start timing a message; pass the timer to ``message_finished`` once done.
+
+        Returns:
+            StageTimer: Timer started now, or a no-op timer for messages outside the sample
+        """
+        if self.sample_rate == 1 or next(self._sampled) % self.sample_rate == 0:
+            return StageTimer()
+        return NULL_STAGE_TIMER
+
+    def message_finished(self, timer):
+        """
+        Record a timed message: its total latency and the stages it went through.
+
+        Args:
+            timer (StageTimer): The message's timer
+        """
+        seconds = time.perf_counter() - timer.started
+        stages = self._stages
+        with self._lock:
+            self._total.observe(seconds)
+            for stage, stage_seconds in timer.stages:
+                stages[stage].observe(stage_seconds)
+
+    def error(self, error_type):
+        """
+        Count a failed message by error type.
+
+        Args:
+            error_type (str): One of ERROR_TYPES
+        """
+        with self._lock:
+            self._errors[error_type] += 1
+
+    def snapshot(self):
+        """
+        Summary of the recorded metrics.
+
+        Returns:
+            dict: Error counts, and count and p50/p95/p99 latency per stage
+        """
+        with self._lock:
+            stages = {stage: histogram.copy() for stage, histogram in self._stages.items()}
+            stages["total"] = self._total.copy()
+            snapshot = {
+                "uptimeSeconds": self._clock() - self._started,
+                "sampleRate": self.sample_rate,
+                "errors": dict(self._errors)
+            }
+        snapshot["latency"] = {
+            stage: {
+                "count": histogram.count,
+                "p50": histogram.quantile(0.5),
+                "p95": histogram.quantile(0.95),
+                "p99": histogram.quantile(0.99)
+            } for stage, histogram in stages.items()
+        }
+        return snapshot
+
+    def render(self, messages=None, in_flight=None, rejections=None, connection=None, reconnect_seconds=None):
+        """
+        Render the metrics in the Prometheus text exposition format.
+
+        Args:
+            messages (dict): Optional message counters by status, exposed as ``winter_supplement_messages_total``
+            in_flight (int): Optional number of messages received but not yet processed
+            rejections (dict): Optional rejected request counters by reason, exposed as
+                ``winter_supplement_rejections_total``
+            connection (dict): Optional ``ConnectionMonitor.stats()`` snapshot, exposed as the connection state
+                and counters of lost connections and failed connection attempts
+            reconnect_seconds (Histogram): Optional histogram of reconnect times
+
+        Returns:
+            str: Exposition text
+        """
+        with self._lock:
+            stages = {stage: histogram.copy() for stage, histogram in self._stages.items()}
+            total = self._total.copy()
+            errors = dict(self._errors)
+
+        lines = []
+        if messages is not None:
+            lines += [
+                "# HELP winter_supplement_messages_total Messages by processing status.",
+                "# TYPE winter_supplement_messages_total counter"
+            ]
+            lines += [f'winter_supplement_messages_total{{status="{status}"}} {count}' for status, count in messages.items()]
+        lines += [
+            "# HELP winter_supplement_errors_total Failed messages by error type.",
+            "# TYPE winter_supplement_errors_total counter"
+        ]
+        lines += [f'winter_supplement_errors_total{{type="{error_type}"}} {count}' for error_type, count in errors.items()]
+        if rejections is not None:
+            lines += [
+                "# HELP winter_supplement_rejections_total Rejected requests by reason.",
+                "# TYPE winter_supplement_rejections_total counter"
+            ]
+            lines += [f'winter_supplement_rejections_total{{reason="{reason}"}} {count}' for reason, count in rejections.items()]
+        if in_flight is not None:
+            lines += [
+                "# HELP winter_supplement_in_flight_messages Messages received but not yet processed.",
+                "# TYPE winter_supplement_in_flight_messages gauge",
+                f"winter_supplement_in_flight_messages {in_flight}"
+            ]
+        if connection is not None:
+            lines += [
+                "# HELP winter_supplement_connected Whether the broker connection is up.",
+                "# TYPE winter_supplement_connected gauge",
+                f"winter_supplement_connected {int(connection['connected'])}",
+                "# HELP winter_supplement_disconnects_total Broker connections lost.",
+                "# TYPE winter_supplement_disconnects_total counter",
+                f"winter_supplement_disconnects_total {connection['disconnects']}",
+                "# HELP winter_supplement_connection_failures_total Failed or refused connection attempts.",
+                "# TYPE winter_supplement_connection_failures_total counter",
+                f"winter_supplement_connection_failures_total {connection['failedAttempts']}"
+            ]
+        if reconnect_seconds is not None:
+            lines += [
+                "# HELP winter_supplement_reconnect_seconds Time from a lost connection to the next accepted one.",
+                "# TYPE winter_supplement_reconnect_seconds histogram"
+            ]
+            lines += _histogram_lines("winter_supplement_reconnect_seconds", reconnect_seconds)
+        lines += [
+            "# HELP winter_supplement_message_latency_seconds Processing latency per message.",
+            "# TYPE winter_supplement_message_latency_seconds histogram"
+        ]
+        lines += _histogram_lines("winter_supplement_message_latency_seconds", total)
+        lines += [
+            "# HELP winter_supplement_stage_latency_seconds Processing latency per pipeline stage.",
+            "# TYPE winter_supplement_stage_latency_seconds histogram"
+        ]
+        for stage, histogram in stages.items():
+            lines += _histogram_lines("winter_supplement_stage_latency_seconds", histogram, f'stage="{stage}"')
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(name, histogram, labels=""):
+    """
+    Prometheus exposition lines for one histogram series.
+    """
+    prefix = f"{labels}," if labels else ""
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{prefix}le="{bound:g}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{suffix} {histogram.sum!r}")
+    lines.append(f"{name}_count{suffix} {histogram.count}")
+    return lines
+
+
+class MetricsServer:
+    """
+    Local HTTP server exposing ``GET /metrics`` from a background thread.
+    """
+
+    def __init__(self, render, host="127.0.0.1", port=0):
+        """
+        Args:
+            render (callable): Returns the exposition text for each request
+            host (str): Interface to listen on
+            port (int): Port to listen on; 0 picks a free port
+        """
+        self.render = render
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """
+        Start serving. ``port`` holds the bound port afterwards.
+
+        Returns:
+            MetricsServer: self
+        """
+        render = self.render
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes are not worth a log line each
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={"poll_interval": 0.1}, name="metrics-server", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving and close the listening socket.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+
+class MetricsReporter:
+    """
+    Logs a stats snapshot, with the message rate since the previous one, at a fixed interval.
+    """
+
+    def __init__(self, stats, interval, logger, clock=time.monotonic):
+        """
+        Args:
+            stats (callable): Returns a stats dict with a ``messages`` section of counters
+            interval (float): Seconds between reports
+            logger (logging.Logger): Logger the reports are written to
+            clock (callable): Clock used to compute the message rate
+        """
+        self.stats = stats
+        self.interval = interval
+        self.logger = logger
+        self._clock = clock
+        self._stopping = threading.Event()
+        self._thread = None
+        self._last = None
+
+    def start(self):
+        self._last = (self._clock(), self.stats()["messages"]["received"])
+        self._thread = threading.Thread(target=self._run, name="metrics-reporter", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def report(self):
+        """
+        Log one report.
+        """
+        stats = self.stats()
+        now = self._clock()
+        received = stats["messages"]["received"]
+        last_time, last_received = self._last
+        stats["messagesPerSecond"] = (received - last_received) / (now - last_time) if now > last_time else 0.0
+        self._last = (now, received)
+        self.logger.info(f"Metrics: {json.dumps(stats)}")
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self.report()
@@ -0,0 +1,186 @@
+from typing import Literal
+
+from .schemas import INPUT_SCHEMA, INPUT_VALIDATOR
+from .serialization import get_serializer
+
+try:
+    import msgspec
+    from typing import Annotated
+except ImportError:  # pragma: no cover - msgspec is an optional dependency
+    msgspec = None
+
+# Attribute names mirror the JSON field names so records map onto the schemas one to one
+REQUEST_FIELDS = ("id", "numberOfChildren", "familyComposition", "familyUnitInPayForDecember")
+RESULT_FIELDS = ("id", "isEligible", "baseAmount", "childrenAmount", "supplementAmount")
+
+FamilyComposition = Literal[tuple(INPUT_SCHEMA["properties"]["familyComposition"]["enum"])]
+
+
+class _SlottedRecord:
+    """
+    Base for the plain ``__slots__`` records used when msgspec is not installed.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, *args, **kwargs):
+        values = dict(zip(self.__slots__, args))
+        values.update(kwargs)
+        for field in self.__slots__:
+            setattr(self, field, values[field])
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def __repr__(self):
+        values = ", ".join(f"{field}={getattr(self, field)!r}" for field in self.__slots__)
+        return f"{type(self).__name__}({values})"
+
+
+if msgspec is not None:
+    class SupplementRequest(msgspec.Struct, gc=False):
+        """
+        Winter Supplement calculation request, decoded and validated in one pass by msgspec.
+        """
+
+        id: str
+        numberOfChildren: Annotated[int, msgspec.Meta(ge=0)]
+        familyComposition: FamilyComposition
+        familyUnitInPayForDecember: bool
+
+        @classmethod
+        def from_dict(cls, data):
+            return cls(*(data[field] for field in REQUEST_FIELDS))
+
+        def to_dict(self):
+            return {field: getattr(self, field) for field in REQUEST_FIELDS}
+
+    class SupplementResult(msgspec.Struct, gc=False):
+        """
+        Winter Supplement calculation result.
+        """
+
+        id: str
+        isEligible: bool
+        baseAmount: float
+        childrenAmount: float
+        supplementAmount: float
+
+        def to_dict(self):
+            return {
+                "id": self.id,
+                "isEligible": self.isEligible,
+                "baseAmount": self.baseAmount,
+                "childrenAmount": self.childrenAmount,
+                "supplementAmount": self.supplementAmount
+            }
+else:
+    class SupplementRequest(_SlottedRecord):
+        """
+        Winter Supplement calculation request.
+        """
+
+        __slots__ = REQUEST_FIELDS
+
+        @classmethod
+        def from_dict(cls, data):
+            return cls(*(data[field] for field in REQUEST_FIELDS))
+
+        def to_dict(self):
+            return {field: getattr(self, field) for field in REQUEST_FIELDS}
+
+    class SupplementResult(_SlottedRecord):
+        """
+        Winter Supplement calculation result.
+        """
+
+        __slots__ = RESULT_FIELDS
+
+        def to_dict(self):
+            return {
+                "id": self.id,
+                "isEligible": self.isEligible,
+                "baseAmount": self.baseAmount,
+                "childrenAmount": self.childrenAmount,
+                "supplementAmount": self.supplementAmount
+            }
+
+
+def as_dict(record):
+    """
+    Return a record as a plain dict; dicts are returned unchanged.
+
+    Args:
+        record (dict or SupplementRequest or SupplementResult): Record to convert
+
+    Returns:
+        dict: Record fields keyed by JSON field name
+    """
+    if isinstance(record, dict):
+        return record
+    return record.to_dict()
+
+
+class RequestDecoder:
+    """
+    Decodes request payloads straight into validated ``SupplementRequest`` records.
+
+    With msgspec installed, JSON parsing and type checking happen in a single
+    pass. Payloads msgspec rejects are re-checked with the schema validator, so
+    accepted inputs and raised errors stay exactly those of ``validate_input``.
+    """
+
+    def __init__(self, serializer=None):
+        """
+        Args:
+            serializer (Serializer): Serializer for the schema fallback path; defaults to the fastest available
+        """
+        self.serializer = serializer or get_serializer()
+        self._decoder = msgspec.json.Decoder(SupplementRequest) if msgspec is not None else None
+
+    def decode(self, payload):
+        """
+        Decode and validate a request payload.
+
+        Args:
+            payload (bytes): Raw message payload
+
+        Returns:
+            SupplementRequest: Validated request
+
+        Raises:
+            json.JSONDecodeError: If the payload is not valid JSON
+            jsonschema.ValidationError: If the payload does not match INPUT_SCHEMA
+        """
+        if self._decoder is not None:
+            try:
+                return self._decoder.decode(payload)
+            except (msgspec.DecodeError, TypeError):
+                # Malformed JSON, or valid JSON msgspec is stricter about than the
+                # schema (e.g. 2.0 children); let the schema path decide
+                pass
+        data = self.serializer.loads(payload)
+        error = INPUT_VALIDATOR.best_error(data)
+        if error is not None:
+            raise error
+        return SupplementRequest.from_dict(data)
+
+    def decode_lines(self, payload):
+        """
+        Decode newline-delimited requests in a single pass, skipping blank lines.
+
+        Args:
+            payload (bytes): NDJSON buffer, such as a memoryview of a mapped file
+
+        Returns:
+            list: ``SupplementRequest`` records, or None if msgspec is not installed or
+                any line is rejected; such buffers are decoded line by line with ``decode``
+        """
+        if self._decoder is None:
+            return None
+        try:
+            return self._decoder.decode_lines(payload)
+        except (msgspec.DecodeError, TypeError):
+            return None
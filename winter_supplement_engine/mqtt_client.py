@@ -1,21 +1,92 @@
 import json
 import logging
+import socket
+import threading
 import time
 import os
 
 import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
 
 from .config import (
     MQTT_BROKER,
     MQTT_PORT,
     MQTT_INPUT_TOPIC_BASE,
     MQTT_OUTPUT_TOPIC_BASE,
+    MQTT_PROTOCOL,
+    MQTT_CLIENT_ID,
+    MQTT_CLEAN_SESSION,
+    MQTT_SESSION_EXPIRY,
+    MQTT_SUBSCRIBE_QOS,
+    OFFLINE_BUFFER_SIZE,
+    MQTT_SHARED_GROUP,
+    MQTT_PUBLISH_QOS,
+    MQTT_MAX_INFLIGHT,
+    MQTT_MAX_QUEUED,
+    MQTT_SOCKET_SNDBUF,
+    MQTT_SOCKET_RCVBUF,
+    MQTT_TCP_NODELAY,
+    PUBLISH_BATCH_SIZE,
+    PUBLISH_FLUSH_INTERVAL,
+    PUBLISH_QUEUE_SIZE,
+    PUBLISH_OVERFLOW_POLICY,
+    MQTT_BATCH_ENABLED,
+    MQTT_BATCH_INPUT_TOPIC_BASE,
+    MQTT_BATCH_OUTPUT_TOPIC_BASE,
     MAX_RETRIES,
     RETRY_DELAY,
+    RETRY_MAX_DELAY,
+    RETRY_JITTER,
+    PROCESSING_WORKERS,
+    PROCESSING_QUEUE_SIZE,
+    PROCESSING_ORDERED,
+    PROCESSING_QUEUE_FULL_POLICY,
+    RESULT_CACHE_SIZE,
+    RESULT_TABLE_ENABLED,
+    RESULT_TABLE_MAX_CHILDREN,
+    DEDUP_CACHE_SIZE,
+    DEDUP_TTL,
+    DEDUP_PATH,
+    RESULT_STORE_PATH,
+    RESULT_STORE_BATCH_SIZE,
+    RESULT_STORE_FLUSH_INTERVAL,
+    RESULT_STORE_QUEUE_SIZE,
+    JSON_SERIALIZER,
+    METRICS_ENABLED,
+    METRICS_SAMPLE_RATE,
+    METRICS_HOST,
+    METRICS_PORT,
+    METRICS_DUMP_INTERVAL,
+    RULES_PATH,
+    RULES_WATCH_INTERVAL,
+    RULES_CONTROL_TOPIC,
+    RULES_VERSION_IN_RESULT,
+    MAX_PAYLOAD_SIZE,
+    ERROR_RESULTS_ENABLED,
+    ERROR_TOPIC_BASE,
+    RATE_LIMIT_PER_CLIENT,
+    RATE_LIMIT_BURST,
+    MAX_CONCURRENT_REQUESTS,
+    SHED_POLICY,
     LOGGING_CONFIG
 )
-from .schemas import validate_input, validate_output
+from . import schemas
+from .schemas import validate_output, validate_batch_input, validate_batch_output, warm_up, INPUT_VALIDATOR
 from .calculator import WinterSupplementCalculator
+from .processing import MessageProcessingPool
+from .result_cache import ResultCache, ResultTable
+from .dedup import DedupStore
+from .result_store import ResultStore
+from .serialization import get_serializer
+from .models import RESULT_FIELDS, RequestDecoder, SupplementRequest, SupplementResult, as_dict
+from .rules import DEFAULT_RULES_PATH, CompiledRules, RulesWatcher, load_rules
+from .logging_utils import LogSampler
+from .metrics import PipelineMetrics, MetricsServer, MetricsReporter, NULL_STAGE_TIMER
+from .publishing import OutputPublisher
+from .prescreen import ERROR_CODES, REJECTION_REASONS, PreScreen
+from .admission import SHED_POLICIES, TokenBucketLimiter
+from .reconnect import ConnectionMonitor, ExponentialBackoff
 
 
 class WinterSupplementMQTTClient:
@@ -23,113 +94,848 @@ class WinterSupplementMQTTClient:
     MQTT Client for processing Winter Supplement calculations.
     """
 
-    def __init__(self):
+    PROTOCOLS = {
+        "3.1.1": mqtt.MQTTv311,
+        "5": mqtt.MQTTv5
+    }
+
+    def __init__(self, shared_group=None, metrics_port=None, client_id=None):
         """
         Initialize MQTT client with configuration and logging.
+
+        Args:
+            shared_group (str): Shared subscription group; defaults to MQTT_SHARED_GROUP.
+                When set, input topics are subscribed as ``$share/<group>/<topic>`` so the
+                broker load-balances messages across all clients in the group.
+            metrics_port (int): Port for the ``/metrics`` endpoint; defaults to METRICS_PORT, 0 disables it
+            client_id (str): MQTT client id; defaults to MQTT_CLIENT_ID
+
+        Raises:
+            ValueError: If the protocol or shed policy is unknown, or a persistent session has no client id
         """
-        # Configure logging
-        logging.basicConfig(
-            level=LOGGING_CONFIG['level'],
-            format=LOGGING_CONFIG['format']
-        )
+        # Logging is configured by the entry point (main.py, or the supervisor in worker processes)
         self.logger = logging.getLogger(__name__)
+        # Per-message INFO lines are sampled to keep logging cheap at high message rates
+        self._sample_info = LogSampler(self.logger, LOGGING_CONFIG.get('sample_rate', 1))
 
         # Get specific topic ID from environment variable if set
         self.specific_topic_id = os.getenv('MQTT_TOPIC_ID')
 
+        self.shared_group = shared_group if shared_group is not None else MQTT_SHARED_GROUP
+
         # Initialize MQTT client
-        self.client = mqtt.Client()
+        if MQTT_PROTOCOL not in self.PROTOCOLS:
+            raise ValueError(f"Unsupported MQTT protocol version: {MQTT_PROTOCOL}")
+        protocol = self.PROTOCOLS[MQTT_PROTOCOL]
+        self.client_id = client_id if client_id is not None else MQTT_CLIENT_ID
+        # The broker finds a persistent session again by its client id
+        if not MQTT_CLEAN_SESSION and not self.client_id:
+            raise ValueError("A client id is required when MQTT_CLEAN_SESSION is false")
+        # Reconnecting is left to connect(), which backs off with jitter, instead of loop_forever
+        self._connect_options = {}
+        if protocol == mqtt.MQTTv5:
+            self.client = mqtt.Client(self.client_id, protocol=protocol, reconnect_on_failure=False)
+            if not MQTT_CLEAN_SESSION:
+                properties = Properties(PacketTypes.CONNECT)
+                properties.SessionExpiryInterval = MQTT_SESSION_EXPIRY
+                self._connect_options = {"clean_start": False, "properties": properties}
+        else:
+            self.client = mqtt.Client(
+                self.client_id, clean_session=MQTT_CLEAN_SESSION, protocol=protocol, reconnect_on_failure=False
+            )
+        self._subscribe_options = {"qos": MQTT_SUBSCRIBE_QOS} if MQTT_SUBSCRIBE_QOS else {}
         self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
         self.client.on_message = self._on_message
+        self.client.on_socket_open = self._on_socket_open
+
+        # Connection state and reconnect times; the backoff is created when connecting
+        self.connection = ConnectionMonitor()
+        self.backoff = None
+
+        # Flow control for QoS 1/2 results: unacknowledged window and outgoing queue limit
+        self.client.max_inflight_messages_set(MQTT_MAX_INFLIGHT)
+        self.client.max_queued_messages_set(MQTT_MAX_QUEUED)
+
+        # Results are published directly or coalesced into batches by a flusher thread
+        self.publisher = OutputPublisher(
+            self.client,
+            qos=MQTT_PUBLISH_QOS,
+            batch_size=PUBLISH_BATCH_SIZE,
+            flush_interval=PUBLISH_FLUSH_INTERVAL,
+            queue_size=PUBLISH_QUEUE_SIZE,
+            overflow_policy=PUBLISH_OVERFLOW_POLICY,
+            offline_buffer_size=OFFLINE_BUFFER_SIZE
+        )
+
+        # Optional worker pool so the network thread only enqueues messages
+        self.processing_pool = None
+        if PROCESSING_WORKERS > 0:
+            self.processing_pool = MessageProcessingPool(
+                self._process_message,
+                workers=PROCESSING_WORKERS,
+                queue_size=PROCESSING_QUEUE_SIZE,
+                ordered=PROCESSING_ORDERED,
+                queue_full_policy=PROCESSING_QUEUE_FULL_POLICY
+            )
+
+        # JSON codec working directly on payload bytes
+        self.serializer = get_serializer(JSON_SERIALIZER)
+        self.request_decoder = RequestDecoder(self.serializer)
+
+        # Cheap checks that turn away certainly invalid requests before decoding
+        self.prescreen = PreScreen(MAX_PAYLOAD_SIZE, loads=self.serializer.loads)
+
+        # Optional cache of results and serialized payloads
+        self.result_cache = None
+        if RESULT_CACHE_SIZE > 0:
+            self.result_cache = ResultCache(RESULT_CACHE_SIZE, dumps=self.serializer.dumps)
+
+        # Optional table of every result up to RESULT_TABLE_MAX_CHILDREN, consulted before the cache
+        self.result_table = None
+        if RESULT_TABLE_ENABLED:
+            self.result_table = ResultTable(
+                RESULT_TABLE_MAX_CHILDREN, dumps=self.serializer.dumps, rules_version=RULES_VERSION_IN_RESULT
+            )
+
+        # Optional store of published results, replayed for redelivered requests
+        self.dedup_store = None
+        if DEDUP_CACHE_SIZE > 0:
+            self.dedup_store = DedupStore(DEDUP_CACHE_SIZE, DEDUP_TTL, DEDUP_PATH or None)
+
+        # Optional audit log of published results, written in batches by a background thread
+        self.result_store = None
+        if RESULT_STORE_PATH:
+            self.result_store = ResultStore(
+                RESULT_STORE_PATH,
+                batch_size=RESULT_STORE_BATCH_SIZE,
+                flush_interval=RESULT_STORE_FLUSH_INTERVAL,
+                queue_size=RESULT_STORE_QUEUE_SIZE
+            )
+
+        # Message counters, updated from the network thread and any workers
+        self._counters_lock = threading.Lock()
+        self._counters = {"received": 0, "published": 0, "replayed": 0, "failed": 0}
+        self._rejections = dict.fromkeys(REJECTION_REASONS, 0)
+        self._error_results = 0
+
+        # Optional admission control: a rate limit per topic id and a cap on requests in progress
+        if SHED_POLICY not in SHED_POLICIES:
+            raise ValueError(f"Unsupported shed policy: {SHED_POLICY}")
+        self.rate_limiter = None
+        if RATE_LIMIT_PER_CLIENT > 0:
+            self.rate_limiter = TokenBucketLimiter(RATE_LIMIT_PER_CLIENT, RATE_LIMIT_BURST)
+        self.max_concurrent = MAX_CONCURRENT_REQUESTS
+        self._shed_counts = {"rateLimited": 0, "overloaded": 0}
+        self._busy_results = 0
+
+        # Optional pipeline metrics, served over HTTP and/or logged periodically while connected
+        self.metrics = PipelineMetrics(sample_rate=METRICS_SAMPLE_RATE) if METRICS_ENABLED else None
+        self.metrics_port = metrics_port if metrics_port is not None else METRICS_PORT
+        self.metrics_server = None
+        self.metrics_reporter = None
+
+        # Rules can be replaced while running, from the rules file or a control topic
+        self.rules_watcher = None
+        if RULES_WATCH_INTERVAL > 0:
+            self.rules_watcher = RulesWatcher(RULES_PATH or DEFAULT_RULES_PATH, self.reload_rules_file, RULES_WATCH_INTERVAL)
+        self.control_topic = RULES_CONTROL_TOPIC
+        self._rules_reloads = 0
+        self._rules_reload_errors = 0
 
     def connect(self):
         """
-        Connect to MQTT broker with retries and start message loop.
+        Connect to MQTT broker with retries and run the message loop until disconnected.
+
+        Lost or refused connections are re-established with the same retry policy:
+        attempts back off exponentially with jitter from ``RETRY_DELAY`` up to
+        ``RETRY_MAX_DELAY``, giving up after ``MAX_RETRIES`` failed attempts in a row.
+        """
+        self.backoff = ExponentialBackoff(RETRY_DELAY, RETRY_MAX_DELAY, jitter=RETRY_JITTER)
+        if not self._connect_with_retries():
+            return
+        # Build the validators while the broker's CONNACK is on its way
+        warm_up()
+        self.publisher.start()
+        if self.result_store:
+            self.result_store.start()
+        if self.processing_pool:
+            self.processing_pool.start()
+        self.start_metrics()
+        if self.rules_watcher:
+            self.rules_watcher.start()
+        try:
+            while True:
+                try:
+                    self.client.loop_forever()
+                except Exception as e:
+                    self.logger.error(f"MQTT network loop failed: {e}")
+                    self.connection.record_disconnect(expected=False)
+                if not self.connection.lost:
+                    break
+                self.logger.warning("Connection to MQTT broker lost, reconnecting")
+                if not self._connect_with_retries(reconnecting=True):
+                    break
+        finally:
+            if self.rules_watcher:
+                self.rules_watcher.stop()
+            self.stop_metrics()
+            if self.processing_pool:
+                self.processing_pool.stop()
+            self.publisher.stop()
+            if self.result_store:
+                self.result_store.stop()
+
+    def _connect_with_retries(self, reconnecting=False):
+        """
+        Connect to the broker, retrying up to ``MAX_RETRIES`` times (forever when it is 0).
+
+        Args:
+            reconnecting (bool): Wait a backoff delay before the first attempt, after a lost connection
+
+        Returns:
+            bool: True once connected, False when all attempts failed
         """
-        retries = 0
-        while retries < MAX_RETRIES:
+        attempts = 0
+        while not MAX_RETRIES or attempts < MAX_RETRIES:
+            if attempts or reconnecting:
+                delay = self.backoff.next_delay()
+                self.logger.info(f"Retrying in {delay:.2f} seconds...")
+                time.sleep(delay)
             try:
-                self.logger.info(f"Attempting to connect to {MQTT_BROKER}:{MQTT_PORT} (Attempt {retries + 1})")
-                self.client.connect(MQTT_BROKER, MQTT_PORT)
+                self.logger.info(f"Attempting to connect to {MQTT_BROKER}:{MQTT_PORT} (Attempt {attempts + 1})")
+                self.client.connect(MQTT_BROKER, MQTT_PORT, **self._connect_options)
                 self.logger.info("Successfully connected to MQTT broker")
-                self.client.loop_forever()
-                break  # Exit loop on successful connection
+                return True
             except Exception as e:
                 self.logger.error(f"Connection attempt failed: {e}")
-                retries += 1
-                if retries < MAX_RETRIES:
-                    self.logger.info(f"Retrying in {RETRY_DELAY} seconds...")
-                    time.sleep(RETRY_DELAY)
-                else:
-                    self.logger.error("Maximum connection attempts reached. Exiting.")
-                    break
+                self.connection.record_failed_attempt()
+                attempts += 1
+        self.logger.error("Maximum connection attempts reached. Exiting.")
+        return False
 
-    def _on_connect(self, client, userdata, flags, rc):
+    def _on_connect(self, client, userdata, flags, rc, properties=None):
         """
         Callback for successful MQTT connection.
 
         Args:
-            rc (int): Connection result code
+            rc (int): Connection result code (a reason code for MQTT v5)
+            properties (Properties): CONNACK properties, MQTT v5 only
         """
         if rc == 0:
             self.logger.info("Connected to MQTT broker successfully")
+            self.connection.record_connect()
+            if self.backoff:
+                self.backoff.reset()
+            if flags and flags.get("session present"):
+                self.logger.info("Resumed persistent session; requests queued while disconnected follow")
 
             # If a specific topic ID is set, subscribe only to that specific topic
             if self.specific_topic_id:
-                specific_topic = f"{MQTT_INPUT_TOPIC_BASE}{self.specific_topic_id}"
+                specific_topic = self._subscription_topic(f"{MQTT_INPUT_TOPIC_BASE}{self.specific_topic_id}")
                 self.logger.info(f"Subscribing to specific topic: {specific_topic}")
-                client.subscribe(specific_topic)
+                client.subscribe(specific_topic, **self._subscribe_options)
             else:
                 # If no specific topic ID, subscribe to wildcard topic
-                client.subscribe(f"{MQTT_INPUT_TOPIC_BASE}+")
+                client.subscribe(self._subscription_topic(f"{MQTT_INPUT_TOPIC_BASE}+"), **self._subscribe_options)
+
+            # Batch requests use their own topics, following the same subscription scheme
+            if MQTT_BATCH_ENABLED:
+                batch_topic_id = self.specific_topic_id or "+"
+                client.subscribe(
+                    self._subscription_topic(f"{MQTT_BATCH_INPUT_TOPIC_BASE}{batch_topic_id}"), **self._subscribe_options
+                )
+
+            # Every client gets control messages, so the topic is never shared
+            if self.control_topic:
+                client.subscribe(self.control_topic, **self._subscribe_options)
+
+            # Results that could not be published while disconnected
+            if self.publisher.offline_buffer_size:
+                flushed = self.publisher.flush_offline(client)
+                if flushed:
+                    self.logger.info(f"Published {flushed} results buffered while disconnected")
         else:
             self.logger.error(f"Failed to connect. Return code: {rc}")
+            self.connection.record_refused()
+
+    def _on_disconnect(self, client, userdata, rc, properties=None):
+        """
+        Callback for broker disconnection.
+
+        Args:
+            rc (int): 0 when the client asked to disconnect, otherwise the reason the connection was lost
+        """
+        self.connection.record_disconnect(expected=rc == 0)
+
+    def _on_socket_open(self, client, userdata, sock):
+        """
+        Callback for a new broker socket; applies the socket tuning options.
+        """
+        self._tune_socket(sock)
+
+    def _tune_socket(self, sock):
+        """
+        Apply the configured buffer sizes and TCP_NODELAY to the broker socket.
+
+        Args:
+            sock (socket.socket): Connected broker socket
+        """
+        options = []
+        if MQTT_SOCKET_SNDBUF > 0:
+            options.append((socket.SOL_SOCKET, socket.SO_SNDBUF, MQTT_SOCKET_SNDBUF))
+        if MQTT_SOCKET_RCVBUF > 0:
+            options.append((socket.SOL_SOCKET, socket.SO_RCVBUF, MQTT_SOCKET_RCVBUF))
+        if MQTT_TCP_NODELAY:
+            options.append((socket.IPPROTO_TCP, socket.TCP_NODELAY, 1))
+        for level, option, value in options:
+            try:
+                sock.setsockopt(level, option, value)
+            except (OSError, AttributeError) as e:
+                self.logger.warning(f"Could not set socket option {option}: {e}")
+
+    def _subscription_topic(self, topic):
+        """
+        Apply the shared subscription prefix to a topic filter when a group is configured.
+        """
+        if self.shared_group:
+            return f"$share/{self.shared_group}/{topic}"
+        return topic
+
+    def reload_rules_file(self, path):
+        """
+        Load, compile and install the rules in a definition file.
+
+        Args:
+            path (str): Rules definition file
+
+        Returns:
+            bool: True if the new rules were installed
+        """
+        return self._install_rules(lambda: load_rules(path, result_type=SupplementResult), f"file {path}")
+
+    # Requests the new rules are tried on before they are installed, eligible and not
+    RULES_CHECK_REQUESTS = (
+        {"id": "rules-check", "numberOfChildren": 1, "familyComposition": "single", "familyUnitInPayForDecember": True},
+        {"id": "rules-check", "numberOfChildren": 2, "familyComposition": "couple", "familyUnitInPayForDecember": False}
+    )
+
+    def _install_rules(self, build, source):
+        """
+        Compile rules with ``build`` and swap them in; invalid rules leave the current ones in place.
+
+        Before they are installed, the rules must produce the engine's result fields and
+        valid results for the ``RULES_CHECK_REQUESTS``, through both the dict and record paths.
+        """
+        try:
+            rules = build()
+            self._check_rules(rules)
+        except Exception as e:
+            with self._counters_lock:
+                self._rules_reload_errors += 1
+            self.logger.error(f"Rejected rules from {source}: {e}")
+            return False
+        WinterSupplementCalculator.install_rules(rules)
+        with self._counters_lock:
+            self._rules_reloads += 1
+        self.logger.info(f"Installed rules {rules.name} version {rules.version} ({rules.fingerprint}) from {source}")
+        return True
+
+    @classmethod
+    def _check_rules(cls, rules):
+        """
+        Dry-run new rules on sample requests.
+
+        Raises:
+            ValueError: If the rules produce other result fields
+            jsonschema.ValidationError: If a result does not match OUTPUT_SCHEMA
+        """
+        if rules.result_fields != RESULT_FIELDS:
+            raise ValueError(f"Rules produce {', '.join(rules.result_fields)} instead of {', '.join(RESULT_FIELDS)}")
+        for request in cls.RULES_CHECK_REQUESTS:
+            validate_output(WinterSupplementCalculator.calculate_supplement(request, rules=rules))
+            validate_output(as_dict(WinterSupplementCalculator.calculate_supplement(
+                SupplementRequest.from_dict(request), rules=rules
+            )))
+
+    def _handle_control_message(self, msg):
+        """
+        Install the rules definition carried by a control topic message.
+
+        Args:
+            msg (mqtt.MQTTMessage): Message whose payload is a JSON rules definition
+        """
+        self._install_rules(
+            lambda: CompiledRules(self.serializer.loads(msg.payload), result_type=SupplementResult),
+            f"topic {msg.topic}"
+        )
+
+    def _count(self, counter):
+        with self._counters_lock:
+            self._counters[counter] += 1
+
+    def _fail(self, error_type):
+        """
+        Count a failed message, by error type when metrics are enabled.
+        """
+        self._count("failed")
+        if self.metrics:
+            self.metrics.error(error_type)
+
+    def _reject(self, client, topic, reason, message, payload=None):
+        """
+        Count a rejected request by reason and, when enabled, reply with an error result.
+
+        Args:
+            client (mqtt.Client): Client to publish the error result with
+            topic (str): Topic for the error result; replaced by ERROR_TOPIC_BASE plus
+                the topic id when that is set
+            reason (str): One of REJECTION_REASONS
+            message (str): Description of the problem
+            payload (bytes): Rejected payload, given when it is valid JSON; its ``id``,
+                if it has one, is echoed in the error result
+        """
+        with self._counters_lock:
+            self._rejections[reason] += 1
+        self._fail("json" if ERROR_CODES[reason] == "INVALID_JSON" else "input_validation")
+        if not ERROR_RESULTS_ENABLED:
+            return
+        request_id = None
+        if payload is not None:
+            # Decoded again only here: rejections are rare, and the id is only needed for the reply
+            data = self.serializer.loads(payload)
+            if isinstance(data, dict) and isinstance(data.get("id"), str):
+                request_id = data["id"]
+        if self._publish_error(client, topic, {"code": ERROR_CODES[reason], "message": message}, request_id):
+            with self._counters_lock:
+                self._error_results += 1
+
+    def _shed_request(self, client, msg):
+        """
+        Apply admission control to a received request.
+
+        Requests arriving while MAX_CONCURRENT_REQUESTS are in progress, or
+        beyond their topic id's rate limit, are shed: counted as failed and,
+        with the ``busy`` policy, answered with a ``BUSY`` error result.
+
+        Args:
+            client (mqtt.Client): Client to publish the busy result with
+            msg (mqtt.MQTTMessage): Received request, already counted as received
+
+        Returns:
+            bool: True if the request was shed
+        """
+        if self.max_concurrent:
+            with self._counters_lock:
+                overloaded = self._in_flight_count(self._counters) > self.max_concurrent
+            if overloaded:
+                return self._shed(client, msg.topic, "overloaded", {"code": "BUSY", "message": "Too many requests in progress"})
+        if self.rate_limiter:
+            retry_after = self.rate_limiter.acquire(msg.topic.split('/')[-1])
+            if retry_after:
+                return self._shed(client, msg.topic, "rateLimited", {
+                    "code": "BUSY",
+                    "message": "Rate limit exceeded",
+                    "retryAfter": round(retry_after, 3)
+                })
+        return False
+
+    def _shed(self, client, topic, reason, error):
+        with self._counters_lock:
+            self._shed_counts[reason] += 1
+        self._fail("shed")
+        if SHED_POLICY == "busy" and self._publish_error(client, self._reply_topic(topic), error):
+            with self._counters_lock:
+                self._busy_results += 1
+        return True
+
+    @staticmethod
+    def _reply_topic(topic):
+        """
+        Output topic answering a request received on ``topic``.
+        """
+        topic_id = topic.split('/')[-1]
+        if MQTT_BATCH_ENABLED and topic.startswith(MQTT_BATCH_INPUT_TOPIC_BASE):
+            return f"{MQTT_BATCH_OUTPUT_TOPIC_BASE}{topic_id}"
+        return f"{MQTT_OUTPUT_TOPIC_BASE}{topic_id}"
+
+    def _publish_error(self, client, topic, error, request_id=None):
+        """
+        Publish an error result.
+
+        Args:
+            client (mqtt.Client): Client to publish with
+            topic (str): Output topic; replaced by ERROR_TOPIC_BASE plus the topic id when that is set
+            error (dict): Error with a ``code`` and ``message``
+            request_id (str): Id of the rejected request, when known
+
+        Returns:
+            bool: True if the error result was published
+        """
+        if ERROR_TOPIC_BASE:
+            topic = f"{ERROR_TOPIC_BASE}{topic.split('/')[-1]}"
+        result = {"error": error} if request_id is None else {"id": request_id, "error": error}
+        if self.publisher.publish(client, topic, self.serializer.dumps(result)):
+            return True
+        self.logger.warning(f"Could not publish error result to {topic}")
+        return False
+
+    def start_metrics(self):
+        """
+        Start the ``/metrics`` endpoint and periodic metrics log, when configured.
+        """
+        if not self.metrics:
+            return
+        if self.metrics_port and self.metrics_server is None:
+            try:
+                self.metrics_server = MetricsServer(self.metrics_text, METRICS_HOST, self.metrics_port).start()
+                self.logger.info(f"Serving metrics on http://{METRICS_HOST}:{self.metrics_server.port}/metrics")
+            except OSError as e:
+                self.metrics_server = None
+                self.logger.error(f"Could not start metrics endpoint: {e}")
+        if METRICS_DUMP_INTERVAL > 0 and self.metrics_reporter is None:
+            self.metrics_reporter = MetricsReporter(self.stats, METRICS_DUMP_INTERVAL, self.logger).start()
+
+    def stop_metrics(self):
+        """
+        Stop the ``/metrics`` endpoint and periodic metrics log.
+        """
+        if self.metrics_server:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        if self.metrics_reporter:
+            self.metrics_reporter.stop()
+            self.metrics_reporter = None
+
+    def metrics_text(self):
+        """
+        Metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: Exposition text, including the message counters
+        """
+        with self._counters_lock:
+            messages = dict(self._counters)
+            rejections = dict(self._rejections)
+        return self.metrics.render(
+            messages, self._in_flight_count(messages), rejections,
+            connection=self.connection.stats(), reconnect_seconds=self.connection.reconnect_histogram()
+        )
+
+    @staticmethod
+    def _in_flight_count(messages):
+        """
+        Messages received but not yet published, replayed or failed, from a counters snapshot.
+        """
+        return messages["received"] - messages["published"] - messages["replayed"] - messages["failed"]
+
+    def stats(self):
+        """
+        Snapshot of processing statistics.
+
+        Returns:
+            dict: Message counters, in-flight depth, rejections by reason, connection and publishing counters and
+            rules version,
+            plus admission, worker pool, cache, result store and metrics sections for the features that are enabled
+        """
+        with self._counters_lock:
+            stats = {"messages": dict(self._counters)}
+            stats["rejections"] = {"reasons": dict(self._rejections), "errorResults": self._error_results}
+            if self.rate_limiter or self.max_concurrent:
+                stats["admission"] = {
+                    **self._shed_counts,
+                    "busyResults": self._busy_results,
+                    "maxConcurrent": self.max_concurrent,
+                    "policy": SHED_POLICY
+                }
+        if self.rate_limiter:
+            stats["admission"]["rateLimiter"] = self.rate_limiter.stats()
+        stats["inFlight"] = self._in_flight_count(stats["messages"])
+        stats["connection"] = self.connection.stats()
+        stats["publishing"] = self.publisher.stats()
+        with self._counters_lock:
+            reloads, reload_errors = self._rules_reloads, self._rules_reload_errors
+        stats["rules"] = {**WinterSupplementCalculator.rules.info(), "reloads": reloads, "reloadErrors": reload_errors}
+        if self.processing_pool:
+            stats["processing"] = self.processing_pool.stats()
+        if self.result_table:
+            stats["resultTable"] = self.result_table.stats()
+        if self.result_cache:
+            stats["resultCache"] = self.result_cache.stats()
+        if self.dedup_store:
+            stats["dedup"] = self.dedup_store.stats()
+        if self.result_store:
+            stats["resultStore"] = self.result_store.stats()
+        if self.metrics:
+            stats["metrics"] = self.metrics.snapshot()
+        return stats
 
     def _on_message(self, client, userdata, msg):
         """
-        Process incoming MQTT messages for Winter Supplement calculation.
+        Receive MQTT messages and dispatch them for processing.
+
+        Messages are processed inline unless a worker pool is configured, in
+        which case they are queued keyed on topic.
+
+        Args:
+            msg (mqtt.MQTTMessage): Received message
+        """
+        if self.control_topic and msg.topic == self.control_topic:
+            self._handle_control_message(msg)
+            return
+        self._count("received")
+        # In-flight is derived from the counters, so every received message must end as
+        # published, replayed or failed, even when admission or queueing raises
+        try:
+            if (self.rate_limiter or self.max_concurrent) and self._shed_request(client, msg):
+                return
+            if self.processing_pool:
+                if not self.processing_pool.submit(msg.topic, client, msg):
+                    self.logger.warning(f"Processing queue full, dropped message on {msg.topic}")
+                    self._fail("dropped")
+                return
+        except Exception as e:
+            self.logger.error(f"Error dispatching message on {msg.topic}: {e}")
+            self._fail("processing")
+            return
+        self._process_message(client, msg)
+
+    def _process_message(self, client, msg):
+        """
+        Process an MQTT message, replaying the earlier result for redelivered requests.
+
+        Args:
+            msg (mqtt.MQTTMessage): Received message
+        """
+        timer = self.metrics.timer() if self.metrics else NULL_STAGE_TIMER
+        try:
+            self._route_message(client, msg, timer)
+        except Exception as e:
+            # The handlers count their own failures; this catches what escapes them, such as the dedup lookup
+            self.logger.error(f"Error processing message on {msg.topic}: {e}")
+            self._fail("processing")
+        if timer is not NULL_STAGE_TIMER:
+            self.metrics.message_finished(timer)
+
+    def _route_message(self, client, msg, timer):
+        """
+        Replay a duplicate, or hand the message to the single or batch handler.
+        """
+        if self.dedup_store:
+            # Keyed on the rules read before processing, so results are never replayed under other rules
+            rules_key = WinterSupplementCalculator.rules.fingerprint.encode()
+            replay = self.dedup_store.lookup(msg.topic, msg.payload, rules_key)
+            if replay:
+                if not self.publisher.publish(client, *replay):
+                    self._fail("publish")
+                    return
+                self._count("replayed")
+                if self._sample_info():
+                    self.logger.info(f"Replayed result for duplicate message on {msg.topic}")
+                return
+
+        if MQTT_BATCH_ENABLED and msg.topic.startswith(MQTT_BATCH_INPUT_TOPIC_BASE):
+            published = self._process_batch_message(client, msg)
+        else:
+            published = self._process_single_message(client, msg, timer)
+
+        if published and self.dedup_store:
+            try:
+                self.dedup_store.record(msg.topic, msg.payload, *published, context=rules_key)
+            except Exception as e:
+                # Already published and counted; only a later duplicate is calculated again
+                self.logger.error(f"Could not record result for deduplication: {e}")
+
+    def _process_single_message(self, client, msg, timer=NULL_STAGE_TIMER):
+        """
+        Process an MQTT message for Winter Supplement calculation.
 
         Args:
             msg (mqtt.MQTTMessage): Received message
+            timer (StageTimer): Records the latency of each processing stage
+
+        Returns:
+            tuple or None: (output topic, payload) that was published, None on failure
         """
+        # Debug lines are only built when enabled; checked once per message
+        debug = self.logger.isEnabledFor(logging.DEBUG)
         try:
             # Extract topic ID from received message topic
             topic_parts = msg.topic.split('/')
             topic_id = topic_parts[-1]
-            self.logger.debug(f"Extracted topic ID: {topic_id}")
+            if debug:
+                self.logger.debug(f"Extracted topic ID: {topic_id}")
 
-            # Parse input data
-            input_data = json.loads(msg.payload.decode())
-            self.logger.debug(f"Received input data: {input_data}")
+            output_topic = f"{MQTT_OUTPUT_TOPIC_BASE}{topic_id}"
+
+            # Turn away certainly invalid payloads before the decoder and schema validator
+            rejection = self.prescreen.check(msg.payload)
+            if rejection:
+                reason, message = rejection
+                if ERROR_CODES[reason] == "INVALID_JSON":
+                    self.logger.error(f"Invalid JSON received: {message}")
+                else:
+                    self.logger.error(f"Input validation failed: {message}")
+                # Payloads rejected as not an object or missing keys are valid JSON
+                payload = msg.payload if reason in ("not_object", "missing_keys") else None
+                self._reject(client, output_topic, reason, message, payload)
+                return
 
-            # Validate input schema
+            # Parse and validate input data in one pass
             try:
-                validate_input(input_data)
-                self.logger.debug("Input data validated successfully.")
-            except Exception as e:
+                request = self.request_decoder.decode(msg.payload)
+                timer.lap("decode")
+                if debug:
+                    self.logger.debug(f"Received input data: {request}")
+            except schemas.ValidationError as e:
                 self.logger.error(f"Input validation failed: {str(e)}")
+                self._reject(client, output_topic, "invalid_input", e.message, msg.payload)
+                return
+            except json.JSONDecodeError as e:
+                self.logger.error("Invalid JSON received")
+                self._reject(client, output_topic, "invalid_json", str(e))
                 return
 
-            # Calculate supplement
-            result = WinterSupplementCalculator.calculate_supplement(input_data)
-            self.logger.debug(f"Calculated supplement for ID: {input_data['id']}")
-            self.logger.debug(f"Calculation result: {result}")
+            # The rules are read once so a concurrent reload cannot mix versions within one result
+            rules = WinterSupplementCalculator.rules
+
+            # Table and cache hits skip calculation, output validation and serialization
+            cached = self.result_table.get(request) if self.result_table else None
+            if cached is None and self.result_cache:
+                cached = self.result_cache.get(request)
+            if cached:
+                result, payload = cached
+                timer.lap("calculate")
+                if debug:
+                    self.logger.debug(f"Result cache hit for ID: {request.id}")
+            else:
+                # Calculate supplement
+                result = as_dict(WinterSupplementCalculator.calculate_supplement(request, rules=rules))
+                if RULES_VERSION_IN_RESULT:
+                    result["rulesVersion"] = rules.version
+                timer.lap("calculate")
+                if debug:
+                    self.logger.debug(f"Calculated supplement for ID: {request.id}")
+                    self.logger.debug(f"Calculation result: {result}")
+
+                # Validate output schema
+                try:
+                    validate_output(result)
+                    timer.lap("validate_output")
+                    if debug:
+                        self.logger.debug("Output data validated successfully.")
+                except Exception as e:
+                    self.logger.error(f"Output validation failed: {str(e)}")
+                    self._fail("output_validation")
+                    return
 
-            # Validate output schema
+                if self.result_cache:
+                    payload = self.result_cache.put(request, result, rules)
+                else:
+                    payload = self.serializer.dumps(result)
+                timer.lap("encode")
+
+            # Publish result to output topic
+            if debug:
+                self.logger.debug(f"Publishing result to output topic: {output_topic}")
+            if not self.publisher.publish(client, output_topic, payload):
+                self._fail("publish")
+                return
+            timer.lap("publish")
+            self._count("published")
+            if self.result_store:
+                self.result_store.record(request.id, output_topic, payload, rules.version)
+            if self._sample_info():
+                self.logger.info(f"Published result for ID: {request.id}")
+            return output_topic, payload
+
+        except Exception as e:
+            self.logger.error(f"Error processing message: {e}")
+            self._fail("processing")
+
+    def _process_batch_message(self, client, msg):
+        """
+        Process a batch request carrying many calculation inputs.
+
+        Each item is validated on its own; invalid items get a per-item error
+        while valid items are calculated together and returned in input order.
+
+        Args:
+            msg (mqtt.MQTTMessage): Received batch message
+
+        Returns:
+            tuple or None: (output topic, payload) that was published, None on failure
+        """
+        try:
+            topic_id = msg.topic.split('/')[-1]
+            output_topic = f"{MQTT_BATCH_OUTPUT_TOPIC_BASE}{topic_id}"
+            # Batches are held to the same size limit as single requests before decoding
+            rejection = self.prescreen.check_size(msg.payload)
+            if rejection:
+                reason, message = rejection
+                self.logger.error(f"Batch validation failed: {message}")
+                self._reject(client, output_topic, reason, message)
+                return
             try:
-                validate_output(result)
-                self.logger.debug("Output data validated successfully.")
+                batch_data = self.serializer.loads(msg.payload)
+            except json.JSONDecodeError as e:
+                self.logger.error("Invalid JSON received")
+                self._reject(client, output_topic, "invalid_json", str(e))
+                return
+
+            try:
+                validate_batch_input(batch_data)
+            except schemas.ValidationError as e:
+                self.logger.error(f"Batch validation failed: {str(e)}")
+                self._reject(client, output_topic, "invalid_input", e.message, msg.payload)
+                return
+
+            entries = []
+            valid_items = []
+            for index, item in enumerate(batch_data['items']):
+                error = INPUT_VALIDATOR.best_error(item)
+                if error is None:
+                    entries.append({"index": index})
+                    valid_items.append(item)
+                else:
+                    entries.append({"index": index, "error": {"code": "INVALID_INPUT", "message": error.message}})
+
+            # The rules are read once so every item, and its rulesVersion, comes from the same rules
+            rules = WinterSupplementCalculator.rules
+            results = iter(WinterSupplementCalculator.calculate_batch(valid_items, rules=rules))
+            for entry in entries:
+                if "error" not in entry:
+                    result = entry["result"] = next(results)
+                    if RULES_VERSION_IN_RESULT:
+                        result["rulesVersion"] = rules.version
+            batch_result = {"batchId": batch_data['batchId'], "results": entries}
+
+            try:
+                validate_batch_output(batch_result)
             except Exception as e:
-                self.logger.error(f"Output validation failed: {str(e)}")
+                self.logger.error(f"Batch output validation failed: {str(e)}")
+                self._fail("output_validation")
                 return
 
-            # Publish result to output topic
-            output_topic = f"{MQTT_OUTPUT_TOPIC_BASE}{topic_id}"
-            self.logger.debug(f"Publishing result to output topic: {output_topic}")
-            client.publish(output_topic, json.dumps(result))
-            self.logger.info(f"Published result for ID: {input_data['id']}")
+            payload = self.serializer.dumps(batch_result)
+            if not self.publisher.publish(client, output_topic, payload):
+                self._fail("publish")
+                return
+            self._count("published")
+            if self.result_store:
+                # Each result is serialized as it is within the published batch
+                dumps = self.serializer.dumps
+                for entry in entries:
+                    if "result" in entry:
+                        result = entry["result"]
+                        self.result_store.record(result["id"], output_topic, dumps(result), rules.version)
+            if self._sample_info():
+                self.logger.info(
+                    f"Published batch {batch_data['batchId']} with {len(valid_items)} results "
+                    f"and {len(entries) - len(valid_items)} errors"
+                )
+            return output_topic, payload
 
-        except json.JSONDecodeError:
-            self.logger.error("Invalid JSON received")
         except Exception as e:
-            self.logger.error(f"Error processing message: {e}")
+            self.logger.error(f"Error processing batch message: {e}")
+            self._fail("processing")
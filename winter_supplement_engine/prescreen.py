@@ -0,0 +1,98 @@
+import json
+
+from .schemas import INPUT_SCHEMA
+
+# Reasons a request is rejected: the pre-screen checks first, then decoding and full validation
+REJECTION_REASONS = ("too_large", "not_object", "missing_keys", "invalid_json", "invalid_input")
+
+# Error code sent back in error results for each rejection reason
+ERROR_CODES = {
+    "too_large": "PAYLOAD_TOO_LARGE",
+    "not_object": "INVALID_INPUT",
+    "missing_keys": "INVALID_INPUT",
+    "invalid_json": "INVALID_JSON",
+    "invalid_input": "INVALID_INPUT"
+}
+
+_WHITESPACE = b" \t\r\n"
+
+
+class PreScreen:
+    """
+    Cheap checks on a raw request payload, run before decoding and schema validation.
+
+    Only payloads that would certainly fail later are rejected: payloads over
+    the size limit, payloads that do not start like a JSON object, and
+    payloads in which a required key does not appear at all. Rejected payloads
+    are decoded to tell malformed JSON apart, but never reach the schema
+    validator. Anything else, including payloads using escape sequences that
+    could spell a key, is left to full validation.
+    """
+
+    def __init__(self, max_size=65536, required_keys=tuple(INPUT_SCHEMA["required"]), loads=json.loads):
+        """
+        Args:
+            max_size (int): Largest accepted payload in bytes; 0 disables the limit
+            required_keys (tuple): Keys every request object must have
+            loads (callable): JSON decoder raising ``json.JSONDecodeError``, such as ``Serializer.loads``
+
+        Raises:
+            ValueError: If max_size is negative
+        """
+        if max_size < 0:
+            raise ValueError("max_size must not be negative")
+        self.max_size = max_size
+        self.required_keys = required_keys
+        self.loads = loads
+        self._quoted_keys = tuple((key, f'"{key}"'.encode()) for key in required_keys)
+
+    def check(self, payload):
+        """
+        Screen a payload.
+
+        Args:
+            payload (bytes): Raw message payload
+
+        Returns:
+            tuple or None: (reason, message) for a rejected payload, None if it may be valid
+        """
+        if not isinstance(payload, (bytes, bytearray)):
+            return "invalid_json", f"Payload of type {type(payload).__name__} is not JSON"
+        rejection = self.check_size(payload)
+        if rejection:
+            return rejection
+        start = 0
+        while start < len(payload) and payload[start] in _WHITESPACE:
+            start += 1
+        if payload[start:start + 1] != b"{":
+            return self._classify(payload, "not_object", "Payload is not a JSON object")
+        if b"\\" not in payload:
+            for key, quoted in self._quoted_keys:
+                if quoted not in payload:
+                    # Same wording as the schema validator
+                    return self._classify(payload, "missing_keys", f"'{key}' is a required property")
+        return None
+
+    def check_size(self, payload):
+        """
+        Screen a payload on its size alone, for payloads that are not single requests.
+
+        Args:
+            payload (bytes): Raw message payload
+
+        Returns:
+            tuple or None: ("too_large", message) for a payload over the limit, None otherwise
+        """
+        if self.max_size and len(payload) > self.max_size:
+            return "too_large", f"Payload of {len(payload)} bytes exceeds the {self.max_size} byte limit"
+        return None
+
+    def _classify(self, payload, reason, message):
+        """
+        Report malformed JSON as such, otherwise the given rejection.
+        """
+        try:
+            self.loads(payload)
+        except json.JSONDecodeError as e:
+            return "invalid_json", str(e)
+        return reason, message
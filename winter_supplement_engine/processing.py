@@ -0,0 +1,166 @@
+import logging
+import queue
+import threading
+import time
+import zlib
+
+
+class MessageProcessingPool:
+    """
+    Bounded queue feeding a pool of worker threads.
+
+    Lets the MQTT network thread hand messages off and return to socket I/O
+    immediately. With ``ordered`` set, every key (the message topic) is pinned
+    to one worker so messages on the same topic are processed in arrival order.
+    """
+
+    QUEUE_FULL_POLICIES = ("block", "drop")
+
+    _STOP = object()
+
+    def __init__(self, handler, workers, queue_size=1000, ordered=True, queue_full_policy="block"):
+        """
+        Create the pool. Workers are not started until ``start`` is called.
+
+        Args:
+            handler (callable): Called with the submitted arguments on a worker thread
+            workers (int): Number of worker threads
+            queue_size (int): Capacity of each queue (per worker when ordered, shared otherwise)
+            ordered (bool): Keep per-key ordering by pinning keys to workers
+            queue_full_policy (str): "block" to wait for space, "drop" to discard the message
+
+        Raises:
+            ValueError: If workers is not positive or the policy is unknown
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        if queue_full_policy not in self.QUEUE_FULL_POLICIES:
+            raise ValueError(f"Unknown queue full policy: {queue_full_policy}")
+
+        self.logger = logging.getLogger(__name__)
+        self.handler = handler
+        self.workers = workers
+        self.ordered = ordered
+        self.queue_full_policy = queue_full_policy
+
+        num_queues = workers if ordered else 1
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(num_queues)]
+        self._threads = []
+
+        self._stats_lock = threading.Lock()
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._dropped = 0
+        self._blocked = 0
+        self._blocked_seconds = 0.0
+        self._max_queue_depth = 0
+
+    def start(self):
+        """
+        Start the worker threads.
+        """
+        if self._threads:
+            return
+        for index in range(self.workers):
+            work_queue = self._queues[index] if self.ordered else self._queues[0]
+            thread = threading.Thread(
+                target=self._worker,
+                args=(work_queue,),
+                name=f"supplement-worker-{index}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """
+        Stop the workers after the messages already queued have been processed.
+
+        Args:
+            timeout (float): Seconds to wait for each worker to finish
+        """
+        if not self._threads:
+            return
+        if self.ordered:
+            for work_queue in self._queues:
+                work_queue.put(self._STOP)
+        else:
+            for _ in self._threads:
+                self._queues[0].put(self._STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, key, *args):
+        """
+        Queue a message for processing.
+
+        Args:
+            key (str): Ordering key; messages with equal keys stay in order when ordered
+            *args: Arguments passed to the handler
+
+        Returns:
+            bool: True if queued, False if dropped because the queue was full
+        """
+        work_queue = self._queues[zlib.crc32(key.encode()) % len(self._queues)] if self.ordered else self._queues[0]
+        item = args
+
+        try:
+            work_queue.put_nowait(item)
+        except queue.Full:
+            if self.queue_full_policy == "drop":
+                with self._stats_lock:
+                    self._dropped += 1
+                return False
+            started = time.perf_counter()
+            work_queue.put(item)
+            with self._stats_lock:
+                self._blocked += 1
+                self._blocked_seconds += time.perf_counter() - started
+
+        depth = work_queue.qsize()
+        with self._stats_lock:
+            self._submitted += 1
+            if depth > self._max_queue_depth:
+                self._max_queue_depth = depth
+        return True
+
+    def stats(self):
+        """
+        Snapshot of throughput and backpressure counters.
+
+        Returns:
+            dict: Counters and current queue depth
+        """
+        with self._stats_lock:
+            return {
+                "workers": self.workers,
+                "ordered": self.ordered,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "dropped": self._dropped,
+                "blocked": self._blocked,
+                "blockedSeconds": self._blocked_seconds,
+                "queueDepth": sum(work_queue.qsize() for work_queue in self._queues),
+                "maxQueueDepth": self._max_queue_depth
+            }
+
+    def _worker(self, work_queue):
+        """
+        Worker loop: run the handler for each queued message until stopped.
+        """
+        while True:
+            item = work_queue.get()
+            if item is self._STOP:
+                return
+            try:
+                self.handler(*item)
+            except Exception as e:
+                self.logger.error(f"Worker failed to process message: {e}")
+                with self._stats_lock:
+                    self._failed += 1
+            else:
+                with self._stats_lock:
+                    self._completed += 1
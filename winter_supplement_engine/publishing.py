@@ -0,0 +1,264 @@
+import logging
+import socket
+import threading
+from collections import deque
+
+import paho.mqtt.client as mqtt
+
+# Linux TCP_CORK / BSD TCP_NOPUSH: hold partial segments until uncorked
+_TCP_CORK = getattr(socket, "TCP_CORK", None) or getattr(socket, "TCP_NOPUSH", None)
+
+
+class OutputPublisher:
+    """
+    Publishes results, either immediately or in coalesced batches.
+
+    With ``batch_size`` 1 and no ``flush_interval`` every result is published
+    as soon as it is ready. Otherwise results are queued and a flusher thread
+    publishes up to ``batch_size`` of them at a time, waiting up to
+    ``flush_interval`` seconds for a batch to fill. Each batch is written with
+    the socket corked, so the kernel packs many small PUBLISH packets into
+    full TCP segments instead of sending one segment per result.
+
+    When the queue is full, ``overflow_policy`` decides:
+        - "block": wait for space, slowing down message processing
+        - "drop-oldest": discard the oldest queued result
+        - "fail": reject the new result
+
+    QoS 0 results published while the broker connection is down would be
+    lost, so with ``offline_buffer_size`` set up to that many are kept, the
+    oldest dropped first, and published by ``flush_offline`` once reconnected.
+    QoS 1/2 results need no buffer: paho keeps them until they are acknowledged.
+    """
+
+    OVERFLOW_POLICIES = ("block", "drop-oldest", "fail")
+
+    def __init__(self, client, qos=0, batch_size=1, flush_interval=0.0, queue_size=10000,
+                 overflow_policy="block", cork=True, offline_buffer_size=0):
+        """
+        Args:
+            client (mqtt.Client): Client whose socket is corked during batch flushes
+            qos (int): QoS for published results
+            batch_size (int): Maximum results per flush; 1 with no flush_interval publishes immediately
+            flush_interval (float): Seconds to wait for a batch to fill before flushing
+            queue_size (int): Maximum queued results
+            overflow_policy (str): "block", "drop-oldest" or "fail"
+            cork (bool): Cork the socket while flushing a batch, where the platform supports it
+            offline_buffer_size (int): QoS 0 results kept while disconnected; 0 disables the buffer
+
+        Raises:
+            ValueError: If an argument is out of range or the policy is unknown
+        """
+        if qos not in (0, 1, 2):
+            raise ValueError(f"Invalid publish QoS: {qos}")
+        if batch_size < 1 or queue_size < 1 or flush_interval < 0 or offline_buffer_size < 0:
+            raise ValueError("batch_size and queue_size must be positive, flush_interval and offline_buffer_size "
+                             "not negative")
+        if overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+
+        self.logger = logging.getLogger(__name__)
+        self.client = client
+        self.qos = qos
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.cork = cork and _TCP_CORK is not None
+        self.batching = batch_size > 1 or flush_interval > 0
+
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._published = 0
+        self._rejected = 0  # By the overflow policy
+        self._rejected_by_client = 0  # By paho's outgoing queue limit
+        self._dropped = 0
+        self._blocked = 0
+        self._flushes = 0
+        self.offline_buffer_size = offline_buffer_size
+        self._offline = deque(maxlen=offline_buffer_size or None)
+        self._offline_lock = threading.Lock()
+        self._offline_dropped = 0
+        self._offline_flushed = 0
+
+    def start(self):
+        """
+        Start the flusher thread when batching.
+        """
+        if self.batching and self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="output-publisher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Flush queued results and stop the flusher thread.
+        """
+        if self._thread is None:
+            return
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self._thread.join()
+        self._thread = None
+
+    def publish(self, client, topic, payload):
+        """
+        Publish a result now or queue it for the next flush.
+
+        Args:
+            client (mqtt.Client): Client to publish with
+            topic (str): Output topic
+            payload (bytes): Serialized result
+
+        Returns:
+            bool: False if the result was rejected by the overflow policy or the client's queue limit
+        """
+        if not self.batching or self._thread is None:
+            return self._send(client, topic, payload)
+
+        with self._condition:
+            if len(self._queue) >= self.queue_size:
+                if self.overflow_policy == "fail":
+                    self._rejected += 1
+                    return False
+                if self.overflow_policy == "drop-oldest":
+                    self._queue.popleft()
+                    self._dropped += 1
+                else:
+                    self._blocked += 1
+                    while len(self._queue) >= self.queue_size and not self._stopping:
+                        self._condition.wait()
+            self._queue.append((client, topic, payload))
+            # Wake the flusher for the first queued result and once a batch is full
+            if len(self._queue) == 1 or len(self._queue) >= self.batch_size:
+                self._condition.notify_all()
+        return True
+
+    def stats(self):
+        """
+        Snapshot of publisher counters.
+
+        Returns:
+            dict: Published, rejected, dropped and blocked counts, flushes and queue depth
+        """
+        with self._condition:
+            queue_depth = len(self._queue)
+            rejected, dropped, blocked = self._rejected, self._dropped, self._blocked
+        with self._stats_lock:
+            published, rejected_by_client, flushes = self._published, self._rejected_by_client, self._flushes
+        with self._offline_lock:
+            offline = {"buffered": len(self._offline), "dropped": self._offline_dropped, "flushed": self._offline_flushed}
+        return {
+            "qos": self.qos,
+            "batching": self.batching,
+            "published": published,
+            "rejected": rejected + rejected_by_client,
+            "dropped": dropped,
+            "blocked": blocked,
+            "flushes": flushes,
+            "queueDepth": queue_depth,
+            "offline": offline
+        }
+
+    def flush_offline(self, client):
+        """
+        Publish the results buffered while disconnected, oldest first.
+
+        Stops early, keeping the rest, if the connection drops again.
+
+        Args:
+            client (mqtt.Client): Reconnected client
+
+        Returns:
+            int: Results published
+        """
+        flushed = 0
+        while True:
+            with self._offline_lock:
+                if not self._offline:
+                    break
+                topic, payload = self._offline.popleft()
+            info = client.publish(topic, payload, qos=self.qos)
+            if getattr(info, "rc", None) == mqtt.MQTT_ERR_NO_CONN:
+                with self._offline_lock:
+                    if len(self._offline) < self.offline_buffer_size:
+                        self._offline.appendleft((topic, payload))
+                    else:
+                        self._offline_dropped += 1
+                break
+            flushed += 1
+        if flushed:
+            with self._offline_lock:
+                self._offline_flushed += flushed
+            with self._stats_lock:
+                self._published += flushed
+        return flushed
+
+    def _send(self, client, topic, payload):
+        info = client.publish(topic, payload, qos=self.qos)
+        rc = getattr(info, "rc", None)
+        if rc == mqtt.MQTT_ERR_QUEUE_SIZE:
+            with self._stats_lock:
+                self._rejected_by_client += 1
+            self.logger.warning(f"MQTT outgoing queue full, result on {topic} not published")
+            return False
+        if rc == mqtt.MQTT_ERR_NO_CONN and self.offline_buffer_size and self.qos == 0:
+            with self._offline_lock:
+                if len(self._offline) == self.offline_buffer_size:
+                    self._offline_dropped += 1
+                self._offline.append((topic, payload))
+            return True
+        with self._stats_lock:
+            self._published += 1
+        return True
+
+    def _run(self):
+        """
+        Flusher loop: take a batch off the queue and publish it corked.
+        """
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopping:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                if self.flush_interval > 0 and len(self._queue) < self.batch_size and not self._stopping:
+                    self._condition.wait_for(
+                        lambda: len(self._queue) >= self.batch_size or self._stopping, self.flush_interval
+                    )
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._condition.notify_all()  # Room for blocked producers
+            self._flush(batch)
+
+    def _flush(self, batch):
+        sock = self._set_cork(True)
+        try:
+            for client, topic, payload in batch:
+                self._send(client, topic, payload)
+        finally:
+            if sock is not None:
+                self._set_cork(False, sock)
+        with self._stats_lock:
+            self._flushes += 1
+
+    def _set_cork(self, corked, sock=None):
+        """
+        Cork or uncork the client socket; uncorking sends whatever was held back.
+
+        Returns:
+            socket.socket or None: The socket that was changed
+        """
+        if not self.cork:
+            return None
+        sock = sock or self.client.socket()
+        if not isinstance(sock, socket.socket):
+            return None
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, _TCP_CORK, 1 if corked else 0)
+        except OSError:
+            return None
+        return sock
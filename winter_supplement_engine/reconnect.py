@@ -0,0 +1,156 @@
+import random
+import threading
+import time
+
+from .metrics import Histogram
+
+# Reconnect time histogram bucket upper bounds in seconds, from a quick retry up to a long outage
+RECONNECT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+class ExponentialBackoff:
+    """
+    Delays between connection attempts, growing exponentially up to a cap.
+
+    With jitter each delay is drawn uniformly between 0 and the exponential
+    delay ("full jitter"), so engines dropped by the same broker restart do
+    not all reconnect at the same moment.
+    """
+
+    def __init__(self, initial, maximum, multiplier=2.0, jitter=True, rng=random.random):
+        """
+        Args:
+            initial (float): Delay before the first retry, in seconds
+            maximum (float): Longest delay, in seconds
+            multiplier (float): Growth factor per attempt
+            jitter (bool): Randomize each delay between 0 and its exponential value
+            rng (callable): Returns a float in [0, 1)
+
+        Raises:
+            ValueError: If a delay is negative, maximum is below initial or multiplier is below 1
+        """
+        if initial < 0 or maximum < initial or multiplier < 1:
+            raise ValueError("Delays must not be negative, maximum must be at least initial and multiplier at least 1")
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self._rng = rng
+        self.attempts = 0
+
+    def next_delay(self):
+        """
+        Delay before the next attempt.
+
+        Returns:
+            float: Seconds to wait
+        """
+        delay = min(self.maximum, self.initial * self.multiplier ** min(self.attempts, 64))
+        self.attempts += 1
+        return delay * self._rng() if self.jitter else delay
+
+    def reset(self):
+        """
+        Start again from the initial delay, once a connection is accepted.
+        """
+        self.attempts = 0
+
+
+class ConnectionMonitor:
+    """
+    Tracks broker connections, losses and the time taken to reconnect.
+
+    Thread-safe: connects and disconnects are reported from paho callbacks,
+    failed attempts from the retry loop.
+    """
+
+    def __init__(self, buckets=RECONNECT_BUCKETS, clock=time.monotonic):
+        """
+        Args:
+            buckets (tuple): Reconnect time histogram bucket upper bounds in seconds
+            clock (callable): Monotonic clock in seconds
+        """
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._reconnect_seconds = Histogram(buckets)
+        self.connected = False
+        self.lost = False  # Whether the last connection was lost or refused, and should be retried
+        self._lost_at = None
+        self._connects = 0
+        self._disconnects = 0
+        self._failed_attempts = 0
+        self._last_reconnect_seconds = None
+
+    def record_connect(self):
+        """
+        Record a successful connection; after a lost connection this completes a reconnect.
+        """
+        with self._lock:
+            if self.connected:
+                return
+            if self._lost_at is not None:
+                self._last_reconnect_seconds = self._clock() - self._lost_at
+                self._reconnect_seconds.observe(self._last_reconnect_seconds)
+                self._lost_at = None
+            self.connected = True
+            self.lost = False
+            self._connects += 1
+
+    def record_disconnect(self, expected):
+        """
+        Record the end of a connection. Repeated reports of the same disconnect are ignored.
+
+        Args:
+            expected (bool): True when the client asked to disconnect
+        """
+        with self._lock:
+            if not self.connected:
+                return
+            self.connected = False
+            self.lost = not expected
+            if self.lost:
+                self._disconnects += 1
+                self._lost_at = self._clock()
+
+    def record_failed_attempt(self):
+        """
+        Record a failed connection attempt.
+        """
+        with self._lock:
+            self._failed_attempts += 1
+
+    def record_refused(self):
+        """
+        Record a connection the broker refused; like a lost connection, it should be retried.
+        """
+        with self._lock:
+            self._failed_attempts += 1
+            self.lost = True
+
+    def reconnect_histogram(self):
+        """
+        Returns:
+            Histogram: Copy of the reconnect time histogram
+        """
+        with self._lock:
+            return self._reconnect_seconds.copy()
+
+    def stats(self):
+        """
+        Snapshot of the connection counters.
+
+        Returns:
+            dict: Connection state, connects, lost connections, reconnects, failed attempts and reconnect times
+        """
+        with self._lock:
+            histogram = self._reconnect_seconds
+            return {
+                "connected": self.connected,
+                "connects": self._connects,
+                "disconnects": self._disconnects,
+                "reconnects": histogram.count,
+                "failedAttempts": self._failed_attempts,
+                "lastReconnectSeconds": self._last_reconnect_seconds,
+                "totalReconnectSeconds": histogram.sum,
+                "downSeconds": self._clock() - self._lost_at if self._lost_at is not None else 0.0
+            }
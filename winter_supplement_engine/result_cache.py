@@ -0,0 +1,325 @@
+import json
+import threading
+from collections import OrderedDict
+
+from . import schemas
+from .calculator import WinterSupplementCalculator
+from .schemas import INPUT_SCHEMA, validate_output
+
+_ID_PLACEHOLDER = "__result_cache_id__"
+
+# Request fields results are cached by; rules reading any other field bypass the cache and table
+KEY_FIELDS = frozenset(("familyUnitInPayForDecember", "familyComposition", "numberOfChildren"))
+
+
+def _json_dumps_bytes(data):
+    return json.dumps(data).encode()
+
+
+def _payload_parts(result, dumps):
+    """
+    Split a result into the fields shared by every id and the payload bytes around the ``id`` value.
+
+    Returns:
+        tuple: (result fields without id, payload head, payload tail)
+    """
+    template = {field: value for field, value in result.items() if field != "id"}
+    placeholder = dumps(_ID_PLACEHOLDER)
+    head, tail = dumps({"id": _ID_PLACEHOLDER, **template}).split(placeholder, 1)
+    return template, head, tail
+
+
+def _rules_identity(rules):
+    """
+    Version and definition fingerprint of compiled rules, None without rules.
+    """
+    if rules is None:
+        return None
+    return rules.version, rules.fingerprint
+
+
+def _cacheable(rules):
+    """
+    Whether results under these rules depend only on the ``KEY_FIELDS``.
+    """
+    return rules is None or getattr(rules, "input_fields", KEY_FIELDS) <= KEY_FIELDS
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of calculation results and their serialized payloads.
+
+    A result depends only on ``familyComposition``, ``numberOfChildren`` and
+    ``familyUnitInPayForDecember``; ``id`` is substituted per request. Cached
+    payloads are stored as the bytes around the ``id`` value, so a hit skips
+    calculation, output validation and serialization. The cache empties itself
+    when the calculator's ``SUPPLEMENT_RATES`` change or rules with another
+    identity, version or definition are installed. Rules reading other request
+    fields are not cached.
+    """
+
+    def __init__(self, maxsize=1024, calculator=WinterSupplementCalculator, dumps=_json_dumps_bytes):
+        """
+        Args:
+            maxsize (int): Maximum number of cached entries
+            calculator (type): Calculator whose SUPPLEMENT_RATES the results depend on
+            dumps (callable): Serializer returning bytes, used for cached payloads
+
+        Raises:
+            ValueError: If maxsize is not positive
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.calculator = calculator
+        self._dumps = dumps
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._rates = dict(calculator.SUPPLEMENT_RATES)
+        self._rules = getattr(calculator, "rules", None)
+        self._rules_identity = _rules_identity(self._rules)
+        self._cacheable = _cacheable(self._rules)
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def key(input_data):
+        """
+        Cache key made of the calculation-relevant input fields.
+
+        Every field is part of the key whatever its value, since the rules decide
+        which inputs are eligible. Accepts input dicts or ``SupplementRequest`` records.
+        """
+        if not isinstance(input_data, dict):
+            return (input_data.familyUnitInPayForDecember, input_data.familyComposition, input_data.numberOfChildren)
+        return (input_data['familyUnitInPayForDecember'], input_data['familyComposition'],
+                input_data['numberOfChildren'])
+
+    def get(self, input_data):
+        """
+        Look up a cached result for validated input data.
+
+        Args:
+            input_data (dict or SupplementRequest): Validated calculation input
+
+        Returns:
+            tuple or None: (result dict, serialized payload bytes) on a hit, None on a miss
+        """
+        key = self.key(input_data)
+        with self._lock:
+            self._check_rates()
+            if not self._cacheable:
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+
+        template, head, tail = entry
+        result_id = input_data['id'] if isinstance(input_data, dict) else input_data.id
+        return {"id": result_id, **template}, head + self._dumps(result_id) + tail
+
+    def put(self, input_data, result, rules=None):
+        """
+        Store a validated result and return its serialized payload.
+
+        Args:
+            input_data (dict or SupplementRequest): Validated calculation input
+            result (dict): Validated calculation result for that input
+            rules (CompiledRules): Rules the result was calculated with; the result is
+                not stored if other rules have been installed since
+
+        Returns:
+            bytes: Serialized result
+        """
+        template, head, tail = _payload_parts(result, self._dumps)
+
+        key = self.key(input_data)
+        with self._lock:
+            self._check_rates()
+            if self._cacheable and (rules is None or rules is self._rules):
+                self._entries[key] = (template, head, tail)
+                self._entries.move_to_end(key)
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+
+        return head + self._dumps(result['id']) + tail
+
+    def clear(self):
+        """
+        Drop all cached entries.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Snapshot of cache counters.
+
+        Returns:
+            dict: Size, hit, miss, eviction and invalidation counts
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations
+            }
+
+    def _check_rates(self):
+        """
+        Empty the cache if the calculator rates or rules changed. Caller holds the lock.
+        """
+        rates = self.calculator.SUPPLEMENT_RATES
+        rules = getattr(self.calculator, "rules", None)
+        if rates != self._rates or rules is not self._rules or _rules_identity(rules) != self._rules_identity:
+            self._entries.clear()
+            self._rates = dict(rates)
+            self._rules = rules
+            self._rules_identity = _rules_identity(rules)
+            self._cacheable = _cacheable(rules)
+            self._invalidations += 1
+
+
+class ResultTable:
+    """
+    Precomputed results and payloads for the whole input domain up to ``max_children``.
+
+    Family composition, the December flag and a small range of children
+    counts determine every result, so they are enumerated up front and
+    calculated with the installed rules, whatever their eligibility
+    conditions. Each entry is stored at a packed integer key: bit 0 is the
+    December flag, the next bits the composition's code, the remaining bits
+    the number of children. A lookup is one list index with no lock.
+    Requests with more children return None and fall back to calculation.
+
+    The table is rebuilt on the next lookup after the calculator's rules or
+    rates change. Rules reading other request fields leave the table empty.
+    """
+
+    def __init__(self, max_children=10, calculator=WinterSupplementCalculator, dumps=_json_dumps_bytes,
+                 rules_version=False):
+        """
+        Args:
+            max_children (int): Largest number of children with precomputed results
+            calculator (type): Calculator the results come from
+            dumps (callable): Serializer returning bytes, used for payloads
+            rules_version (bool): Add ``rulesVersion`` to each result
+
+        Raises:
+            ValueError: If max_children is negative
+        """
+        if max_children < 0:
+            raise ValueError("max_children must not be negative")
+        self.max_children = max_children
+        self.calculator = calculator
+        self.rules_version = rules_version
+        self._dumps = dumps
+        compositions = INPUT_SCHEMA["properties"]["familyComposition"]["enum"]
+        self._codes = {composition: code for code, composition in enumerate(compositions)}
+        self._shift = max(1, (len(compositions) - 1).bit_length()) + 1
+        self._lock = threading.Lock()
+        self._rebuilds = 0
+        self._state = None
+        self._rebuild()
+
+    def key(self, in_pay, composition, children):
+        """
+        Packed integer key of an input, or None when it is outside the table.
+        """
+        code = self._codes.get(composition)
+        # The schema also accepts integral floats such as 2.0; those miss the table
+        if code is None or type(children) is not int or not 0 <= children <= self.max_children:
+            return None
+        return (children << self._shift) | (code << 1) | (1 if in_pay else 0)
+
+    def get(self, input_data):
+        """
+        Look up the precomputed result for validated input data.
+
+        Args:
+            input_data (dict or SupplementRequest): Validated calculation input
+
+        Returns:
+            tuple or None: (result dict, serialized payload bytes), None outside the table
+        """
+        state = self._state
+        calculator = self.calculator
+        if calculator.rules is not state[0] or calculator.SUPPLEMENT_RATES != state[1]:
+            state = self._rebuild()
+
+        if isinstance(input_data, dict):
+            result_id = input_data['id']
+            key = self.key(input_data['familyUnitInPayForDecember'], input_data['familyComposition'],
+                           input_data['numberOfChildren'])
+        else:
+            result_id = input_data.id
+            key = self.key(input_data.familyUnitInPayForDecember, input_data.familyComposition,
+                           input_data.numberOfChildren)
+        if key is None:
+            return None
+        entry = state[2][key]
+        if entry is None:
+            return None
+        template, head, tail = entry
+        return {"id": result_id, **template}, head + self._dumps(result_id) + tail
+
+    def stats(self):
+        """
+        Snapshot of table counters.
+
+        Returns:
+            dict: Entry count, children range and rebuild count
+        """
+        state = self._state
+        return {
+            "size": sum(entry is not None for entry in state[2]),
+            "maxChildren": self.max_children,
+            "rebuilds": self._rebuilds
+        }
+
+    def _rebuild(self):
+        """
+        Calculate every entry with the current rules and swap the new table in.
+
+        Results that fail output validation are left out so they take the regular path.
+        """
+        with self._lock:
+            calculator = self.calculator
+            rules = calculator.rules
+            rates = dict(calculator.SUPPLEMENT_RATES)
+            state = self._state
+            if state is not None and state[0] is rules and state[1] == rates:
+                return state  # Another thread rebuilt it already
+
+            entries = [None] * ((self.max_children + 1) << self._shift)
+            inputs = [(in_pay, composition, children) for children in range(self.max_children + 1)
+                      for composition in self._codes for in_pay in (False, True)]
+            if not _cacheable(rules):
+                inputs = []
+            for in_pay, composition, children in inputs:
+                result = dict(calculator.calculate_supplement({
+                    "id": "",
+                    "numberOfChildren": children,
+                    "familyComposition": composition,
+                    "familyUnitInPayForDecember": in_pay
+                }, rules=rules))
+                if self.rules_version:
+                    result["rulesVersion"] = rules.version
+                try:
+                    validate_output(result)
+                except schemas.ValidationError:
+                    continue
+                entries[self.key(in_pay, composition, children)] = _payload_parts(result, self._dumps)
+
+            self._state = (rules, rates, entries)
+            self._rebuilds += 1
+            return self._state
@@ -0,0 +1,393 @@
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+from .config import RESULT_STORE_PATH
+
+_COLUMNS = "id, topic, rules_version, recorded_at, result"
+
+
+class ResultStore:
+    """
+    Append-only SQLite log of published results, for audits and replays.
+
+    Each result is stored with its request id, output topic, the rules
+    version that produced it and the time it was recorded. Rows are indexed
+    on id for point lookups and on record time for range scans.
+
+    ``record`` never touches the database on the publish path once the
+    writer thread is started: results are queued and the writer inserts them
+    in batches of up to ``batch_size``, waiting up to ``flush_interval``
+    seconds for a batch to fill. When ``queue_size`` results are already
+    waiting, new ones are dropped and counted rather than slowing down
+    message processing. Before ``start`` (or after ``stop``) results are
+    written immediately.
+
+    A store opened ``read_only`` only runs queries: the file must already
+    exist and is neither switched to WAL mode nor given a schema.
+    """
+
+    def __init__(self, path, batch_size=500, flush_interval=1.0, queue_size=100000, clock=time.time,
+                 read_only=False):
+        """
+        Args:
+            path (str): SQLite file, created if it does not exist
+            batch_size (int): Maximum results per write transaction
+            flush_interval (float): Seconds to wait for a batch to fill before writing it
+            queue_size (int): Maximum results waiting to be written
+            clock (callable): Time source in seconds, injectable for tests
+            read_only (bool): Open an existing file for queries only
+
+        Raises:
+            ValueError: If batch_size or queue_size is not positive, or flush_interval is negative
+            sqlite3.Error: If the file cannot be opened
+        """
+        if batch_size < 1 or queue_size < 1 or flush_interval < 0:
+            raise ValueError("batch_size and queue_size must be positive, flush_interval not negative")
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self._clock = clock
+
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._writing = 0  # Results taken off the queue but not yet committed
+        self._stopping = False
+        self._flushing = 0  # flush() calls waiting, which make the writer skip the flush interval
+        self._thread = None
+        self._written = 0
+        self._dropped = 0
+        self._failed = 0
+        self._batches = 0
+
+        # One connection, shared by the writer thread and queries under a lock; other
+        # processes (supervisor workers, the query CLI) open the file concurrently in WAL mode
+        self._db_lock = threading.Lock()
+        if read_only:
+            self._db = sqlite3.connect(f"{Path(path).absolute().as_uri()}?mode=ro", uri=True, timeout=30,
+                                       check_same_thread=False, isolation_level=None)
+            return
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "seq INTEGER PRIMARY KEY, id TEXT NOT NULL, topic TEXT NOT NULL, rules_version TEXT, "
+            "recorded_at REAL NOT NULL, result TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_id ON results (id, recorded_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_recorded_at ON results (recorded_at)")
+
+    def start(self):
+        """
+        Start the background writer thread.
+        """
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="result-store", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Write the queued results and stop the writer thread.
+        """
+        if self._thread is None:
+            return
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self._thread.join()
+        self._thread = None
+
+    def close(self):
+        """
+        Stop the writer and close the database.
+        """
+        self.stop()
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def record(self, request_id, topic, result, rules_version=None):
+        """
+        Store a published result.
+
+        Args:
+            request_id (str): Request id the result answers
+            topic (str): Topic the result was published on
+            result (bytes): Published result payload, stored as published
+            rules_version (str): Version of the rules that produced the result
+
+        Returns:
+            bool: False if the queue was full and the result was dropped
+
+        Raises:
+            TypeError: If result is not bytes
+        """
+        if not isinstance(result, bytes):
+            raise TypeError(f"result must be the published payload bytes, not {type(result).__name__}")
+        row = (request_id, topic, rules_version, self._clock(), result)
+        if self._thread is None:
+            self._write([row])
+            return True
+        with self._condition:
+            if len(self._queue) >= self.queue_size:
+                self._dropped += 1
+                return False
+            self._queue.append(row)
+            # Wake the writer for the first queued result and once a batch is full
+            if len(self._queue) == 1 or len(self._queue) >= self.batch_size:
+                self._condition.notify_all()
+        return True
+
+    def flush(self, timeout=None):
+        """
+        Wait until every queued result has been written.
+
+        Args:
+            timeout (float): Longest wait in seconds; None waits indefinitely
+
+        Returns:
+            bool: False if results were still waiting when the timeout expired
+        """
+        with self._condition:
+            self._flushing += 1
+            self._condition.notify_all()
+            try:
+                return self._condition.wait_for(lambda: not self._queue and not self._writing, timeout)
+            finally:
+                self._flushing -= 1
+
+    def lookup(self, request_id, limit=None):
+        """
+        Results stored for a request id, most recent first.
+
+        Args:
+            request_id (str): Request id
+            limit (int): Maximum results; None returns all of them
+
+        Returns:
+            list: Result records, see ``_to_record``
+        """
+        sql = f"SELECT {_COLUMNS} FROM results WHERE id = ? ORDER BY recorded_at DESC, seq DESC"
+        params = [request_id]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._query(sql, params)
+
+    def scan(self, since=None, until=None, id_from=None, id_to=None, rules_version=None, limit=1000):
+        """
+        Results in a time and/or id range.
+
+        Results come in record order, or in id order when an id bound is given.
+
+        Args:
+            since (float): Earliest record time, inclusive, in seconds since the epoch
+            until (float): Latest record time, exclusive, in seconds since the epoch
+            id_from (str): Smallest request id, inclusive
+            id_to (str): Largest request id, inclusive
+            rules_version (str): Only results from this rules version
+            limit (int): Maximum results; None returns all of them
+
+        Returns:
+            list: Result records, see ``_to_record``
+        """
+        conditions, params = [], []
+        for condition, value in (("recorded_at >= ?", since), ("recorded_at < ?", until), ("id >= ?", id_from),
+                                 ("id <= ?", id_to), ("rules_version = ?", rules_version)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        sql = f"SELECT {_COLUMNS} FROM results"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if id_from is not None or id_to is not None:
+            sql += " ORDER BY id, recorded_at, seq"
+        else:
+            sql += " ORDER BY recorded_at, seq"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._query(sql, params)
+
+    def stats(self):
+        """
+        Snapshot of writer counters.
+
+        Returns:
+            dict: Queue depth, written, dropped and failed results, and write batches
+        """
+        with self._condition:
+            return {
+                "queueDepth": len(self._queue) + self._writing,
+                "written": self._written,
+                "dropped": self._dropped,
+                "failed": self._failed,
+                "batches": self._batches
+            }
+
+    def _query(self, sql, params):
+        with self._db_lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [self._to_record(row) for row in rows]
+
+    @staticmethod
+    def _to_record(row):
+        """
+        Returns:
+            dict: id, topic, rulesVersion, recordedAt (seconds since the epoch) and the decoded result
+        """
+        request_id, topic, rules_version, recorded_at, result = row
+        return {"id": request_id, "topic": topic, "rulesVersion": rules_version, "recordedAt": recorded_at,
+                "result": json.loads(result)}
+
+    def _run(self):
+        """
+        Writer loop: take a batch off the queue and insert it in one transaction.
+        """
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopping:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                if self.flush_interval > 0 and len(self._queue) < self.batch_size and not self._stopping:
+                    self._condition.wait_for(
+                        lambda: len(self._queue) >= self.batch_size or self._stopping or self._flushing,
+                        self.flush_interval
+                    )
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._writing = len(batch)
+            try:
+                self._write(batch)
+            finally:
+                with self._condition:
+                    self._writing = 0
+                    self._condition.notify_all()  # Wake flush()
+
+    def _write(self, batch):
+        rows = [(request_id, topic, rules_version, recorded_at, result.decode())
+                for request_id, topic, rules_version, recorded_at, result in batch]
+        try:
+            with self._db_lock:
+                self._db.execute("BEGIN")
+                try:
+                    self._db.executemany(f"INSERT INTO results ({_COLUMNS}) VALUES (?, ?, ?, ?, ?)", rows)
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            self.logger.error(f"Could not store {len(rows)} results: {e}")
+            with self._condition:
+                self._failed += len(rows)
+            return
+        with self._condition:
+            self._written += len(rows)
+            self._batches += 1
+
+
+def parse_time(value):
+    """
+    Parse a time given as seconds since the epoch or an ISO 8601 timestamp.
+
+    Args:
+        value (str): Time to parse; timestamps without a UTC offset are local time
+
+    Returns:
+        float: Seconds since the epoch
+
+    Raises:
+        argparse.ArgumentTypeError: If the value is neither
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Not a timestamp or seconds since the epoch: {value}")
+
+
+def add_arguments(parser):
+    """
+    Add the result store query options to an argument parser.
+
+    Args:
+        parser (argparse.ArgumentParser): Parser for the ``results`` command
+    """
+    parser.add_argument("--store", default=RESULT_STORE_PATH or None,
+                        help="Result store SQLite file (default: RESULT_STORE_PATH)")
+    queries = parser.add_subparsers(dest="query", required=True)
+    lookup = queries.add_parser("lookup", help="Results stored for a request id, most recent first")
+    lookup.add_argument("id", help="Request id")
+    lookup.add_argument("--limit", type=int, help="Maximum results (default: all)")
+    scan = queries.add_parser("scan", help="Results in a time and/or id range")
+    scan.add_argument("--since", type=parse_time, help="Earliest record time, ISO 8601 or seconds since the epoch")
+    scan.add_argument("--until", type=parse_time, help="Latest record time (exclusive)")
+    scan.add_argument("--from-id", dest="id_from", help="Smallest request id (inclusive)")
+    scan.add_argument("--to-id", dest="id_to", help="Largest request id (inclusive)")
+    scan.add_argument("--rules-version", help="Only results from this rules version")
+    scan.add_argument("--limit", type=int, default=1000, help="Maximum results (default: 1000)")
+
+
+def run_from_args(args, output=None):
+    """
+    Run a result store query and write the records as NDJSON.
+
+    Args:
+        args (argparse.Namespace): Parsed ``results`` command arguments
+        output (file): Destination, defaults to stdout
+
+    Returns:
+        int: Records written
+
+    Raises:
+        ValueError: If no store file is given, it does not exist or it cannot be read
+    """
+    if not args.store:
+        raise ValueError("No result store: pass --store or set RESULT_STORE_PATH")
+    if not os.path.exists(args.store):
+        raise ValueError(f"No result store at {args.store}")
+    output = output or sys.stdout
+    try:
+        store = ResultStore(args.store, read_only=True)
+        try:
+            if args.query == "lookup":
+                records = store.lookup(args.id, limit=args.limit)
+            else:
+                records = store.scan(since=args.since, until=args.until, id_from=args.id_from, id_to=args.id_to,
+                                     rules_version=args.rules_version, limit=args.limit)
+        finally:
+            store.close()
+    except sqlite3.Error as e:
+        raise ValueError(f"Could not read the result store at {args.store}: {e}")
+    for record in records:
+        output.write(json.dumps(record) + "\n")
+    return len(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the stored results of the Winter Supplement Rules Engine")
+    add_arguments(parser)
+    try:
+        return run_from_args(parser.parse_args(argv))
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+import hashlib
+import json
+import keyword
+import logging
+import os
+import threading
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), "winter_supplement_rules.json")
+
+CONDITION_OPERATORS = ("equals", "in", "min", "max")
+
+
+class CompiledRules:
+    """
+    A rules definition compiled into generated Python functions.
+
+    A definition names its rates, the conditions a request must meet to be
+    eligible, and the amounts paid to eligible requests::
+
+        {
+          "name": "winter-supplement",
+          "version": "2024.1",
+          "rates": {"single": 60.0, "couple": 120.0, "child_rate": 20.0},
+          "eligibility": [{"field": "familyUnitInPayForDecember", "equals": true}],
+          "amounts": {
+            "baseAmount": {"lookup": "familyComposition", "default": 0.0},
+            "childrenAmount": {"field": "numberOfChildren", "times": "child_rate"}
+          },
+          "total": "supplementAmount"
+        }
+
+    Conditions compare a field with ``equals``, ``in``, ``min`` or ``max``; all
+    of them must hold. An amount is a rate looked up by a field's value
+    (``lookup``), a field multiplied by a named rate (``field``/``times``) or a
+    fixed rate (``rate``). Results hold ``id``, ``isEligible``, each amount and
+    the ``total`` of the amounts; ineligible requests get zero amounts.
+
+    The definition is compiled once into straight-line functions, so a
+    calculation costs the same as hand-written code. Rates stay in the
+    ``rates`` dict the functions read from, and edits to it apply immediately.
+    """
+
+    def __init__(self, definition, result_type=None):
+        """
+        Args:
+            definition (dict): Rules definition
+            result_type (type): Optional record type built positionally from the result
+                fields; enables ``calculate_record``
+
+        Raises:
+            ValueError: If the definition is invalid
+        """
+        _check_definition(definition)
+        self.definition = definition
+        self.name = definition.get("name", "rules")
+        self.version = str(definition["version"])
+        self.fingerprint = hashlib.sha256(
+            json.dumps(definition, sort_keys=True, separators=(",", ":")).encode()
+        ).hexdigest()[:12]
+        self.rates = {name: float(value) for name, value in definition["rates"].items()}
+        self.result_fields = ("id", "isEligible", *definition["amounts"], definition["total"])
+        self.input_fields = _input_fields(definition)
+        self.result_type = result_type
+
+        self.source = _generate_source(definition, record=False)
+        self.calculate = self._compile(self.source, "calculate")
+        self.record_source = None
+        self.calculate_record = None
+        if result_type is not None:
+            self.record_source = _generate_source(definition, record=True)
+            self.calculate_record = self._compile(self.record_source, "calculate_record")
+
+    def info(self):
+        """
+        Identity of the compiled rules.
+
+        Returns:
+            dict: Name, version and a fingerprint of the definition
+        """
+        return {"name": self.name, "version": self.version, "fingerprint": self.fingerprint}
+
+    def _compile(self, source, name):
+        namespace = {
+            "_rates": self.rates,
+            "_rate": self.rates.get,
+            "_result": self.result_type,
+            **{f"_values{index}": values for index, values in enumerate(_in_values(self.definition))}
+        }
+        exec(compile(source, f"<rules {self.name} {self.version}>", "exec"), namespace)
+        return namespace[name]
+
+    def __repr__(self):
+        return f"CompiledRules(name={self.name!r}, version={self.version!r}, fingerprint={self.fingerprint!r})"
+
+
+def load_rules(path=DEFAULT_RULES_PATH, result_type=None):
+    """
+    Load and compile a rules definition file.
+
+    Args:
+        path (str): JSON file, or YAML file (``.yaml``/``.yml``) when PyYAML is installed
+        result_type (type): Optional record type passed to ``CompiledRules``
+
+    Returns:
+        CompiledRules: Compiled rules
+
+    Raises:
+        ValueError: If the file format is unsupported or the definition is invalid
+        OSError: If the file cannot be read
+    """
+    with open(path, encoding="utf-8") as rules_file:
+        if path.endswith((".yaml", ".yml")):
+            # Imported here: PyYAML is optional and slow to import, and most deployments use JSON
+            try:
+                import yaml
+            except ImportError:  # pragma: no cover - PyYAML is an optional dependency
+                raise ValueError("YAML rules definitions require PyYAML to be installed")
+            definition = yaml.safe_load(rules_file)
+        else:
+            definition = json.load(rules_file)
+    return CompiledRules(definition, result_type)
+
+
+class RulesWatcher:
+    """
+    Polls a rules file and reports when its modification time or size changes.
+    """
+
+    def __init__(self, path, on_change, interval=1.0):
+        """
+        Args:
+            path (str): Rules definition file to watch
+            on_change (callable): Called with the path from the watcher thread after each change
+            interval (float): Seconds between checks
+
+        Raises:
+            ValueError: If interval is not positive
+        """
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self._missing = False
+        self._signature = self._stat()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="rules-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def check(self):
+        """
+        Compare the file with the last check, calling ``on_change`` if it changed.
+
+        Returns:
+            bool: True if the file changed
+        """
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+        self.on_change(self.path)
+        return True
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError as e:
+            if not self._missing:
+                self.logger.warning(f"Cannot read rules file {self.path}: {e}")
+            self._missing = True
+            return None
+        self._missing = False
+        return stat.st_mtime_ns, stat.st_size
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                self.logger.error(f"Rules reload failed: {e}")
+
+
+def _check_definition(definition):
+    """
+    Reject definitions the compiler cannot turn into safe code.
+    """
+    if not isinstance(definition, dict):
+        raise ValueError("A rules definition must be an object")
+    for key in ("version", "rates", "amounts", "total"):
+        if key not in definition:
+            raise ValueError(f"Rules definition is missing '{key}'")
+
+    rates = definition["rates"]
+    if not isinstance(rates, dict) or not all(_is_number(value) for value in rates.values()):
+        raise ValueError("Rules 'rates' must map names to numbers")
+
+    eligibility = definition.get("eligibility", [])
+    if not isinstance(eligibility, list):
+        raise ValueError("Rules 'eligibility' must be a list of conditions")
+    for condition in eligibility:
+        if not isinstance(condition, dict):
+            raise ValueError(f"Eligibility condition must be an object: {condition!r}")
+        _check_field(condition.get("field"))
+        operators = [operator for operator in CONDITION_OPERATORS if operator in condition]
+        if len(operators) != 1:
+            raise ValueError(f"Eligibility condition needs exactly one of {CONDITION_OPERATORS}: {condition}")
+        operator = operators[0]
+        operand = condition[operator]
+        if operator == "in":
+            if not isinstance(operand, list) or not all(_is_scalar(value) for value in operand):
+                raise ValueError(f"Condition 'in' takes a list of strings, numbers or booleans: {condition}")
+        elif operator == "equals":
+            if not _is_scalar(operand):
+                raise ValueError(f"Condition 'equals' takes a string, number or boolean: {condition}")
+        elif not _is_number(operand):
+            raise ValueError(f"Condition '{operator}' takes a number: {condition}")
+
+    amounts = definition["amounts"]
+    if not isinstance(amounts, dict) or not amounts:
+        raise ValueError("Rules 'amounts' must name at least one amount")
+    for name, amount in amounts.items():
+        _check_field(name)
+        if not isinstance(amount, dict):
+            raise ValueError(f"Amount '{name}' must be an object")
+        if "lookup" in amount:
+            _check_field(amount["lookup"])
+            if not _is_number(amount.get("default", 0.0)):
+                raise ValueError(f"Amount '{name}' default must be a number")
+        elif "field" in amount:
+            _check_field(amount["field"])
+            _check_rate(rates, amount.get("times"))
+        elif "rate" in amount:
+            _check_rate(rates, amount["rate"])
+        else:
+            raise ValueError(f"Amount '{name}' needs 'lookup', 'field' or 'rate'")
+
+    _check_field(definition["total"])
+    fields = ["id", "isEligible", *amounts, definition["total"]]
+    if len(set(fields)) != len(fields):
+        raise ValueError("Result field names must be unique")
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_scalar(value):
+    return isinstance(value, (str, int, float, bool))
+
+
+def _check_field(name):
+    if not isinstance(name, str) or not name.isidentifier() or keyword.iskeyword(name):
+        raise ValueError(f"Invalid field name: {name!r}")
+
+
+def _check_rate(rates, name):
+    if name not in rates:
+        raise ValueError(f"Unknown rate: {name!r}")
+
+
+def _input_fields(definition):
+    """
+    Request fields the calculation reads, other than ``id``.
+    """
+    fields = {condition["field"] for condition in definition.get("eligibility", [])}
+    for amount in definition["amounts"].values():
+        if "lookup" in amount:
+            fields.add(amount["lookup"])
+        elif "field" in amount:
+            fields.add(amount["field"])
+    return frozenset(fields)
+
+
+def _in_values(definition):
+    return [tuple(condition["in"]) for condition in definition.get("eligibility", []) if "in" in condition]
+
+
+def _generate_source(definition, record):
+    """
+    Generate the source of a calculation function for a checked definition.
+
+    Args:
+        definition (dict): Checked rules definition
+        record (bool): Read attributes and build ``_result`` records instead of dicts
+
+    Returns:
+        str: Python source defining ``calculate`` or ``calculate_record``
+    """
+    def read(field):
+        return f"data.{field}" if record else f"data[{field!r}]"
+
+    tests = []
+    in_index = 0
+    for condition in definition.get("eligibility", []):
+        value = read(condition["field"])
+        if "equals" in condition:
+            expected = condition["equals"]
+            if expected is True:
+                tests.append(value)
+            elif expected is False:
+                tests.append(f"not {value}")
+            else:
+                tests.append(f"{value} == {expected!r}")
+        elif "in" in condition:
+            tests.append(f"{value} in _values{in_index}")
+            in_index += 1
+        elif "min" in condition:
+            tests.append(f"{value} >= {condition['min']!r}")
+        else:
+            tests.append(f"{value} <= {condition['max']!r}")
+
+    names = list(definition["amounts"])
+    lines = [f"def {'calculate_record' if record else 'calculate'}(data):"]
+    if tests:
+        lines.append(f"    if not ({' and '.join(tests)}):")
+        lines.append(f"        return {_build_result(definition, read, record, eligible=False)}")
+    for index, name in enumerate(names):
+        amount = definition["amounts"][name]
+        if "lookup" in amount:
+            expression = f"_rate({read(amount['lookup'])}, {float(amount.get('default', 0.0))!r})"
+        elif "field" in amount:
+            expression = f"{read(amount['field'])} * _rates[{amount['times']!r}]"
+        else:
+            expression = f"_rates[{amount['rate']!r}]"
+        lines.append(f"    _amount{index} = {expression}")
+    lines.append(f"    return {_build_result(definition, read, record, eligible=True)}")
+    return "\n".join(lines) + "\n"
+
+
+def _build_result(definition, read, record, eligible):
+    amounts = [f"_amount{index}" if eligible else "0.0" for index in range(len(definition["amounts"]))]
+    total = " + ".join(amounts) if eligible else "0.0"
+    values = [read("id"), repr(eligible), *amounts, total]
+    if record:
+        return f"_result({', '.join(values)})"
+    fields = ["id", "isEligible", *definition["amounts"], definition["total"]]
+    return "{" + ", ".join(f"{field!r}: {value}" for field, value in zip(fields, values)) + "}"
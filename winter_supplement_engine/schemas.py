@@ -1,4 +1,7 @@
-from jsonschema import validate
+import threading
+
+# jsonschema is imported when the first validator is built, not with this module: it is the
+# largest import of the engine, and the validators are built after connecting (see warm_up)
 
 # Input data schema for validation
 INPUT_SCHEMA = {
@@ -41,6 +44,334 @@ OUTPUT_SCHEMA = {
     ]
 }
 
+# Batch request envelope: many input records under one message. Items are
+# validated one by one against INPUT_SCHEMA so each can fail on its own.
+BATCH_INPUT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "batchId": {"type": "string"},
+        "items": {"type": "array"}
+    },
+    "required": [
+        "batchId",
+        "items"
+    ]
+}
+
+# Per-item error reported in batch output
+ERROR_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "code": {"type": "string"},
+        "message": {"type": "string"}
+    },
+    "required": [
+        "code",
+        "message"
+    ]
+}
+
+# Error result published in reply to a rejected request, when error results are enabled
+ERROR_RESULT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "id": {"type": "string"},
+        "error": ERROR_SCHEMA
+    },
+    "required": [
+        "error"
+    ]
+}
+
+# Batch response: one entry per input item, in input order, holding either a
+# result or an error
+BATCH_OUTPUT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "batchId": {"type": "string"},
+        "results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "index": {"type": "integer", "minimum": 0},
+                    "result": OUTPUT_SCHEMA,
+                    "error": ERROR_SCHEMA
+                },
+                "required": ["index"]
+            }
+        }
+    },
+    "required": [
+        "batchId",
+        "results"
+    ]
+}
+
+# Exact Python types accepted by the fast path for each JSON Schema type.
+# Subclasses (and bool masquerading as int) are deliberately excluded so that
+# anything unusual is handed to the full validator.
+_FAST_PATH_TYPES = {
+    "object": ("dict",),
+    "string": ("str",),
+    "integer": ("int",),
+    "number": ("int", "float"),
+    "boolean": ("bool",),
+    "array": ("list",),
+    "null": ("type(None)",),
+}
+
+# Keywords that carry no validation semantics and can be ignored when compiling.
+_ANNOTATION_KEYWORDS = {"title", "description", "$comment", "default", "examples"}
+
+
+class _UnsupportedSchema(Exception):
+    """
+    Raised when a schema uses a keyword the fast-path compiler does not handle.
+    """
+
+
+def _compile_value_check(schema, var, lines, indent):
+    """
+    Emit source lines that return False when ``var`` may not match ``schema``.
+
+    Args:
+        schema (dict): Sub-schema to compile
+        var (str): Name of the variable holding the instance
+        lines (list): Source lines being built
+        indent (str): Current indentation
+    """
+    unsupported = set(schema) - _ANNOTATION_KEYWORDS - {"type", "enum", "minimum", "properties", "required", "items"}
+    if unsupported:
+        raise _UnsupportedSchema(f"Unsupported keywords: {sorted(unsupported)}")
+
+    if "type" in schema:
+        if schema["type"] not in _FAST_PATH_TYPES:
+            raise _UnsupportedSchema(f"Unsupported type: {schema['type']!r}")
+        types = ", ".join(_FAST_PATH_TYPES[schema["type"]])
+        lines.append(f"{indent}if type({var}) not in ({types},):")
+        lines.append(f"{indent}    return False")
+
+    if "enum" in schema:
+        # Only string enums are compiled: equality between strings has none of
+        # the bool/int/float subtleties that jsonschema's enum comparison handles.
+        if not all(isinstance(member, str) for member in schema["enum"]):
+            raise _UnsupportedSchema("Only string enums are supported")
+        lines.append(f"{indent}if type({var}) is not str or {var} not in {tuple(schema['enum'])!r}:")
+        lines.append(f"{indent}    return False")
+
+    if "minimum" in schema:
+        if schema.get("type") not in ("integer", "number"):
+            raise _UnsupportedSchema("minimum requires a numeric type")
+        lines.append(f"{indent}if not {var} >= {schema['minimum']!r}:")
+        lines.append(f"{indent}    return False")
+
+    if "properties" in schema or "required" in schema:
+        if schema.get("type") != "object":
+            raise _UnsupportedSchema("properties/required require type 'object'")
+        for key in schema.get("required", []):
+            lines.append(f"{indent}if {key!r} not in {var}:")
+            lines.append(f"{indent}    return False")
+        for index, (key, sub_schema) in enumerate(schema.get("properties", {}).items()):
+            child = f"{var}_{index}"
+            lines.append(f"{indent}{child} = {var}.get({key!r}, _MISSING)")
+            lines.append(f"{indent}if {child} is not _MISSING:")
+            body_start = len(lines)
+            _compile_value_check(sub_schema, child, lines, indent + "    ")
+            if len(lines) == body_start:
+                lines.append(f"{indent}    pass")
+
+    if "items" in schema:
+        if schema.get("type") != "array" or not isinstance(schema["items"], dict):
+            raise _UnsupportedSchema("items requires type 'array' and a single item schema")
+        item = f"{var}_item"
+        lines.append(f"{indent}for {item} in {var}:")
+        body_start = len(lines)
+        _compile_value_check(schema["items"], item, lines, indent + "    ")
+        if len(lines) == body_start:
+            lines.append(f"{indent}    pass")
+
+
+def compile_fast_check(schema):
+    """
+    Compile a schema into a specialised predicate for the common, valid case.
+
+    The generated function returns True only when the instance is certainly
+    valid. A False result means "not proven valid" and callers must fall back
+    to the full jsonschema validator, which keeps error semantics unchanged.
+
+    Args:
+        schema (dict): JSON schema to compile
+
+    Returns:
+        callable or None: Predicate taking an instance, or None if the schema
+        uses keywords the compiler does not support
+    """
+    lines = ["def fast_check(instance):"]
+    try:
+        _compile_value_check(schema, "instance", lines, "    ")
+    except _UnsupportedSchema:
+        return None
+    lines.append("    return True")
+
+    namespace = {"_MISSING": object()}
+    exec(compile("\n".join(lines), "<compiled schema>", "exec"), namespace)
+    return namespace["fast_check"]
+
+
+class CompiledSchemaValidator:
+    """
+    Schema validator built once and reused for every message.
+
+    Behaves like ``jsonschema.validate`` (same validator class, same
+    ``best_match`` error selection) without re-checking the schema and
+    constructing a validator on each call.
+    """
+
+    def __init__(self, schema):
+        """
+        Check the schema and build the validators.
+
+        Args:
+            schema (dict): JSON schema to validate against
+
+        Raises:
+            jsonschema.SchemaError: If the schema itself is invalid
+        """
+        from jsonschema.exceptions import best_match
+        from jsonschema.validators import validator_for
+
+        validator_cls = validator_for(schema)
+        validator_cls.check_schema(schema)
+        self.schema = schema
+        self._validator = validator_cls(schema)
+        self._best_match = best_match
+        self._fast_check = compile_fast_check(schema)
+
+    def is_valid(self, instance):
+        """
+        Check an instance without raising.
+
+        Args:
+            instance: Data to check
+
+        Returns:
+            bool: True if the instance matches the schema
+        """
+        if self._fast_check is not None and self._fast_check(instance):
+            return True
+        return self._validator.is_valid(instance)
+
+    def best_error(self, instance):
+        """
+        Return the error ``validate`` would raise, without raising it.
+
+        Args:
+            instance: Data to check
+
+        Returns:
+            jsonschema.ValidationError or None: The most relevant error, None when valid
+        """
+        if self._fast_check is not None and self._fast_check(instance):
+            return None
+        return self._best_match(self._validator.iter_errors(instance))
+
+    def validate(self, instance):
+        """
+        Validate an instance.
+
+        Args:
+            instance: Data to validate
+
+        Raises:
+            jsonschema.ValidationError: If the instance does not match the schema
+        """
+        error = self.best_error(instance)
+        if error is not None:
+            raise error
+
+
+class LazySchemaValidator:
+    """
+    ``CompiledSchemaValidator`` built on first use instead of at import.
+
+    Checking a schema and generating its fast path takes longer than the rest
+    of importing this module, so the module-level validators are built when a
+    message first needs them, or ahead of time by ``warm_up``.
+    """
+
+    def __init__(self, schema):
+        """
+        Args:
+            schema (dict): JSON schema to validate against
+        """
+        self.schema = schema
+        self._compiled = None
+        self._lock = threading.Lock()
+
+    @property
+    def compiled(self):
+        """
+        The built validator, building it on first access.
+
+        Raises:
+            jsonschema.SchemaError: If the schema itself is invalid
+        """
+        compiled = self._compiled
+        if compiled is None:
+            with self._lock:
+                if self._compiled is None:
+                    self._compiled = CompiledSchemaValidator(self.schema)
+                compiled = self._compiled
+        return compiled
+
+    def is_valid(self, instance):
+        """
+        See ``CompiledSchemaValidator.is_valid``.
+        """
+        return self.compiled.is_valid(instance)
+
+    def best_error(self, instance):
+        """
+        See ``CompiledSchemaValidator.best_error``.
+        """
+        return self.compiled.best_error(instance)
+
+    def validate(self, instance):
+        """
+        See ``CompiledSchemaValidator.validate``.
+        """
+        self.compiled.validate(instance)
+
+
+INPUT_VALIDATOR = LazySchemaValidator(INPUT_SCHEMA)
+OUTPUT_VALIDATOR = LazySchemaValidator(OUTPUT_SCHEMA)
+BATCH_INPUT_VALIDATOR = LazySchemaValidator(BATCH_INPUT_SCHEMA)
+BATCH_OUTPUT_VALIDATOR = LazySchemaValidator(BATCH_OUTPUT_SCHEMA)
+
+
+def __getattr__(name):
+    """
+    ``schemas.ValidationError`` is ``jsonschema.ValidationError``, imported on first access.
+
+    Handlers catch ``schemas.ValidationError``: an ``except`` clause is only
+    evaluated once an exception is raised, by which time a validator has
+    imported jsonschema.
+    """
+    if name == "ValidationError":
+        from jsonschema import ValidationError
+
+        return ValidationError
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def warm_up():
+    """
+    Build every module-level validator now, so the first messages do not pay for it.
+    """
+    for validator in (INPUT_VALIDATOR, OUTPUT_VALIDATOR, BATCH_INPUT_VALIDATOR, BATCH_OUTPUT_VALIDATOR):
+        validator.compiled
+
 
 def validate_input(input_data):
     """
@@ -52,7 +383,7 @@ def validate_input(input_data):
     Raises:
         jsonschema.ValidationError: If input does not match schema
     """
-    validate(instance=input_data, schema=INPUT_SCHEMA)
+    INPUT_VALIDATOR.validate(input_data)
 
 
 def validate_output(output_data):
@@ -65,4 +396,30 @@ def validate_output(output_data):
     Raises:
         jsonschema.ValidationError: If output does not match schema
     """
-    validate(instance=output_data, schema=OUTPUT_SCHEMA)
+    OUTPUT_VALIDATOR.validate(output_data)
+
+
+def validate_batch_input(batch_data):
+    """
+    Validate a batch request envelope. Items are not checked here.
+
+    Args:
+        batch_data (dict): Batch request to validate
+
+    Raises:
+        jsonschema.ValidationError: If the envelope does not match schema
+    """
+    BATCH_INPUT_VALIDATOR.validate(batch_data)
+
+
+def validate_batch_output(batch_data):
+    """
+    Validate a batch response, including every per-item result and error.
+
+    Args:
+        batch_data (dict): Batch response to validate
+
+    Raises:
+        jsonschema.ValidationError: If the response does not match schema
+    """
+    BATCH_OUTPUT_VALIDATOR.validate(batch_data)
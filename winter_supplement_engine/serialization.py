@@ -0,0 +1,155 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional dependency
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - msgspec is an optional dependency
+    msgspec = None
+
+
+class Serializer:
+    """
+    JSON codec working directly on message bytes.
+
+    ``loads`` accepts the raw MQTT payload (bytes, bytearray, memoryview or
+    str) without an intermediate decode to str, and ``dumps`` returns bytes
+    ready to publish. Every implementation raises ``json.JSONDecodeError`` for
+    payloads it cannot decode, so callers handle one exception type.
+    """
+
+    name = None
+
+    def loads(self, payload):
+        """
+        Decode a JSON payload.
+
+        Args:
+            payload (bytes): Raw message payload
+
+        Returns:
+            object: Decoded data
+
+        Raises:
+            json.JSONDecodeError: If the payload is not valid JSON
+        """
+        raise NotImplementedError
+
+    def dumps(self, data):
+        """
+        Encode data as JSON.
+
+        Args:
+            data (object): Data to encode
+
+        Returns:
+            bytes: Encoded JSON
+        """
+        raise NotImplementedError
+
+
+def _decode_error(error):
+    return json.JSONDecodeError(f"Undecodable payload: {error}", "", 0)
+
+
+class StdlibSerializer(Serializer):
+    """
+    Serializer using the standard library ``json`` module.
+    """
+
+    name = "json"
+
+    def loads(self, payload):
+        if isinstance(payload, memoryview):
+            payload = payload.tobytes()
+        try:
+            return json.loads(payload)
+        except (TypeError, UnicodeDecodeError) as e:
+            raise _decode_error(e) from e
+
+    def dumps(self, data):
+        return json.dumps(data).encode()
+
+
+class OrjsonSerializer(Serializer):
+    """
+    Serializer using orjson.
+    """
+
+    name = "orjson"
+
+    def loads(self, payload):
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError and also covers bad input types
+        return orjson.loads(payload)
+
+    def dumps(self, data):
+        return orjson.dumps(data)
+
+
+class MsgspecSerializer(Serializer):
+    """
+    Serializer using msgspec.
+    """
+
+    name = "msgspec"
+
+    def __init__(self):
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    def loads(self, payload):
+        try:
+            return self._decoder.decode(payload)
+        except (msgspec.DecodeError, TypeError) as e:
+            raise _decode_error(e) from e
+
+    def dumps(self, data):
+        return self._encoder.encode(data)
+
+
+SERIALIZERS = {
+    "json": StdlibSerializer,
+    "orjson": OrjsonSerializer,
+    "msgspec": MsgspecSerializer
+}
+
+
+def available_serializers():
+    """
+    Names of the serializers usable in this environment, fastest first.
+
+    Returns:
+        list: Serializer names
+    """
+    names = []
+    if orjson is not None:
+        names.append("orjson")
+    if msgspec is not None:
+        names.append("msgspec")
+    names.append("json")
+    return names
+
+
+def get_serializer(name="auto"):
+    """
+    Create a serializer by name.
+
+    Args:
+        name (str): "json", "orjson", "msgspec", or "auto" for the fastest available
+
+    Returns:
+        Serializer: Serializer instance
+
+    Raises:
+        ValueError: If the name is unknown or the library is not installed
+    """
+    if name == "auto":
+        name = available_serializers()[0]
+    if name not in SERIALIZERS:
+        raise ValueError(f"Unknown serializer: {name}")
+    if name not in available_serializers():
+        raise ValueError(f"Serializer {name} requires the {name} package to be installed")
+    return SERIALIZERS[name]()
@@ -0,0 +1,245 @@
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from .config import (
+    SUPERVISOR_WORKERS,
+    SUPERVISOR_SHARED_GROUP,
+    SUPERVISOR_STATS_INTERVAL,
+    SUPERVISOR_RESTART_DELAY,
+    METRICS_PORT,
+    MQTT_CLIENT_ID
+)
+
+
+def _run_worker(index, shared_group, stats_queue, stats_interval, use_async):
+    """
+    Worker process entry point: run one engine client in the shared subscription group.
+
+    Args:
+        index (int): Worker slot number
+        shared_group (str): Shared subscription group name
+        stats_queue (multiprocessing.Queue): Queue receiving periodic stats snapshots
+        stats_interval (float): Seconds between stats snapshots
+        use_async (bool): Run the asyncio client instead of the blocking client
+    """
+    from .logging_utils import configure_logging
+
+    # Workers started with spawn do not inherit the parent's log handlers
+    configure_logging()
+
+    # Each worker serves its own /metrics endpoint, on consecutive ports
+    metrics_port = METRICS_PORT + index if METRICS_PORT else 0
+    # Client ids must be unique; a restarted worker takes over its slot's persistent session
+    client_id = f"{MQTT_CLIENT_ID}-{index}" if MQTT_CLIENT_ID else None
+    # Blocking workers never import asyncio
+    if use_async:
+        from .async_client import AsyncWinterSupplementMQTTClient
+
+        client = AsyncWinterSupplementMQTTClient(shared_group=shared_group, metrics_port=metrics_port, client_id=client_id)
+    else:
+        from .mqtt_client import WinterSupplementMQTTClient
+
+        client = WinterSupplementMQTTClient(shared_group=shared_group, metrics_port=metrics_port, client_id=client_id)
+
+    def report_stats():
+        while True:
+            time.sleep(stats_interval)
+            stats_queue.put((index, os.getpid(), client.stats()))
+
+    threading.Thread(target=report_stats, name="supervisor-stats", daemon=True).start()
+
+    if use_async:
+        import asyncio
+
+        asyncio.run(client.run())
+    else:
+        client.connect()
+
+
+class Supervisor:
+    """
+    Runs the rules engine as N worker processes behind an MQTT shared subscription.
+
+    Every worker subscribes through ``$share/<group>/...`` so the broker
+    load-balances requests across processes. The supervisor restarts workers
+    that exit and combines the stats they report.
+    """
+
+    def __init__(self, workers=SUPERVISOR_WORKERS, shared_group=SUPERVISOR_SHARED_GROUP,
+                 stats_interval=SUPERVISOR_STATS_INTERVAL, restart_delay=SUPERVISOR_RESTART_DELAY,
+                 use_async=False):
+        """
+        Args:
+            workers (int): Number of worker processes
+            shared_group (str): Shared subscription group name
+            stats_interval (float): Seconds between worker stats reports
+            restart_delay (float): Seconds to wait before restarting an exited worker
+            use_async (bool): Run the asyncio client in each worker
+
+        Raises:
+            ValueError: If workers is not positive or no shared group is given
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        if not shared_group:
+            raise ValueError("A shared subscription group is required")
+
+        self.logger = logging.getLogger(__name__)
+        self.workers = workers
+        self.shared_group = shared_group
+        self.stats_interval = stats_interval
+        self.restart_delay = restart_delay
+        self.use_async = use_async
+
+        self._context = multiprocessing.get_context()
+        self._stats_queue = self._context.Queue()
+        self._processes = {}
+        self._exited_at = {}
+        self._restarts = {index: 0 for index in range(workers)}
+        self._latest = {}
+        self._retired = {}
+        self._stopping = threading.Event()
+
+    def start(self):
+        """
+        Start all worker processes.
+
+        With the fork start method the engine modules are imported and the
+        validators built here first, so every worker, including restarted
+        ones, starts with them instead of importing them itself.
+        """
+        if self._context.get_start_method() == "fork":
+            if self.use_async:
+                from . import async_client  # noqa: F401 - imports mqtt_client and the rest of the engine
+            else:
+                from . import mqtt_client  # noqa: F401 - imports the rest of the engine
+            from .schemas import warm_up
+
+            warm_up()
+        for index in range(self.workers):
+            self._spawn(index)
+
+    def run(self):
+        """
+        Start the workers and supervise them until ``stop`` is called.
+        """
+        self.start()
+        last_report = time.monotonic()
+        last_published = 0
+        try:
+            while not self._stopping.is_set():
+                self.poll(timeout=min(self.stats_interval, 1.0))
+                now = time.monotonic()
+                if now - last_report >= self.stats_interval:
+                    stats = self.stats()
+                    published = stats["messages"]["published"]
+                    rate = (published - last_published) / (now - last_report)
+                    self.logger.info(
+                        f"Workers alive: {stats['alive']}/{self.workers}, "
+                        f"messages: {stats['messages']}, throughput: {rate:.1f} msgs/sec"
+                    )
+                    last_report, last_published = now, published
+        finally:
+            self.shutdown()
+
+    def stop(self):
+        """
+        Ask ``run`` to shut the workers down and return. Thread-safe.
+        """
+        self._stopping.set()
+
+    def shutdown(self, timeout=5):
+        """
+        Terminate all worker processes.
+
+        Args:
+            timeout (float): Seconds to wait for each worker to exit
+        """
+        self._stopping.set()
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self._processes.values():
+            process.join(timeout)
+
+    def poll(self, timeout=0.0):
+        """
+        Collect stats reports and restart workers that have exited.
+
+        Args:
+            timeout (float): Seconds to wait for the first stats report
+        """
+        try:
+            while True:
+                index, pid, worker_stats = self._stats_queue.get(timeout=timeout)
+                timeout = 0
+                process = self._processes.get(index)
+                if process is not None and process.pid == pid:
+                    self._latest[index] = worker_stats
+        except queue.Empty:
+            pass
+
+        if self._stopping.is_set():
+            return
+        now = time.monotonic()
+        for index, process in list(self._processes.items()):
+            if process.is_alive():
+                continue
+            exited_at = self._exited_at.setdefault(index, now)
+            if now - exited_at < self.restart_delay:
+                continue
+            self.logger.warning(f"Worker {index} (pid {process.pid}) exited with code {process.exitcode}, restarting")
+            self._retire(index)
+            self._restarts[index] += 1
+            self._spawn(index)
+
+    def stats(self):
+        """
+        Combined stats across current and previously restarted workers.
+
+        Returns:
+            dict: Summed message counters, live worker count and per-worker details
+        """
+        totals = dict(self._retired)
+        workers = []
+        for index, process in sorted(self._processes.items()):
+            messages = self._latest.get(index, {}).get("messages", {})
+            for key, value in messages.items():
+                totals[key] = totals.get(key, 0) + value
+            workers.append({
+                "index": index,
+                "pid": process.pid,
+                "alive": process.is_alive(),
+                "restarts": self._restarts[index],
+                "messages": messages
+            })
+        for key in ("received", "published", "failed"):
+            totals.setdefault(key, 0)
+        return {
+            "alive": sum(worker["alive"] for worker in workers),
+            "messages": totals,
+            "workers": workers
+        }
+
+    def _spawn(self, index):
+        process = self._context.Process(
+            target=_run_worker,
+            args=(index, self.shared_group, self._stats_queue, self.stats_interval, self.use_async),
+            name=f"supplement-engine-{index}",
+            daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+        self._exited_at.pop(index, None)
+        self.logger.info(f"Started worker {index} (pid {process.pid})")
+
+    def _retire(self, index):
+        """
+        Fold the last stats reported by an exited worker into the running totals.
+        """
+        for key, value in self._latest.pop(index, {}).get("messages", {}).items():
+            self._retired[key] = self._retired.get(key, 0) + value